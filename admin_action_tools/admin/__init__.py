@@ -1,9 +1,17 @@
 from admin_action_tools.admin.confirm_tool import AdminConfirmMixin, confirm_action
 from admin_action_tools.admin.form_tool import ActionFormMixin, add_form_to_action
+from admin_action_tools.chunks import chunked_action
+from admin_action_tools.parallel import parallel_action
+from admin_action_tools.progress import get_progress
+from admin_action_tools.summary import ActionSummary
 
 __all__ = [
     "AdminConfirmMixin",
     "confirm_action",
     "ActionFormMixin",
     "add_form_to_action",
+    "ActionSummary",
+    "chunked_action",
+    "get_progress",
+    "parallel_action",
 ]
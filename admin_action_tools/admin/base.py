@@ -1,19 +1,37 @@
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Sequence, Union
 
-from django.contrib.admin.options import IS_POPUP_VAR
+from django.contrib.admin import helpers
+from django.contrib.admin.options import IS_POPUP_VAR, IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.db.models import Model, QuerySet
-from django.http import HttpRequest
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    HttpResponseRedirect,
+    JsonResponse,
+)
 from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.http import urlencode
 
-from admin_action_tools.file_cache import FileCache
-from admin_action_tools.toolchain import ToolChain
+from admin_action_tools.constants import PREVIEW_LIMIT, SELECTION_TOKEN, TOOLCHAIN_TOKEN
+from admin_action_tools.form_cache import get_form_cache
+from admin_action_tools.progress import Progress
+from admin_action_tools.selection import Selection
+from admin_action_tools.toolchain import ToolChain, get_tool_chain
+from admin_action_tools.utils import snake_to_title_case
 
 
 class BaseMixin:
-    _file_cache = FileCache()
-
     actions: Optional[List[str]]
 
+    # Relations joined and fields loaded to list the selected objects on the action pages
+    confirmation_preview_select_related: Optional[Sequence[str]] = None
+    confirmation_preview_only: Optional[Sequence[str]] = None
+
     def get_change_action(self, fieldname):
         actions = getattr(self, fieldname, [])
         change_actions = []
@@ -40,18 +58,261 @@ class BaseMixin:
         actions = self._filter_actions_by_permissions(request, actions)
         return {name: (func, name, desc) for func, name, desc in actions}
 
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path(
+                "action_preview/",
+                self.admin_site.admin_view(self.action_preview_view),
+                name="%s_%s_action_preview" % info,
+            ),
+            path(
+                "action_job/<int:job_id>/",
+                self.admin_site.admin_view(self.action_job_view),
+                name="%s_%s_action_job" % info,
+            ),
+            path(
+                "action_job/<int:job_id>/progress/",
+                self.admin_site.admin_view(self.action_job_progress_view),
+                name="%s_%s_action_job_progress" % info,
+            ),
+            path(
+                "action_job/<int:job_id>/cancel/",
+                self.admin_site.admin_view(self.action_job_cancel_view),
+                name="%s_%s_action_job_cancel" % info,
+            ),
+            *super().get_urls(),
+        ]
+
+    def _get_admin_url(self, view_name: str, *args) -> str:
+        info = self.model._meta.app_label, self.model._meta.model_name, view_name
+        return reverse("admin:%s_%s_%s" % info, args=args, current_app=self.admin_site.name)
+
+    def get_confirmation_preview_queryset(self, request: HttpRequest, queryset: QuerySet) -> QuerySet:
+        """
+        Queryset listing the selected objects on the action pages, the action still gets the original one.
+
+        Use it to load in the same query what the `__str__` of the objects needs,
+        e.g. the relations it follows, so the list is rendered without a query per object.
+        """
+        if self.confirmation_preview_select_related:
+            queryset = queryset.select_related(*self.confirmation_preview_select_related)
+        if self.confirmation_preview_only:
+            queryset = queryset.only(*self.confirmation_preview_only)
+        return queryset
+
+    def get_selection_queryset(self, request: HttpRequest, selection: Selection) -> QuerySet:
+        "Queryset of the selected objects, rebuilt from their selection."
+        if selection.is_query:
+            # Replay the filters and search of the changelist
+            request.GET = selection.get_query()
+            changelist: ChangeList = self.get_changelist_instance(request)
+            return changelist.get_queryset(request)
+        return selection.filter(self.get_queryset(request))
+
+    def action_preview_view(self, request: HttpRequest):
+        """
+        Page of the selected objects, fetched while scrolling the preview of a lazy_queryset action.
+
+        Paginated on the pk: `after` is the pk of the last object already listed,
+        so a page costs the same whatever its position in the selection.
+        """
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        token = request.GET.get(SELECTION_TOKEN, "")
+        # The token was signed for the changelist the action was posted to
+        selection = Selection.from_token(request, token, path=self._get_admin_url("changelist"))
+        if not selection:
+            return HttpResponseBadRequest("Invalid selection")
+        after = request.GET.get("after")
+
+        try:
+            queryset = self.get_selection_queryset(request, selection)
+            queryset = self.get_confirmation_preview_queryset(request, queryset).order_by("pk")
+            if after:
+                queryset = queryset.filter(pk__gt=after)
+            objects = list(queryset[: PREVIEW_LIMIT + 1])
+        except (IncorrectLookupParameters, ValidationError, ValueError):
+            return HttpResponseBadRequest("Invalid selection")
+
+        page = objects[:PREVIEW_LIMIT]
+        return JsonResponse(
+            {
+                "results": [{"pk": str(obj.pk), "display": str(obj)} for obj in page],
+                "after": str(page[-1].pk) if len(objects) > PREVIEW_LIMIT else None,
+            }
+        )
+
+    def get_action_job(self, request: HttpRequest, job_id: int):
+        "Job of an action of this model admin, only shown to the user who confirmed it and superusers."
+        # Models can not be imported along with the mixins, while the apps are loading
+        # pylint: disable=C0415
+        from django.contrib.contenttypes.models import ContentType
+
+        from admin_action_tools.models import ActionJob
+
+        content_type = ContentType.objects.get_for_model(self.model, for_concrete_model=False)
+        job = ActionJob.objects.filter(pk=job_id, content_type=content_type).first()
+        if job is None:
+            raise Http404
+        if job.user_id != request.user.pk and not request.user.is_superuser:
+            raise PermissionDenied
+        return job
+
+    @staticmethod
+    def get_action_job_status(job) -> Dict:
+        finished = job.status in (job.Status.DONE, job.Status.FAILED, job.Status.CANCELLED)
+        progress = Progress.for_job(job.pk)
+        return {
+            "status": job.status,
+            "status_display": job.get_status_display(),
+            "finished": finished,
+            # Cancelled, but still running until the action checks it
+            "cancelling": not finished and progress.cancelled,
+            **progress.as_dict(),
+            "messages": job.messages if finished else [],
+            # Last line of the traceback, the exception
+            "error": job.error.strip().splitlines()[-1] if job.error.strip() else "",
+        }
+
+    def action_job_view(self, request: HttpRequest, job_id: int):
+        "Progress page of an action run in the background, the confirmation redirects to it."
+        job = self.get_action_job(request, job_id)
+        action_display_name = snake_to_title_case(job.action)
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"{action_display_name} (job #{job.pk})",
+            "opts": self.model._meta,
+            "job": job,
+            "action_display_name": action_display_name,
+            "job_status": self.get_action_job_status(job),
+            "progress_url": self._get_admin_url("action_job_progress", job.pk),
+            "cancel_url": self._get_admin_url("action_job_cancel", job.pk),
+        }
+        return self.render_template(request, context, "action_job/progress.html")
+
+    def action_job_progress_view(self, request: HttpRequest, job_id: int):
+        "Progress of an action run in the background, polled by its progress page."
+        return JsonResponse(self.get_action_job_status(self.get_action_job(request, job_id)))
+
+    def action_job_cancel_view(self, request: HttpRequest, job_id: int):
+        "Cancel an action run in the background, from its progress page."
+        from admin_action_tools.jobs import cancel_job  # pylint: disable=C0415
+
+        if request.method != "POST":
+            return HttpResponseNotAllowed(["POST"])
+        job = self.get_action_job(request, job_id)
+        if cancel_job(job.pk):
+            self.message_user(request, f"{snake_to_title_case(job.action)} (job #{job.pk}) is being cancelled.")
+        return HttpResponseRedirect(self._get_admin_url("action_job", job.pk))
+
     def to_queryset(self, request: HttpRequest, object_or_queryset: Union[QuerySet, Model]) -> QuerySet:
         if not isinstance(object_or_queryset, QuerySet):
             return self.get_queryset(request).filter(pk=object_or_queryset.pk)
         return object_or_queryset
 
+    def changelist_view(self, request: HttpRequest, extra_context=None):
+        selection = None
+        if SELECTION_TOKEN in request.POST:
+            selection = Selection.from_token(request, request.POST[SELECTION_TOKEN])
+        if selection:
+            # Let Django run the action on the changelist queryset, restricted by response_action
+            request._action_selection = selection
+            post = request.POST.copy()
+            post["select_across"] = "1"
+            post.setlist(helpers.ACTION_CHECKBOX_NAME, [selection.first_pk()])
+            request.POST = post
+            if selection.is_query:
+                # Replay the filters, search and ordering of the changelist
+                request.GET = selection.get_query()
+        return super().changelist_view(request, extra_context)
+
+    def response_action(self, request: HttpRequest, queryset: QuerySet):
+        selection = getattr(request, "_action_selection", None)
+        if selection:
+            queryset = selection.filter(queryset)
+        return super().response_action(request, queryset)
+
+    def get_selection(self, request: HttpRequest, queryset: QuerySet) -> Optional[Selection]:
+        """
+        Selection of the action: the one received from the previous step, or the one posted by the changelist.
+
+        A select across is kept as the changelist query, its pks are never listed.
+        """
+        selection = getattr(request, "_action_selection", None)
+        if selection:
+            return selection
+        selected_pks = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+        if request.POST.get("select_across") == "1":
+            pk = selected_pks[0] if selected_pks else queryset.values_list("pk", flat=True).first()
+            if pk is None:
+                return None
+            return Selection.from_query(request.GET, pk)
+        if not selected_pks:
+            return None
+        return Selection.from_pks(selected_pks, queryset.model)
+
+    def get_selection_token(self, request: HttpRequest, queryset: QuerySet) -> Optional[str]:
+        """
+        Signed token of the selection, posted back by the next step instead of one input per pk.
+
+        The token received from the previous step is carried as is.
+        """
+        if getattr(request, "_action_selection", None):
+            return request.POST[SELECTION_TOKEN]
+        selection = self.get_selection(request, queryset)
+        return selection.to_token(request) if selection else None
+
+    def get_queryset_context(
+        self, request: HttpRequest, queryset: QuerySet, display_queryset: bool, lazy_queryset: bool
+    ) -> Dict:
+        """
+        Context of the selected objects: the objects listed and the selection posted back by the next step.
+
+        With lazy_queryset, the queryset is never evaluated in full:
+        it is counted and only a preview of PREVIEW_LIMIT objects is listed,
+        the next ones are fetched from the preview endpoint while scrolling.
+        """
+        selection_token = self.get_selection_token(request, queryset)
+        preview_queryset = self.get_confirmation_preview_queryset(request, queryset)
+        objects = preview_queryset if display_queryset else []
+        context = {
+            "selection_token": selection_token,
+            "selection_token_name": SELECTION_TOKEN,
+            # Objects of object actions are not selected on the changelist
+            "selected_pks": [] if selection_token else [obj.pk for obj in objects],
+        }
+        if not lazy_queryset:
+            return {**context, "queryset": objects}
+
+        # Ordered on the pk, the rest of the preview is fetched after its last object
+        preview = list(preview_queryset.order_by("pk")[:PREVIEW_LIMIT]) if display_queryset else []
+        count = queryset.count()
+        preview_url = None
+        if selection_token and preview:
+            preview_url = "%s?%s" % (
+                self._get_admin_url("action_preview"),
+                urlencode({SELECTION_TOKEN: selection_token}),
+            )
+        return {
+            **context,
+            "queryset": preview,
+            "selected_pks": [] if selection_token else [obj.pk for obj in preview],
+            "queryset_count": count,
+            "preview_remaining": count - len(preview) if display_queryset else 0,
+            "preview_url": preview_url,
+            "preview_after": preview[-1].pk if preview else None,
+        }
+
     def render_template(self, request: HttpRequest, context: Dict, template_name: str, custom_template=None):
         opts = self.model._meta
         app_label = opts.app_label
 
         request.current_app = self.admin_site.name
-        tool_chain: ToolChain = ToolChain(request)
+        tool_chain: ToolChain = get_tool_chain(request)
         context["first"] = tool_chain.is_first_tool()
+        context["toolchain_token"] = tool_chain.get_token()
+        context["toolchain_token_name"] = TOOLCHAIN_TOKEN
 
         return TemplateResponse(
             request,
@@ -66,8 +327,10 @@ class BaseMixin:
 
     def get_tools_result(self, tool_chain: ToolChain):
         history = tool_chain.get_history()
+        # Steps already validated are reused instead of being validated again
+        form_cache = get_form_cache(tool_chain.request)
         forms = []
         for tool_name in history:
             data, metadata = tool_chain.get_tool(tool_name)
-            forms.append(self.load_form(data, metadata))
+            forms.append(form_cache.load(data, metadata, self.load_form))
         return forms
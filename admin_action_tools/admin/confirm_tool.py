@@ -1,41 +1,62 @@
 import functools
-from typing import Callable, Dict
+import hashlib
+from typing import Callable, Dict, Optional
 
+from django.contrib import messages
 from django.contrib.admin import helpers
 from django.contrib.admin.exceptions import DisallowedModelAdminToField
 from django.contrib.admin.options import TO_FIELD_VAR
 from django.contrib.admin.utils import flatten_fieldsets, unquote
-from django.core.cache import cache
-from django.core.exceptions import PermissionDenied
-from django.db.models import FileField, ImageField, ManyToManyField, Model, QuerySet
+from django.core.exceptions import (
+    ImproperlyConfigured,
+    PermissionDenied,
+    ValidationError,
+)
+from django.db import router, transaction
+from django.db.models import FileField, ImageField, Model, QuerySet
 from django.forms import ModelForm
-from django.http import HttpRequest, HttpResponseRedirect
+from django.forms.formsets import all_valid
+from django.http import HttpRequest, HttpResponseRedirect, QueryDict
 from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
 from django.utils.translation import gettext as _
 from django.views.decorators.cache import cache_control
 
 from admin_action_tools.admin.base import BaseMixin
+from admin_action_tools.confirmation_cache import ConfirmationCache
 from admin_action_tools.constants import (
-    CACHE_KEYS,
-    CACHE_TIMEOUT,
+    BACKGROUND_MARKER,
     CONFIRM_ACTION,
     CONFIRM_ADD,
     CONFIRM_CHANGE,
+    CONFIRMATION_ID,
     CONFIRMATION_RECEIVED,
+    CONFIRMATION_VERSION,
+    FUNCTION_MARKER,
+    REUSE_VALIDATION,
     SAVE,
     SAVE_ACTIONS,
     SAVE_AND_CONTINUE,
     SAVE_AS_NEW,
+    STASH_POST,
     ToolAction,
 )
+from admin_action_tools.diff import ChangeDiff
+from admin_action_tools.form_cache import (
+    dump_validated_form,
+    restore_validated_form,
+    restore_validated_formset,
+)
+from admin_action_tools.selection import Selection
+from admin_action_tools.summary import ActionSummary
 from admin_action_tools.templatetags.formatting import back_url
-from admin_action_tools.toolchain import ToolChain, add_finishing_step
-from admin_action_tools.utils import (
-    format_cache_key,
-    get_admin_change_url,
-    log,
-    snake_to_title_case,
+from admin_action_tools.toolchain import (
+    ToolChain,
+    add_finishing_step,
+    get_tool_chain,
+    persist_tool_chain,
 )
+from admin_action_tools.utils import get_admin_change_url, log, snake_to_title_case
 
 
 class AdminConfirmMixin(BaseMixin):
@@ -48,6 +69,13 @@ class AdminConfirmMixin(BaseMixin):
     # If asking for confirmation, which fields should we confirm for?
     confirmation_fields = None
 
+    # Keep the submitted form in the cache during a change confirmation, instead of in hidden inputs
+    stash_confirmation_post = STASH_POST
+
+    # Save confirmed changes with the cleaned data of the confirmation page instead of validating them again.
+    # Model.full_clean() is not run again either, nor the changes Model.clean() makes
+    reuse_confirmation_validation = REUSE_VALIDATION
+
     # Custom templates (designed to be over-ridden in subclasses)
     change_confirmation_template = None
     action_confirmation_template = None
@@ -95,17 +123,94 @@ class AdminConfirmMixin(BaseMixin):
         if request.method == "POST":
             if (not object_id and CONFIRM_ADD in request.POST) or (object_id and CONFIRM_CHANGE in request.POST):
                 log("confirmation is asked for")
-                self._file_cache.delete_all()
-                cache.delete_many(CACHE_KEYS.values())
                 return self._change_confirmation_view(request, object_id, form_url, extra_context)
             elif CONFIRMATION_RECEIVED in request.POST:
-                return self._confirmation_received_view(request, object_id, form_url, extra_context)
-            else:
-                self._file_cache.delete_all()
-                cache.delete_many(CACHE_KEYS.values())
+                with transaction.atomic(using=router.db_for_write(self.model)):
+                    return self._confirmation_received_view(request, object_id, form_url, extra_context)
+
+        if request.method == "POST":
+            changed_response = self._check_confirmed_version(request, object_id, form_url, extra_context)
+            if changed_response is not None:
+                return changed_response
+
+        # Confirmation of a form without files, posted as is
+        confirmation_cache = ConfirmationCache.from_request(request, self.model) if request.method == "POST" else None
+        if confirmation_cache:
+            self._load_validated_data(request, confirmation_cache)
 
         extra_context = self._add_confirmation_options_to_extra_context(extra_context)
-        return super().changeform_view(request, object_id, form_url, extra_context)
+        response = super().changeform_view(request, object_id, form_url, extra_context)
+        if confirmation_cache:
+            confirmation_cache.clear()
+        return response
+
+    def get_form(self, request, obj=None, change=False, **kwargs):
+        form = super().get_form(request, obj, change, **kwargs)
+        validated_data = request.__dict__.get("_validated_data")
+        if validated_data is None:
+            return form
+        validated = validated_data["form"]
+
+        class ValidatedForm(form):
+            def full_clean(self):
+                restore_validated_form(self, dict(validated["cleaned_data"]), validated["instance"])
+
+        ValidatedForm.__name__ = form.__name__
+        return ValidatedForm
+
+    def _create_formsets(self, request, obj, change):
+        formsets, inline_instances = super()._create_formsets(request, obj, change)
+        validated_data = request.__dict__.get("_validated_data")
+        if validated_data is not None:
+            for formset in formsets:
+                restore_validated_formset(formset, validated_data["formsets"].get(formset.prefix, []))
+        return formsets, inline_instances
+
+    def _check_confirmed_version(self, request, object_id, form_url, extra_context):
+        """
+        Guard against changes made to the object by someone else since its confirmation page was shown:
+        the version of the diff is checked with a single query, and the confirmation page is shown again
+        with an updated diff if the object changed. Returns None if it did not.
+        """
+        version = request.POST.get(CONFIRMATION_VERSION)
+        if not version or not object_id or SAVE_AS_NEW in request.POST:
+            return None
+        to_field = request.POST.get(TO_FIELD_VAR, request.GET.get(TO_FIELD_VAR))
+        field = self.model._meta.pk if to_field is None else self.model._meta.get_field(to_field)
+        try:
+            lookup = {field.name: field.to_python(unquote(object_id))}
+        except ValidationError:
+            return None
+        if ChangeDiff.load_version(self.model, **lookup) == version:
+            return None
+
+        log("Object changed since its confirmation page")
+        self.message_user(
+            request,
+            _("This %(name)s was changed by someone else in the meantime, please review the changes again.")
+            % {"name": self.model._meta.verbose_name},
+            messages.WARNING,
+        )
+        return self._change_confirmation_view(request, object_id, form_url, extra_context)
+
+    def _get_submission_hash(self, request) -> str:
+        "Hash of the submitted form, the same for the confirmation page and the confirmed submission."
+        post = self._get_stashed_post(request)
+        # The submit button is labelled differently on the confirmation page,
+        # which leaves out the templates of new inline forms
+        for key in [*SAVE_ACTIONS, *(key for key in post if "__prefix__" in key)]:
+            post.pop(key, None)
+        content = urlencode(sorted(post.lists()), doseq=True)
+        return hashlib.sha256(f"{request.path}?{content}".encode()).hexdigest()
+
+    def _load_validated_data(self, request, confirmation_cache: ConfirmationCache) -> None:
+        "Reuse the cleaned data validated for the confirmation page, if the same submission is confirmed."
+        if not self.reuse_confirmation_validation:
+            return
+        validated_data = confirmation_cache.get_validated()
+        if validated_data and validated_data["hash"] == self._get_submission_hash(request):
+            log("Reusing the validated data of the confirmation")
+            request._validated_data = validated_data
 
     def _add_confirmation_options_to_extra_context(self, extra_context):
         log(f"Adding confirmation to extra_content {self.confirm_add} {self.confirm_change}")
@@ -115,67 +220,25 @@ class AdminConfirmMixin(BaseMixin):
             "confirm_change": self.confirm_change,
         }
 
-    def _get_changed_data(self, form: ModelForm, model: Model, obj: object, add: bool) -> Dict:
+    def _get_change_diff(self, form: ModelForm, model: Model, obj: object, add: bool) -> ChangeDiff:
         """
         Given a form, detect the changes on the form from the default values (if add) or
-        from the database values of the object (model instance)
+        from a single database snapshot of the object (model instance)
 
         form - Submitted form that is attempting to alter the obj
         model - the model class of the obj
         obj - instance of model which is being altered
         add - are we attempting to add the obj or does it already exist in the database
 
-        Returns a dictionary of the fields and their changed values if any
+        Returns a ChangeDiff holding the changed fields and the snapshot they were compared to
         """
+        return ChangeDiff(form, model, obj, add)
 
-        def _display_for_changed_data(field, initial_value, new_value):
-            if not (isinstance(field, FileField) or isinstance(field, ImageField)):
-                return [initial_value, new_value]
-
-            if initial_value:
-                if new_value is False:
-                    # Clear has been selected
-                    return [initial_value.name, None]
-                elif new_value:
-                    return [initial_value.name, new_value.name]
-                else:
-                    # No cover: Technically doesn't get called in current code because
-                    # This function is only called if there was a difference in the data
-                    return [initial_value.name, initial_value.name]  # pragma: no cover
-
-            if new_value:
-                return [None, new_value.name]
-
-            return [None, None]
-
-        changed_data = {}
-        if add:
-            for name, new_value in form.cleaned_data.items():
-                # Don't consider default values as changed for adding
-                field_object = model._meta.get_field(name)
-                default_value = field_object.get_default()
-                if new_value is not None and new_value != default_value:
-                    # Show what the default value is
-                    changed_data[name] = _display_for_changed_data(field_object, default_value, new_value)
-        else:
-            # Parse the changed data - Note that using form.changed_data would not work because initial is not set
-            for name, new_value in form.cleaned_data.items():
-
-                # Since the form considers initial as the value first shown in the form
-                # It could be incorrect when user hits save, and then hits "No, go back to edit"
-                obj.refresh_from_db()
-
-                field_object = model._meta.get_field(name)
-                initial_value = getattr(obj, name)
-
-                # Note: getattr does not work on ManyToManyFields
-                if isinstance(field_object, ManyToManyField):
-                    initial_value = field_object.value_from_object(obj)
-
-                if initial_value != new_value:
-                    changed_data[name] = _display_for_changed_data(field_object, initial_value, new_value)
-
-        return changed_data
+    def _get_changed_data(self, form: ModelForm, model: Model, obj: object, add: bool) -> Dict:
+        """
+        Returns a dictionary of the fields and their changed values if any
+        """
+        return self._get_change_diff(form, model, obj, add).as_dict()
 
     def _confirmation_received_view(self, request, object_id, form_url, extra_context):
         """
@@ -192,6 +255,23 @@ class AdminConfirmMixin(BaseMixin):
         and pass the request to Django
         """
         log("Confirmation has been received")
+        confirmation_cache = ConfirmationCache.from_request(request, self.model)
+
+        if self.stash_confirmation_post:
+            stashed_post = confirmation_cache.get_post() if confirmation_cache else None
+            if stashed_post is None:
+                self.message_user(
+                    request, _("The confirmation has expired, please submit your changes again."), messages.WARNING
+                )
+                return HttpResponseRedirect(request.get_full_path())
+            request.POST = self._restore_stashed_post(request, stashed_post)
+
+        changed_response = self._check_confirmed_version(request, object_id, form_url, extra_context)
+        if changed_response is not None:
+            return changed_response
+
+        if confirmation_cache:
+            self._load_validated_data(request, confirmation_cache)
 
         def _reconstruct_request_files():
             """
@@ -200,7 +280,11 @@ class AdminConfirmMixin(BaseMixin):
             """
             reconstructed_files = {}
 
-            cached_object = cache.get(CACHE_KEYS["object"])
+            if not confirmation_cache:
+                log("Warning: no confirmation id")
+                return
+
+            cached_object = confirmation_cache.get_object()
             # Reconstruct the files from cached object
             if not cached_object:
                 log("Warning: no cached_object")
@@ -217,7 +301,7 @@ class AdminConfirmMixin(BaseMixin):
                 if not (isinstance(field, (FileField, ImageField))):
                     continue
 
-                cached_file = self._file_cache.get(format_cache_key(model=self.model.__name__, field=field.name))
+                cached_file = confirmation_cache.get_file(field.name)
 
                 # If a file was uploaded, the field is omitted from the POST since it's in request.FILES
                 if not query_dict.get(field.name):  # pragma: no cover
@@ -249,13 +333,13 @@ class AdminConfirmMixin(BaseMixin):
                 # (Since we are not handling the formsets/inlines)
                 # Note that this results in the "Yes, I'm Sure" submission
                 #   act as a `change` not an `add`
-                obj = cache.get(CACHE_KEYS["object"])
+                obj = confirmation_cache.get_object()
 
             # No cover: __reconstruct_request_files currently checks for cached obj so obj won't be None
             if obj:  # pragma: no cover
                 for field, file in reconstructed_files.items():
                     log(f"Setting file field {field} to file {file}")
-                    setattr(obj, field, file)
+                    confirmation_cache.promote_file(field, obj, file)
                 obj.save()
                 object_id = str(obj.id)
                 # Update the request path, used in the message to user and redirect
@@ -276,11 +360,32 @@ class AdminConfirmMixin(BaseMixin):
 
             request.POST = modified_post
 
-        self._file_cache.delete_all()
-        cache.delete_many(CACHE_KEYS.values())
+        if confirmation_cache:
+            confirmation_cache.clear()
 
         return super()._changeform_view(request, object_id, form_url, extra_context)
 
+    def _get_stashed_post(self, request) -> QueryDict:
+        "Submitted form of a change confirmation, as kept in the cache."
+        post = request.POST.copy()
+        for key in (
+            CONFIRM_ADD,
+            CONFIRM_CHANGE,
+            CONFIRMATION_RECEIVED,
+            CONFIRMATION_ID,
+            CONFIRMATION_VERSION,
+            "csrfmiddlewaretoken",
+        ):
+            post.pop(key, None)
+        return post
+
+    def _restore_stashed_post(self, request, stashed_post: QueryDict) -> QueryDict:
+        "Submitted form restored from the cache, the inputs posted with the confirmation take precedence."
+        post = stashed_post.copy()
+        for key, values in request.POST.lists():
+            post.setlist(key, values)
+        return post
+
     def _get_cleared_fields(self, request):
         """
         Checks for any ImageField or FileField which have been cleared by user.
@@ -340,9 +445,10 @@ class AdminConfirmMixin(BaseMixin):
 
         add_or_new = add or SAVE_AS_NEW in request.POST
         # Get changed data to show on confirmation
-        changed_data = self._get_changed_data(form, model, obj, add_or_new)
+        change_diff = self._get_change_diff(form, model, obj, add_or_new)
 
-        changed_confirmation_fields = set(self.get_confirmation_fields(request, obj)) & set(changed_data.keys())
+        changed_fields = change_diff.changed_fields()
+        changed_confirmation_fields = set(self.get_confirmation_fields(request, obj)) & set(changed_fields)
         if not bool(changed_confirmation_fields):
             log("No change detected")
             # No confirmation required for changed fields, continue to save
@@ -357,14 +463,37 @@ class AdminConfirmMixin(BaseMixin):
                 break
 
         cleared_fields = []
+        confirmation_id = None
+        # Shown again when the object changed since the confirmation: the cached files are kept
+        reshown = CONFIRMATION_ID in request.POST
+        if form.is_multipart() or self.stash_confirmation_post or self.reuse_confirmation_validation:
+            confirmation_cache = ConfirmationCache.from_request(request, model) or ConfirmationCache(request, model)
+            confirmation_id = confirmation_cache.confirmation_id
+
+        # Uploads can not be kept as cleaned data, forms with uploads are validated again
+        if self.reuse_confirmation_validation and not request.FILES and not reshown and all_valid(formsets):
+            confirmation_cache.set_validated(
+                {
+                    "hash": self._get_submission_hash(request),
+                    "form": dump_validated_form(form),
+                    "formsets": {
+                        formset.prefix: [dump_validated_form(inline_form) for inline_form in formset.forms]
+                        for formset in formsets
+                    },
+                }
+            )
+
+        if self.stash_confirmation_post:
+            log("Stashing the submitted form")
+            confirmation_cache.set_post(self._get_stashed_post(request))
+
         if form.is_multipart():
             log("Caching files")
-            cache.set(CACHE_KEYS["object"], new_object, CACHE_TIMEOUT)
+            confirmation_cache.set_object(new_object)
 
             # Save files as tempfiles
             for field_name in request.FILES:
-                file = request.FILES[field_name]
-                self._file_cache.set(format_cache_key(model=model.__name__, field=field_name), file)
+                confirmation_cache.set_file(field_name, request.FILES[field_name])
 
             # Handle when files are cleared - since the `form` object would not hold that info
             cleared_fields = self._get_cleared_fields(request)
@@ -375,31 +504,79 @@ class AdminConfirmMixin(BaseMixin):
             **self.admin_site.each_context(request),
             "preserved_filters": self.get_preserved_filters(request),
             "title": f"{_('Confirm')} {title_action} {opts.verbose_name}",
-            "object_name": str(obj),
+            "object_name": str(change_diff.snapshot or obj),
             "object_id": object_id,
             "app_label": opts.app_label,
             "model_name": opts.model_name,
             "opts": opts,
             "obj": obj or new_object,
-            "changed_data": changed_data,
+            "changed_data": change_diff.as_dict(),
+            "change_diff": change_diff,
             "add": add,
             "save_as_new": SAVE_AS_NEW in request.POST,
             "submit_name": save_action,
             "form": form,
             "cleared_fields": cleared_fields,
+            "confirmation_id": confirmation_id,
+            "confirmation_id_name": CONFIRMATION_ID,
+            "confirmation_version_name": CONFIRMATION_VERSION,
+            "post_stashed": self.stash_confirmation_post,
             "formsets": formsets,
             **(extra_context or {}),
         }
         return self.render_change_confirmation(request, context)
 
+    def run_in_background(self, func: Callable, request: HttpRequest, queryset_or_object):
+        "Record the confirmed action as a job run by the job executor, and redirect to its progress page at once."
+        # Models can not be imported along with the mixins, while the apps are loading
+        from admin_action_tools.jobs import create_job  # pylint: disable=C0415
+
+        tool_chain: ToolChain = get_tool_chain(request)
+        object_action = not isinstance(queryset_or_object, QuerySet)
+        if object_action:
+            selection = Selection.from_pks([queryset_or_object.pk], type(queryset_or_object))
+        else:
+            selection = self.get_selection(request, queryset_or_object)
+        if not selection:
+            self.message_user(request, _("No objects are selected, the action was not run."), messages.ERROR)
+            return None
+
+        try:
+            job = create_job(self, request, func, selection, tool_chain.get_toolchain(), object_action)
+        except LookupError as error:
+            log(f"Warning: {error}")
+            self.message_user(
+                request,
+                _("%(action)s can not be run in the background.") % {"action": snake_to_title_case(func.__name__)},
+                messages.ERROR,
+            )
+            return None
+        tool_chain.clear_tool_chain()
+        self.message_user(
+            request,
+            _("%(action)s is running in the background (job #%(job)s).")
+            % {"action": snake_to_title_case(func.__name__), "job": job.pk},
+        )
+        return HttpResponseRedirect(self._get_admin_url("action_job", job.pk))
+
     def run_confirm_tool(
-        self, func: Callable, request: HttpRequest, queryset_or_object, display_form: bool, display_queryset: bool
+        self,
+        func: Callable,
+        request: HttpRequest,
+        queryset_or_object,
+        display_form: bool,
+        display_queryset: bool,
+        lazy_queryset: bool = False,
+        summary: Optional[ActionSummary] = None,
+        background: bool = False,
     ):
-        tool_chain: ToolChain = ToolChain(request)
+        tool_chain: ToolChain = get_tool_chain(request)
         step = tool_chain.get_next_step(CONFIRM_ACTION)
 
         # First called by `Go` which would not have confirm_action in params
         if step == ToolAction.CONFIRMED:
+            if background:
+                return self.run_in_background(func, request, queryset_or_object)
             return func(self, request, queryset_or_object)
 
         if step == ToolAction.CANCEL:
@@ -420,7 +597,7 @@ class AdminConfirmMixin(BaseMixin):
         context = {
             **self.admin_site.each_context(request),
             "title": title,
-            "queryset": queryset if display_queryset else [],
+            **self.get_queryset_context(request, queryset, display_queryset, lazy_queryset),
             "has_perm": has_perm,
             "action": func.__name__,
             "action_display_name": action_display_name,
@@ -431,30 +608,47 @@ class AdminConfirmMixin(BaseMixin):
             "back_text": "Back",
             "forms": form_instance,
             "readonly": True,
+            "summary": summary.compute(queryset) if summary else None,
         }
 
         # Display confirmation page
         return self.render_action_confirmation(request, context)
 
 
-def confirm_action(display_form=True, display_queryset=True):
+def confirm_action(display_form=True, display_queryset=True, lazy_queryset=False, summary=None, background=False):
     """
     @confirm_action() function wrapper for Django ModelAdmin actions
     Will redirect to a confirmation page to ask for confirmation
 
     Next, it would call the action if confirmed. Otherwise, it would
     return to the changelist without performing action.
+
+    With lazy_queryset, the selected queryset is never evaluated in full by the confirmation page,
+    only counted and previewed.
+    With summary, an ActionSummary, the confirmation page shows the selection counted
+    and aggregated by the database, grouped by some fields.
+    With background, the confirmed action is recorded as a job and run by the job executor,
+    the user is redirected at once. It must then be the last tool of the action.
     """
 
     def confirm_action_decorator(func):
+        if background and hasattr(func, FUNCTION_MARKER):
+            raise ImproperlyConfigured("@confirm_action(background=True) must be the last tool of the action")
+        action = func
 
         # make sure tools chain is setup
         func = add_finishing_step(func)
 
         @functools.wraps(func)
+        @persist_tool_chain
         def func_wrapper(modeladmin: AdminConfirmMixin, request, queryset_or_object):
-            return modeladmin.run_confirm_tool(func, request, queryset_or_object, display_form, display_queryset)
+            return modeladmin.run_confirm_tool(
+                func, request, queryset_or_object, display_form, display_queryset, lazy_queryset, summary, background
+            )
 
+        if background:
+            # Kept by the wrappers of the other tools, for the job to call the action itself
+            setattr(func_wrapper, BACKGROUND_MARKER, action)
         return func_wrapper
 
     return confirm_action_decorator
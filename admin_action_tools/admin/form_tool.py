@@ -1,5 +1,4 @@
 import functools
-from importlib import import_module
 from typing import Callable, Dict
 
 from django import forms
@@ -10,7 +9,13 @@ from django.http import HttpRequest
 
 from admin_action_tools.admin.base import BaseMixin
 from admin_action_tools.constants import CONFIRM_FORM, ToolAction
-from admin_action_tools.toolchain import ToolChain, add_finishing_step
+from admin_action_tools.form_cache import get_form_cache, get_form_class
+from admin_action_tools.toolchain import (
+    ToolChain,
+    add_finishing_step,
+    get_tool_chain,
+    persist_tool_chain,
+)
 from admin_action_tools.utils import snake_to_title_case
 
 
@@ -27,6 +32,7 @@ class ActionFormMixin(BaseMixin):
         form_instance: Form,
         tool_name: str,
         display_queryset: bool,
+        lazy_queryset: bool = False,
     ):
         action_display_name = snake_to_title_case(func.__name__)
         title = f"Configure Action: {action_display_name}"
@@ -39,7 +45,7 @@ class ActionFormMixin(BaseMixin):
             "action_display_name": action_display_name,
             "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
             "submit_name": "confirm_action",
-            "queryset": queryset if display_queryset else [],
+            **self.get_queryset_context(request, queryset, display_queryset, lazy_queryset),
             "media": self.media + form_instance.media,
             "opts": opts,
             "form": form_instance,
@@ -63,17 +69,21 @@ class ActionFormMixin(BaseMixin):
 
     @staticmethod
     def load_form(data, metadata):
-        # import_module use sys.module as a caching mechanism
-        module = import_module(metadata["module"])
-        form = getattr(module, metadata["name"])
+        form = get_form_class(metadata)
         form_instance: Form = form(data)
         form_instance.is_valid()
         return form_instance
 
     def run_form_tool(
-        self, func: Callable, request: HttpRequest, queryset_or_object, form: forms, display_queryset: bool
+        self,
+        func: Callable,
+        request: HttpRequest,
+        queryset_or_object,
+        form: forms,
+        display_queryset: bool,
+        lazy_queryset: bool = False,
     ):
-        tool_chain: ToolChain = ToolChain(request)
+        tool_chain: ToolChain = get_tool_chain(request)
         tool_name = f"{CONFIRM_FORM}_{form.__name__}"
         step = tool_chain.get_next_step(tool_name)
 
@@ -88,6 +98,8 @@ class ActionFormMixin(BaseMixin):
             if form_instance.is_valid():
                 metadata = self.__get_metadata(form)
                 tool_chain.set_tool(tool_name, form_instance.data, metadata=metadata)
+                form_cache = get_form_cache(request)
+                form_cache.add(form_cache.get_key(*tool_chain.get_tool(tool_name)), form_instance)
                 return func(self, request, queryset_or_object)
         elif step in {ToolAction.FORWARD, ToolAction.CANCEL}:
             # forward to next
@@ -96,18 +108,23 @@ class ActionFormMixin(BaseMixin):
             form_instance = form()
 
         queryset: QuerySet = self.to_queryset(request, queryset_or_object)
-        context = self.build_context(request, func, queryset, form_instance, tool_name, display_queryset)
+        context = self.build_context(
+            request, func, queryset, form_instance, tool_name, display_queryset, lazy_queryset
+        )
 
         # Display form
         return self.render_action_form(request, context)
 
 
-def add_form_to_action(form: Form, display_queryset=True):
+def add_form_to_action(form: Form, display_queryset=True, lazy_queryset=False):
     """
     @add_form_to_action function wrapper for Django ModelAdmin actions
     Will redirect to a form page to ask for more information
 
     Next, it would call the action with the form data.
+
+    With lazy_queryset, the selected queryset is never evaluated in full by the form page,
+    only counted and previewed.
     """
 
     def add_form_to_action_decorator(func):
@@ -116,8 +133,9 @@ def add_form_to_action(form: Form, display_queryset=True):
         func = add_finishing_step(func)
 
         @functools.wraps(func)
+        @persist_tool_chain
         def func_wrapper(modeladmin: ActionFormMixin, request, queryset_or_object):
-            return modeladmin.run_form_tool(func, request, queryset_or_object, form, display_queryset)
+            return modeladmin.run_form_tool(func, request, queryset_or_object, form, display_queryset, lazy_queryset)
 
         return func_wrapper
 
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class AdminActionToolsConfig(AppConfig):
+    name = "admin_action_tools"
+    verbose_name = "Admin action tools"
+    # Keep the primary keys of the migrations, whatever the DEFAULT_AUTO_FIELD of the project
+    default_auto_field = "django.db.models.AutoField"
@@ -0,0 +1,207 @@
+"""
+Chunked execution of admin actions over large querysets.
+
+@chunked_action gives the action its queryset in pk ordered chunks, each one in its own transaction,
+so locks are only held for a chunk. The last pk of each committed chunk is recorded as a checkpoint:
+a failed, interrupted or cancelled run resumes after it instead of starting over.
+
+Runs can be throttled to a number of rows per second, and their chunk size adapted to the time
+chunks take, so heavy actions can run without starving the database.
+"""
+import functools
+import hashlib
+import time
+from typing import Callable, Optional
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models import QuerySet
+from django.http import HttpRequest
+
+from admin_action_tools.constants import (
+    CACHE_TIMEOUT,
+    CHUNK_MAX_RATE,
+    CHUNK_SIZE,
+    CHUNK_TARGET_LATENCY,
+)
+from admin_action_tools.progress import Progress, get_progress
+from admin_action_tools.utils import ensure_sync, format_cache_key, log
+
+
+class CacheCheckpoint:
+    "Checkpoint of a run in the request, keyed by the action, the user and the selection."
+
+    timeout = CACHE_TIMEOUT
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+
+    def load(self) -> Optional[str]:
+        return cache.get(self.key)
+
+    def save(self, pk: str) -> None:
+        cache.set(self.key, pk, self.timeout)
+
+    def clear(self) -> None:
+        cache.delete(self.key)
+
+
+class JobCheckpoint:
+    "Checkpoint of a run in the background, kept on its job."
+
+    def __init__(self, job) -> None:
+        self.job = job
+
+    def load(self) -> Optional[str]:
+        return self.job.checkpoint or None
+
+    def save(self, pk: str) -> None:
+        self.job.checkpoint = pk
+        self.job.save(update_fields=["checkpoint"])
+
+    def clear(self) -> None:
+        self.save("")
+
+
+def get_checkpoint(request: HttpRequest, func: Callable, queryset: QuerySet):
+    job = getattr(request, "_action_job", None)
+    if job is not None:
+        return JobCheckpoint(job)
+    try:
+        sql = str(queryset.values("pk").query)
+    except EmptyResultSet:
+        sql = ""
+    user_pk = getattr(getattr(request, "user", None), "pk", None)
+    digest = hashlib.sha256(f"{func.__module__}.{func.__qualname__}:{user_pk}:{sql}".encode()).hexdigest()
+    return CacheCheckpoint(format_cache_key(model=queryset.model._meta.model_name, field=digest, namespace="chunk"))
+
+
+class ChunkedRun:
+    """
+    Run of an action over a queryset, chunk by chunk.
+
+    Chunks are bounded by pks (keyset pagination): finding the end of a chunk is a single row query,
+    and a chunk is the queryset restricted to a pk range, whatever its filters.
+
+    With a target_latency, the size of the next chunk is scaled by how long the last one took,
+    at most halved or doubled at once. With a max_rate, the run sleeps after a chunk that went
+    faster than max_rate rows per second.
+    """
+
+    # Bounds of the scaling of the chunk size after each chunk
+    min_scale = 0.5
+    max_scale = 2.0
+
+    def __init__(
+        self,
+        request: HttpRequest,
+        func: Callable,
+        queryset: QuerySet,
+        chunk_size: int,
+        max_rate: Optional[float] = None,
+        target_latency: Optional[float] = None,
+    ) -> None:
+        self.request = request
+        self.func = func
+        self.queryset = queryset.order_by("pk")
+        self.chunk_size = chunk_size
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.checkpoint = get_checkpoint(request, func, queryset)
+
+    def get_remaining(self, last_pk: Optional[str]) -> QuerySet:
+        return self.queryset if last_pk is None else self.queryset.filter(pk__gt=last_pk)
+
+    def get_chunk_end(self, last_pk: Optional[str]):
+        "Pk ending the next chunk, None for the last chunk."
+        return self.get_remaining(last_pk).values_list("pk", flat=True)[self.chunk_size - 1 : self.chunk_size].first()
+
+    def start_progress(self, last_pk: Optional[str]) -> Progress:
+        progress = get_progress(self.request)
+        # Counting is only worth it if the progress is shown
+        if progress.tracked:
+            processed = self.queryset.filter(pk__lte=last_pk).count() if last_pk is not None else 0
+            progress.start(self.queryset.count(), processed)
+        return progress
+
+    def adapt_chunk_size(self, duration: float) -> None:
+        if not self.target_latency:
+            return
+        scale = self.target_latency / max(duration, 1e-6)
+        scale = min(max(scale, self.min_scale), self.max_scale)
+        self.chunk_size = max(int(self.chunk_size * scale), 1)
+
+    def throttle(self, count: int, duration: float) -> None:
+        if not self.max_rate:
+            return
+        delay = count / self.max_rate - duration
+        if delay > 0:
+            time.sleep(delay)
+
+    def run(self, modeladmin, **kwargs) -> None:
+        last_pk = self.checkpoint.load()
+        if last_pk is not None:
+            log(f"Resuming {self.func.__name__} after {last_pk}")
+        progress = self.start_progress(last_pk)
+
+        while True:
+            end_pk = self.get_chunk_end(last_pk)
+            chunk = self.get_remaining(last_pk)
+            if end_pk is not None:
+                chunk = chunk.filter(pk__lte=end_pk)
+            elif not chunk.exists():
+                break
+
+            started = time.monotonic()
+            try:
+                # On the database of the queryset, the one the chunk writes to
+                with transaction.atomic(using=self.queryset.db):
+                    self.func(modeladmin, self.request, chunk, **kwargs)
+            except Exception:
+                progress.add_errors()
+                raise
+            duration = time.monotonic() - started
+
+            if end_pk is None:
+                break
+            last_pk = str(end_pk)
+            self.checkpoint.save(last_pk)
+            progress.advance(self.chunk_size)
+            progress.check_cancelled()
+            self.throttle(self.chunk_size, duration)
+            self.adapt_chunk_size(duration)
+
+        self.checkpoint.clear()
+        progress.finish()
+
+
+def chunked_action(
+    chunk_size: int = CHUNK_SIZE,
+    max_rate: Optional[float] = CHUNK_MAX_RATE,
+    target_latency: Optional[float] = CHUNK_TARGET_LATENCY,
+):
+    """
+    @chunked_action() function wrapper for Django ModelAdmin actions
+    Calls the action with pk ordered chunks of its queryset, each chunk in its own transaction.
+
+    Goes under the tools of the action, which still get the whole queryset.
+    A run that failed resumes after its last committed chunk when the action is confirmed again.
+
+    max_rate caps the rows processed per second, target_latency (in seconds) adapts the chunk size
+    to the time chunks take, chunk_size being the size of the first chunk.
+    """
+
+    def chunked_action_decorator(func):
+        action = ensure_sync(func)
+
+        @functools.wraps(func)
+        def func_wrapper(modeladmin, request, queryset_or_object, **kwargs):
+            if not isinstance(queryset_or_object, QuerySet):
+                return action(modeladmin, request, queryset_or_object, **kwargs)
+            run = ChunkedRun(request, action, queryset_or_object, chunk_size, max_rate, target_latency)
+            return run.run(modeladmin, **kwargs)
+
+        return func_wrapper
+
+    return chunked_action_decorator
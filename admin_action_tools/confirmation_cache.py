@@ -0,0 +1,98 @@
+import pickle  # nosec
+import re
+import uuid
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.db.models import FileField, ImageField, Model
+from django.http import HttpRequest, QueryDict
+from django.utils.crypto import salted_hmac
+
+from admin_action_tools.constants import CACHE_KEYS, CACHE_TIMEOUT, CONFIRMATION_ID
+from admin_action_tools.file_cache import get_file_cache
+from admin_action_tools.utils import format_cache_key, log
+
+CONFIRMATION_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+def get_session_namespace(request: HttpRequest) -> str:
+    """
+    Short, non reversible identifier of the session of the request
+    """
+    session = request.session
+    if session.session_key is None:
+        session.save()
+    return salted_hmac("admin_action_tools.confirmation_cache", session.session_key).hexdigest()[:16]
+
+
+class ConfirmationCache:
+    """
+    Cache entries of a single change/add confirmation.
+
+    Keys are namespaced per session and per confirmation, so concurrent editors
+    never read, overwrite or clear each other's cached objects and files.
+    Entries expire after CACHE_TIMEOUT or are cleared once the confirmation is received.
+    """
+
+    def __init__(self, request: HttpRequest, model: Model, confirmation_id: Optional[str] = None):
+        self.model = model
+        self.confirmation_id = confirmation_id or uuid.uuid4().hex
+        self.namespace = f"{get_session_namespace(request)}__{self.confirmation_id}"
+        self.file_cache = get_file_cache()
+
+    @classmethod
+    def from_request(cls, request: HttpRequest, model: Model) -> Optional["ConfirmationCache"]:
+        """
+        Returns the confirmation cache referenced by the submitted confirmation, if any
+        """
+        confirmation_id = request.POST.get(CONFIRMATION_ID, "")
+        if not CONFIRMATION_ID_PATTERN.fullmatch(confirmation_id):
+            return None
+        return cls(request, model, confirmation_id)
+
+    def _key(self, name: str) -> str:
+        return format_cache_key(model=self.model.__name__, field=name, namespace=self.namespace)
+
+    def _file_fields(self) -> List[str]:
+        return [field.name for field in self.model._meta.get_fields() if isinstance(field, (FileField, ImageField))]
+
+    def set_object(self, obj: Model):
+        cache.set(self._key(CACHE_KEYS["object"]), obj, CACHE_TIMEOUT)
+
+    def get_object(self) -> Optional[Model]:
+        return cache.get(self._key(CACHE_KEYS["object"]))
+
+    def set_post(self, post: QueryDict):
+        cache.set(self._key(CACHE_KEYS["post"]), post.urlencode(), CACHE_TIMEOUT)
+
+    def get_post(self) -> Optional[QueryDict]:
+        post = cache.get(self._key(CACHE_KEYS["post"]))
+        return None if post is None else QueryDict(post)
+
+    def set_validated(self, validated: Dict):
+        "Keep the cleaned data of the form and formsets of the confirmation, if it can be pickled."
+        try:
+            cache.set(self._key(CACHE_KEYS["validated"]), validated, CACHE_TIMEOUT)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            log("Warning: validated data of the confirmation can not be cached")
+
+    def get_validated(self) -> Optional[Dict]:
+        return cache.get(self._key(CACHE_KEYS["validated"]))
+
+    def set_file(self, field_name: str, upload):
+        self.file_cache.set(self._key(field_name), upload)
+
+    def get_file(self, field_name: str):
+        return self.file_cache.get(self._key(field_name))
+
+    def promote_file(self, field_name: str, obj: Model, upload):
+        "Assign the cached upload to the file field of obj."
+        self.file_cache.promote(self._key(field_name), obj, field_name, upload)
+
+    def clear(self):
+        "Delete every entry of this confirmation."
+        log(f"Clearing confirmation cache {self.confirmation_id}")
+        self.file_cache.close()
+        cache.delete_many([self._key(name) for name in CACHE_KEYS.values()])
+        for field_name in self._file_fields():
+            self.file_cache.delete(self._key(field_name))
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from enum import Enum
 
 from django.conf import settings
@@ -11,23 +13,67 @@ SAVE_ACTIONS = [SAVE, SAVE_AS_NEW, ADD_ANOTHER, SAVE_AND_CONTINUE]
 CONFIRM_ADD = "_confirm_add"
 CONFIRM_CHANGE = "_confirm_change"
 CONFIRMATION_RECEIVED = "_confirmation_received"
+CONFIRMATION_ID = "_confirmation_id"
+CONFIRMATION_VERSION = "_confirmation_version"
+TOOLCHAIN_TOKEN = "_toolchain"
+SELECTION_TOKEN = "_selection"
 CONFIRM_ACTION = "_confirm_action"
 CONFIRM_FORM = "_form_action"
 BACK = "_back"
 CANCEL = "_cancel"
 
 CACHE_TIMEOUT = getattr(settings, "ADMIN_CONFIRM_CACHE_TIMEOUT", 1000)
+# Names of the entries cached for each confirmation, see ConfirmationCache
 CACHE_KEYS = {
-    "object": "admin_confirm__confirmation_object",
-    "post": "admin_confirm__confirmation_request_post",
+    "object": "confirmation_object",
+    "post": "confirmation_request_post",
+    "validated": "confirmation_validated_data",
 }
+# Stash the submitted form of change confirmations in the cache, the confirmation only posts its id
+STASH_POST = getattr(settings, "ADMIN_CONFIRM_STASH_POST", False)
+# Save confirmed changes with the cleaned data validated for the confirmation page, if the submission is the same
+REUSE_VALIDATION = getattr(settings, "ADMIN_CONFIRM_REUSE_VALIDATION", False)
 CACHE_KEY_PREFIX = getattr(settings, "ADMIN_CONFIRM_CACHE_KEY_PREFIX", "admin_confirm__file_cache")
+# Files are cached in chunks to stay below the item size limit of cache backends (1MB for memcached)
+FILE_CACHE_CHUNK_SIZE = getattr(settings, "ADMIN_CONFIRM_FILE_CACHE_CHUNK_SIZE", 512 * 1024)
+FILE_CACHE_BACKEND = getattr(settings, "ADMIN_CONFIRM_FILE_CACHE_BACKEND", "admin_action_tools.file_cache.FileCache")
+FILE_CACHE_DIR = getattr(
+    settings, "ADMIN_CONFIRM_FILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "admin_action_tools")
+)
+FILE_CACHE_STORAGE = getattr(settings, "ADMIN_CONFIRM_FILE_CACHE_STORAGE", None)
+FILE_CACHE_STORAGE_PREFIX = getattr(settings, "ADMIN_CONFIRM_FILE_CACHE_STORAGE_PREFIX", "admin_action_tools/pending/")
+
+M2M_PREVIEW_LIMIT = getattr(settings, "ADMIN_CONFIRM_M2M_PREVIEW_LIMIT", 10)
+# Should be at least 2, to tell a single selected object apart
+PREVIEW_LIMIT = getattr(settings, "ADMIN_CONFIRM_PREVIEW_LIMIT", 100)
+
+TOOLCHAIN_STORAGE = getattr(
+    settings, "ADMIN_CONFIRM_TOOLCHAIN_STORAGE", "admin_action_tools.toolchain.SessionToolChainStorage"
+)
+
+# Runs the actions confirmed with @confirm_action(background=True), see admin_action_tools.jobs
+JOB_EXECUTOR = getattr(settings, "ADMIN_CONFIRM_JOB_EXECUTOR", "admin_action_tools.jobs.ThreadPoolJobExecutor")
+JOB_WORKERS = getattr(settings, "ADMIN_CONFIRM_JOB_WORKERS", 2)
+# Progress of the jobs is kept in the cache for this long, in seconds
+PROGRESS_TIMEOUT = getattr(settings, "ADMIN_CONFIRM_PROGRESS_TIMEOUT", 24 * 60 * 60)
+# Objects given at once to the actions decorated with @chunked_action
+CHUNK_SIZE = getattr(settings, "ADMIN_CONFIRM_CHUNK_SIZE", 500)
+# Rows per second processed by chunked actions, None for no limit
+CHUNK_MAX_RATE = getattr(settings, "ADMIN_CONFIRM_CHUNK_MAX_RATE", None)
+# Seconds a chunk should take, the chunk size is adapted to it. None keeps the chunk size fixed
+CHUNK_TARGET_LATENCY = getattr(settings, "ADMIN_CONFIRM_CHUNK_TARGET_LATENCY", None)
+# Processes running the shards of the actions decorated with @parallel_action
+PARALLEL_WORKERS = getattr(settings, "ADMIN_CONFIRM_PARALLEL_WORKERS", os.cpu_count() or 1)
 
 
 DEBUG = getattr(settings, "ADMIN_CONFIRM_DEBUG", False)
 
 
 FUNCTION_MARKER = "__finish_step__"
+# Set on the tools of an action run in the background, holds the action function itself
+BACKGROUND_MARKER = "__background_action__"
+# Set on the tools of an action run in parallel, holds the action function itself
+PARALLEL_MARKER = "__parallel_action__"
 
 
 class ToolAction(Enum):
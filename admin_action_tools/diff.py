@@ -0,0 +1,234 @@
+import hashlib
+from typing import Dict, List, Optional, Set, Tuple, Type
+
+from django.db import router
+from django.db.models import FileField, ImageField, ManyToManyField, Model, QuerySet
+from django.forms import ModelForm
+
+from admin_action_tools.constants import M2M_PREVIEW_LIMIT
+
+
+class FieldChange:
+    "A field whose submitted value differs from its reference value."
+
+    def __init__(self, field, initial_value, new_value):
+        self.field = field
+        self.initial_value = initial_value
+        self.new_value = new_value
+
+    @property
+    def name(self) -> str:
+        return self.field.name
+
+    def display(self) -> List:
+        """
+        Values to show on the confirmation page as [initial, new]
+        """
+        if not isinstance(self.field, (FileField, ImageField)):
+            return [self.initial_value, self.new_value]
+
+        if self.initial_value:
+            if self.new_value is False:
+                # Clear has been selected
+                return [self.initial_value.name, None]
+            if self.new_value:
+                return [self.initial_value.name, self.new_value.name]
+            # No cover: Technically doesn't get called in current code because
+            # a FieldChange is only built if there was a difference in the data
+            return [self.initial_value.name, self.initial_value.name]  # pragma: no cover
+
+        if self.new_value:
+            return [None, self.new_value.name]
+
+        return [None, None]
+
+
+class ManyToManyDelta:
+    """
+    Members added to or removed from a ManyToManyField.
+
+    Only a capped preview of the members is loaded for display.
+    """
+
+    def __init__(self, label: str, sign: str, field: ManyToManyField, keys: Set, loaded=None):
+        self.label = label
+        self.sign = sign
+        self.field = field
+        self.keys = keys
+        self.count = len(keys)
+        self._loaded = loaded
+        self._preview = None
+
+    def __str__(self) -> str:
+        return f"{self.sign}{self.count} {self.label}"
+
+    @property
+    def preview(self) -> List[Model]:
+        if self._preview is None:
+            target = self.field.m2m_reverse_target_field_name()
+            if self._loaded is not None:
+                # Members are already loaded by the form, no need to query them again
+                members = [obj for obj in self._loaded if getattr(obj, target) in self.keys]
+            else:
+                keys = sorted(self.keys, key=str)[:M2M_PREVIEW_LIMIT]
+                members = self.field.related_model._default_manager.filter(**{f"{target}__in": keys})
+            self._preview = list(members[:M2M_PREVIEW_LIMIT]) if self.keys else []
+        return self._preview
+
+    @property
+    def remaining(self) -> int:
+        return max(self.count - M2M_PREVIEW_LIMIT, 0)
+
+
+class ManyToManyChange(FieldChange):
+    """
+    Changes of a ManyToManyField computed with set arithmetic on the related keys.
+
+    initial_value - keys of the related objects currently linked
+    new_value - objects selected in the form, a queryset for ModelMultipleChoiceFields
+
+    Only the keys of a queryset are loaded, added and removed members are fetched for display.
+    """
+
+    def __init__(self, field, initial_value: Set, new_value):
+        super().__init__(field, initial_value, new_value)
+        target = field.m2m_reverse_target_field_name()
+        loaded = None
+        if isinstance(new_value, QuerySet):
+            new_keys = set(new_value.values_list(target, flat=True))
+        else:
+            loaded = list(new_value or [])
+            new_keys = {getattr(obj, target) for obj in loaded}
+        self.added = ManyToManyDelta("added", "+", field, new_keys - initial_value, loaded=loaded)
+        self.removed = ManyToManyDelta("removed", "\u2212", field, initial_value - new_keys)
+
+    def __bool__(self) -> bool:
+        return bool(self.added.count or self.removed.count)
+
+    def __str__(self) -> str:
+        return f"{self.added} / {self.removed}"
+
+    def display(self) -> List:
+        return [self.removed, self.added]
+
+
+class ChangeDiff:
+    """
+    Diff of a submitted ModelForm against the values it is replacing.
+
+    When adding, the reference values are the field defaults.
+    When changing, a single snapshot of the object is loaded from the database
+    and every field (including ManyToManyFields) is compared against it.
+    The version of the snapshot, a hash of its row, tells later whether the object changed since.
+
+    form - Submitted and validated form that is attempting to alter the obj
+    model - the model class of the obj
+    obj - instance of model which is being altered
+    add - are we attempting to add the obj or does it already exist in the database
+    """
+
+    def __init__(self, form: ModelForm, model: Type[Model], obj: Optional[Model] = None, add: bool = False):
+        self.form = form
+        self.model = model
+        self.add = add
+        # Note: the form has already applied its cleaned data to obj, so obj can not be used as reference
+        self.version: Optional[str] = None
+        self.snapshot = None if add else self.load_snapshot(model, obj)
+        self.changes: Dict[str, FieldChange] = self._compute_changes()
+
+    @staticmethod
+    def get_snapshot_fields(model: Type[Model]) -> List[str]:
+        return [field.attname for field in model._meta.concrete_fields]
+
+    @staticmethod
+    def get_version(row: Tuple) -> str:
+        "Compact hash of the row of an object."
+        return hashlib.sha256(repr(tuple(row)).encode()).hexdigest()[:20]
+
+    @classmethod
+    def load_version(cls, model: Type[Model], **lookup) -> Optional[str]:
+        """
+        Version of the object in the database, in a single query on an indexed field.
+        Many to many fields are not part of it.
+        """
+        row = model._base_manager.filter(**lookup).values_list(*cls.get_snapshot_fields(model)).first()
+        return None if row is None else cls.get_version(row)
+
+    def load_snapshot(self, model: Type[Model], obj: Model) -> Model:
+        fields = self.get_snapshot_fields(model)
+        row = model._base_manager.filter(pk=obj.pk).values_list(*fields).get()
+        self.version = self.get_version(row)
+        return model.from_db(router.db_for_read(model), fields, row)
+
+    def _get_initial_value(self, field_object):
+        if self.add:
+            return field_object.get_default()
+        return getattr(self.snapshot, field_object.name)
+
+    def _get_related_keys(self, field_object: ManyToManyField) -> Set:
+        """
+        Keys of the objects linked to the snapshot, read from the through table in one query
+        """
+        if self.add:
+            return set()
+        through = field_object.remote_field.through
+        source_value = getattr(self.snapshot, field_object.m2m_target_field_name())
+        return set(
+            through._default_manager.filter(**{field_object.m2m_field_name(): source_value}).values_list(
+                field_object.m2m_reverse_field_name(), flat=True
+            )
+        )
+
+    def _get_relation_change(self, field_object, new_value) -> Optional[FieldChange]:
+        """
+        Compare the key of a ForeignKey or OneToOneField of the snapshot with the submitted object,
+        the related object of the snapshot is only loaded for display if they differ
+        """
+        initial_key = getattr(self.snapshot, field_object.attname)
+        new_key = None if new_value is None else getattr(new_value, field_object.target_field.attname)
+        if initial_key == new_key:
+            return None
+        return FieldChange(field_object, getattr(self.snapshot, field_object.name), new_value)
+
+    def _compute_changes(self) -> Dict[str, FieldChange]:
+        changes = {}
+        # Parse the changed data - Note that using form.changed_data would not work because initial is not set
+        for name, new_value in self.form.cleaned_data.items():
+            field_object = self.model._meta.get_field(name)
+            if isinstance(field_object, ManyToManyField):
+                change = ManyToManyChange(field_object, self._get_related_keys(field_object), new_value)
+                if change:
+                    changes[name] = change
+                continue
+
+            if not self.add and field_object.is_relation and field_object.concrete:
+                change = self._get_relation_change(field_object, new_value)
+                if change:
+                    changes[name] = change
+                continue
+
+            initial_value = self._get_initial_value(field_object)
+            if self.add and new_value is None:
+                # Don't consider default values as changed for adding
+                continue
+            if initial_value != new_value:
+                changes[name] = FieldChange(field_object, initial_value, new_value)
+        return changes
+
+    def __bool__(self) -> bool:
+        return bool(self.changes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.changes
+
+    def __iter__(self):
+        return iter(self.changes.values())
+
+    def changed_fields(self) -> List[str]:
+        return list(self.changes.keys())
+
+    def as_dict(self) -> Dict[str, List]:
+        """
+        Returns a dictionary of the fields and their changed values to display
+        """
+        return {name: change.display() for name, change in self.changes.items()}
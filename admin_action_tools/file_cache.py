@@ -27,27 +27,117 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from django.core.files.uploadedfile import InMemoryUploadedFile
-
-try:
-    from cStringIO import StringIO as BytesIO  # noqa: WPS433
-except ImportError:
-    from io import BytesIO  # noqa: WPS433, WPS440
+import io
+import mimetypes
+import os
+import posixpath
+import random
+import re
+import time
+import uuid
+from typing import Optional
 
 from django.core.cache import cache
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.utils.module_loading import import_string
 
-from admin_action_tools.constants import CACHE_TIMEOUT
+from admin_action_tools.constants import (
+    CACHE_TIMEOUT,
+    FILE_CACHE_BACKEND,
+    FILE_CACHE_CHUNK_SIZE,
+    FILE_CACHE_DIR,
+    FILE_CACHE_STORAGE,
+    FILE_CACHE_STORAGE_PREFIX,
+)
 from admin_action_tools.utils import log
 
 
+class CachedChunksFile(io.RawIOBase):
+    """
+    Read only file streaming the chunks of a cached upload.
+
+    Only the chunk currently being read is held in memory.
+    """
+
+    def __init__(self, cache_backend, key, size, chunk_size, chunks):
+        super().__init__()
+        self.cache = cache_backend
+        self.key = key
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunks = chunks
+        self.position = 0
+        self._chunk_index = None
+        self._chunk = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def _load_chunk(self, index):
+        if index != self._chunk_index:
+            chunk = self.cache.get(FileCache.chunk_key(self.key, index))
+            if chunk is None:
+                raise IOError(f"Chunk {index} of cached file {self.key} has expired")
+            self._chunk_index = index
+            self._chunk = chunk
+        return self._chunk
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+        index, offset = divmod(self.position, self.chunk_size)
+        data = self._load_chunk(index)[offset : offset + len(buffer)]
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
 class FileCache(object):
-    "Cache file data and retain the file upon confirmation."
+    """
+    Cache file data and retain the file upon confirmation.
+
+    Files are stored in chunks of `chunk_size` bytes under their own cache keys,
+    next to a small manifest stored under the file key. This keeps every cache item
+    below the size limit of backends such as memcached and bounds memory usage by the chunk size.
+    """
 
     timeout = CACHE_TIMEOUT
+    chunk_size = FILE_CACHE_CHUNK_SIZE
 
     def __init__(self):
         self.cache = cache
         self.cached_keys = []
+        # Files handed out by get, closed by close
+        self.opened_files = []
+
+    @staticmethod
+    def chunk_key(key, index):
+        return f"{key}__chunk__{index}"
+
+    def _read_chunks(self, upload):
+        # Note: InMemoryUploadedFile.chunks ignores the chunk size
+        upload.file.seek(0)
+        chunk = upload.file.read(self.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = upload.file.read(self.chunk_size)
 
     def set(self, key, upload):
         """
@@ -57,12 +147,17 @@ class FileCache(object):
         :param upload: file data
         """
         try:  # noqa: WPS229
+            chunks = 0
+            for index, chunk in enumerate(self._read_chunks(upload)):
+                self.cache.set(self.chunk_key(key, index), chunk, self.timeout)
+                chunks = index + 1
             state = {
                 "name": upload.name,
                 "size": upload.size,
                 "content_type": upload.content_type,
                 "charset": upload.charset,
-                "content": upload.file.read(),
+                "chunk_size": self.chunk_size,
+                "chunks": chunks,
             }
             upload.file.seek(0)
             self.cache.set(key, state, self.timeout)
@@ -76,36 +171,356 @@ class FileCache(object):
         Get the file data from cache using specific cache key
 
         :param key: cache key
-        :return: File data
+        :return: File data, streamed lazily from the cache
         """
         upload = None
         state = self.cache.get(key)
+        if state and not self._has_chunks(key, state["chunks"]):
+            # Chunks are evicted on their own, a file with a missing chunk is not cached anymore
+            log(f"Warning: file cache with {key} lost some of its chunks")
+            state = None
         if state:
-            file = BytesIO()
-            file.write(state["content"])
-            upload = InMemoryUploadedFile(
-                file=file,
-                field_name="file",
+            file = CachedChunksFile(self.cache, key, state["size"], state["chunk_size"], state["chunks"])
+            upload = UploadedFile(
+                file=io.BufferedReader(file, buffer_size=state["chunk_size"]),
                 name=state["name"],
                 content_type=state["content_type"],
                 size=state["size"],
                 charset=state["charset"],
             )
-            upload.file.seek(0)
+            self.opened_files.append(upload)
             log(f"Getting file cache with {key}")
         return upload
 
+    def _has_chunks(self, key, chunks):
+        chunk_keys = [self.chunk_key(key, index) for index in range(chunks)]
+        return len(self.cache.get_many(chunk_keys)) == chunks
+
+    def promote(self, key, instance, field_name, upload):
+        """
+        Assign a cached file to the file field of instance, it is saved with the instance
+
+        :param key: cache key
+        :param instance: model instance receiving the file
+        :param field_name: name of the file field
+        :param upload: file data, as returned by get
+        """
+        setattr(instance, field_name, upload)
+
+    def close(self):
+        "Close the files handed out by get."
+        for upload in self.opened_files:
+            upload.close()
+        self.opened_files = []
+
+    def _keys(self, key):
+        state = self.cache.get(key) or {}
+        return [key] + [self.chunk_key(key, index) for index in range(state.get("chunks", 0))]
+
     def delete(self, key):
         """
         Delete file data from cache
 
         :param key: cache key
         """
-        self.cache.delete(key)
-        self.cached_keys.remove(key)
+        self.cache.delete_many(self._keys(key))
+        if key in self.cached_keys:
+            self.cached_keys.remove(key)
 
     def delete_all(self):
         "Delete all cached file data from cache."
         if self.cached_keys:
-            self.cache.delete_many(self.cached_keys)
+            self.cache.delete_many([chunk_key for key in self.cached_keys for chunk_key in self._keys(key)])
             self.cached_keys = []
+
+
+class SpooledUploadedFile(UploadedFile):
+    """
+    Upload kept on disk by DiskFileCache.
+
+    Exposes temporary_file_path so that FileSystemStorage moves the file into place
+    instead of copying its content.
+    """
+
+    def __init__(self, path, name, content_type, size, charset):
+        super().__init__(open(path, "rb"), name, content_type, size, charset)  # pylint: disable=R1732
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class DiskFileCache(FileCache):
+    """
+    Keep uploads on disk in a spool directory, only a small manifest is cached.
+
+    Uploads already spooled to disk by Django (TemporaryUploadedFile) are hard linked
+    (or moved, if the spool directory is on another device) instead of being read in memory.
+    """
+
+    spool_dir = FILE_CACHE_DIR
+    spool_file_pattern = re.compile(r"[0-9a-f]{32}")
+    # Share of the writes purging the expired files, the purge_file_cache command purges them on demand
+    purge_probability = 0.01
+
+    def _spool(self, upload) -> str:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, uuid.uuid4().hex)
+        if hasattr(upload, "temporary_file_path"):
+            try:
+                os.link(upload.temporary_file_path(), path)
+            except OSError:
+                file_move_safe(upload.temporary_file_path(), path)
+        else:
+            with open(path, "wb") as spooled:
+                for chunk in self._read_chunks(upload):
+                    spooled.write(chunk)
+            upload.file.seek(0)
+        return path
+
+    def purge_expired(self):
+        "Delete spooled files older than the cache timeout."
+        if not os.path.isdir(self.spool_dir):
+            return
+        expired_before = time.time() - self.timeout
+        for entry in os.scandir(self.spool_dir):
+            if self.spool_file_pattern.fullmatch(entry.name) and entry.stat().st_mtime < expired_before:
+                self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def set(self, key, upload):
+        """
+        Spool the file to disk and cache its manifest
+
+        :param key: cache key
+        :param upload: file data
+        """
+        if random.random() < self.purge_probability:  # nosec
+            self.purge_expired()
+        state = {
+            "name": upload.name,
+            "size": upload.size,
+            "content_type": upload.content_type,
+            "charset": upload.charset,
+            "path": self._spool(upload),
+        }
+        self.cache.set(key, state, self.timeout)
+        log(f"Setting disk file cache with {key}")
+        self.cached_keys.append(key)
+
+    def get(self, key):
+        """
+        Reopen the spooled file using specific cache key
+
+        :param key: cache key
+        :return: File data, read from the spooled file
+        """
+        state = self.cache.get(key)
+        if not state or not os.path.exists(state["path"]):
+            return None
+        log(f"Getting disk file cache with {key}")
+        upload = SpooledUploadedFile(
+            path=state["path"],
+            name=state["name"],
+            content_type=state["content_type"],
+            size=state["size"],
+            charset=state["charset"],
+        )
+        self.opened_files.append(upload)
+        return upload
+
+    def delete(self, key):
+        """
+        Delete the spooled file and its manifest
+
+        :param key: cache key
+        """
+        state = self.cache.get(key)
+        if state:
+            self._remove(state["path"])
+        self.cache.delete(key)
+        if key in self.cached_keys:
+            self.cached_keys.remove(key)
+
+    def delete_all(self):
+        "Delete all spooled files and their manifests."
+        for key in list(self.cached_keys):
+            self.delete(key)
+
+
+class StoredUpload(File):
+    "Pending upload kept in the storage of StorageFileCache."
+
+    def __init__(self, file, name, storage_name, content_type, size, charset):
+        super().__init__(file, name)
+        self.storage_name = storage_name
+        self.content_type = content_type
+        self.size = size
+        self.charset = charset
+
+
+class StorageFileCache(FileCache):
+    """
+    Keep uploads in a Django storage under a temporary prefix, only a small manifest is cached.
+
+    Uploads are streamed to the storage (S3 storages use a multipart upload for large files).
+    On confirmation, the pending file is copied server side to its final name
+    instead of being uploaded again by the web worker.
+    """
+
+    prefix = FILE_CACHE_STORAGE_PREFIX
+
+    def __init__(self):
+        super().__init__()
+        self.storage = import_string(FILE_CACHE_STORAGE)() if FILE_CACHE_STORAGE else default_storage
+
+    def set(self, key, upload):
+        """
+        Stream the file to the storage and cache its manifest
+
+        :param key: cache key
+        :param upload: file data
+        """
+        upload.file.seek(0)
+        storage_name = self.storage.save(f"{self.prefix}{uuid.uuid4().hex}/{upload.name}", upload)
+        upload.file.seek(0)
+        state = {
+            "name": upload.name,
+            "size": upload.size,
+            "content_type": upload.content_type,
+            "charset": upload.charset,
+            "storage_name": storage_name,
+        }
+        self.cache.set(key, state, self.timeout)
+        log(f"Setting storage file cache with {key}")
+        self.cached_keys.append(key)
+
+    def get(self, key):
+        """
+        Lazily open the pending file using specific cache key
+
+        :param key: cache key
+        :return: File data, read from the storage
+        """
+        state = self.cache.get(key)
+        if not state or not self.storage.exists(state["storage_name"]):
+            return None
+        log(f"Getting storage file cache with {key}")
+        upload = StoredUpload(
+            file=self.storage.open(state["storage_name"]),
+            name=state["name"],
+            storage_name=state["storage_name"],
+            content_type=state["content_type"],
+            size=state["size"],
+            charset=state["charset"],
+        )
+        self.opened_files.append(upload)
+        return upload
+
+    @staticmethod
+    def _local_path(storage, name):
+        try:
+            return storage.path(name)
+        except NotImplementedError:
+            return None
+
+    @staticmethod
+    def _object_key(storage, name) -> str:
+        "Key of the object of name in the bucket of an S3 storage, under its location."
+        location = getattr(storage, "location", "")
+        return posixpath.join(location, name).lstrip("/") if location else name
+
+    @staticmethod
+    def _copy_parameters(upload, target_storage, target_name) -> Optional[dict]:
+        """
+        Parameters of the object written by a server side copy, as the storage would save it:
+        its object parameters (AWS_S3_OBJECT_PARAMETERS, encryption), default ACL and content type.
+        None when the storage would transform the content (gzip), which a copy can not do.
+        """
+        params = target_storage.get_object_parameters(target_name)
+        params.setdefault("ContentType", upload.content_type or mimetypes.guess_type(target_name)[0])
+        if "ACL" not in params and getattr(target_storage, "default_acl", None):
+            params["ACL"] = target_storage.default_acl
+        if (
+            getattr(target_storage, "gzip", False)
+            and params["ContentType"] in getattr(target_storage, "gzip_content_types", ())
+            and "ContentEncoding" not in params
+        ):
+            return None
+        # Replace the metadata of the pending file with the one of the target
+        params["MetadataDirective"] = "REPLACE"
+        return params
+
+    def _copy(self, upload, target_storage, target_name) -> str:
+        """
+        Copy the pending file to target_name in target_storage, returns the name of the copy
+        """
+        source_bucket = getattr(self.storage, "bucket_name", None)
+        if source_bucket and getattr(target_storage, "bucket_name", None):
+            params = self._copy_parameters(upload, target_storage, target_name)
+            if params is not None:
+                # Server side (multipart) copy between S3 buckets
+                target_storage.bucket.copy(
+                    CopySource={"Bucket": source_bucket, "Key": self._object_key(self.storage, upload.storage_name)},
+                    Key=self._object_key(target_storage, target_name),
+                    ExtraArgs=params,
+                )
+                return target_name
+
+        source_path = self._local_path(self.storage, upload.storage_name)
+        target_path = self._local_path(target_storage, target_name)
+        if source_path and target_path:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            file_move_safe(source_path, target_path)
+            return target_name
+
+        # Upload the file again through the target storage
+        with self.storage.open(upload.storage_name) as content:
+            content.content_type = upload.content_type
+            return target_storage.save(target_name, content)
+
+    def promote(self, key, instance, field_name, upload):
+        """
+        Copy the pending file to the name generated by the file field and assign it to instance
+
+        :param key: cache key
+        :param instance: model instance receiving the file
+        :param field_name: name of the file field
+        :param upload: file data, as returned by get
+        """
+        field = instance._meta.get_field(field_name)
+        target_name = field.storage.get_available_name(
+            field.generate_filename(instance, upload.name), max_length=field.max_length
+        )
+        upload.close()
+        setattr(instance, field.attname, self._copy(upload, field.storage, target_name))
+        log(f"Promoted {upload.storage_name} to {target_name}")
+
+    def delete(self, key):
+        """
+        Delete the pending file and its manifest
+
+        :param key: cache key
+        """
+        state = self.cache.get(key)
+        if state:
+            self.storage.delete(state["storage_name"])
+        self.cache.delete(key)
+        if key in self.cached_keys:
+            self.cached_keys.remove(key)
+
+    def delete_all(self):
+        "Delete all pending files and their manifests."
+        for key in list(self.cached_keys):
+            self.delete(key)
+
+
+def get_file_cache() -> FileCache:
+    "Returns an instance of the configured file cache backend."
+    return import_string(FILE_CACHE_BACKEND)()
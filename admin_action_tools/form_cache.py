@@ -0,0 +1,123 @@
+import hashlib
+import pickle  # nosec
+from importlib import import_module
+from typing import Callable, Dict, List, Optional, Type
+
+from django.core.cache import cache
+from django.forms import BaseFormSet, BaseModelForm, Form
+from django.forms.models import construct_instance
+from django.forms.utils import ErrorDict
+from django.http import HttpRequest, QueryDict
+
+from admin_action_tools.confirmation_cache import get_session_namespace
+from admin_action_tools.constants import CACHE_TIMEOUT
+from admin_action_tools.utils import format_cache_key, log
+
+
+def get_form_class(metadata: Dict) -> Type[Form]:
+    # import_module use sys.module as a caching mechanism
+    module = import_module(metadata["module"])
+    return getattr(module, metadata["name"])
+
+
+def dump_validated_form(form_instance: Form) -> Dict:
+    """
+    Cleaned data of a validated form, to restore it later with restore_validated_form.
+
+    The fields of the instance of a model form are kept too, as cleaned by the model.
+    """
+    validated = {"cleaned_data": form_instance.cleaned_data, "instance": None}
+    if isinstance(form_instance, BaseModelForm):
+        instance = form_instance.instance
+        validated["instance"] = {
+            field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields
+        }
+    return validated
+
+
+def restore_validated_form(form_instance: Form, cleaned_data: Dict, instance_values: Optional[Dict] = None) -> None:
+    """
+    Set a bound form as validated with cleaned_data, without running its validation again.
+
+    The instance of a model form is updated from cleaned_data, but the model is not validated again:
+    the changes of Model.clean() are restored from instance_values if given.
+    """
+    form_instance.cleaned_data = cleaned_data
+    # is_valid does not run the validation again once errors are set
+    form_instance._errors = ErrorDict()  # pylint: disable=W0212
+    if isinstance(form_instance, BaseModelForm):
+        opts = form_instance._meta  # pylint: disable=W0212
+        form_instance.instance = construct_instance(form_instance, form_instance.instance, opts.fields, opts.exclude)
+        for attname, value in (instance_values or {}).items():
+            setattr(form_instance.instance, attname, value)
+
+
+def restore_validated_formset(formset: BaseFormSet, validated_forms: List[Dict]) -> bool:
+    "Set a bound formset as validated with the forms dumped by dump_validated_form, if they are the same forms."
+    if len(validated_forms) != len(formset.forms):
+        return False
+    for form_instance, validated in zip(formset.forms, validated_forms):
+        restore_validated_form(form_instance, dict(validated["cleaned_data"]), validated["instance"])
+    formset._errors = [form_instance.errors for form_instance in formset.forms]  # pylint: disable=W0212
+    formset._non_form_errors = formset.error_class()  # pylint: disable=W0212
+    return True
+
+
+def get_form_cache(request: HttpRequest) -> "FormCache":
+    "Returns the form cache of the request, shared by every tool handling it."
+    if "_form_cache" not in request.__dict__:
+        request._form_cache = FormCache(get_session_namespace(request))
+    return request._form_cache
+
+
+class FormCache:
+    """
+    Validated forms of the tool chain steps, keyed by a hash of the form class and its data.
+
+    A step is validated once: the form is kept for the request and its cleaned data
+    in the cache (for CACHE_TIMEOUT), so later steps and the final call reuse it.
+    Invalid forms are never cached.
+
+    Keys are namespaced per session, like the entries of ConfirmationCache: cleaned data may hold
+    objects the user is allowed to see, so editors submitting the same data never share an entry.
+    """
+
+    timeout = CACHE_TIMEOUT
+
+    def __init__(self, namespace: str):
+        self.cache = cache
+        self.namespace = namespace
+        self.forms: Dict[str, Form] = {}
+
+    def get_key(self, data: QueryDict, metadata: Dict) -> str:
+        digest = hashlib.sha256(f"{metadata['module']}.{metadata['name']}?{data.urlencode()}".encode()).hexdigest()
+        return format_cache_key(model=metadata["name"], field=digest, namespace=f"form__{self.namespace}")
+
+    def _restore(self, key: str, data: QueryDict, metadata: Dict) -> Optional[Form]:
+        cleaned_data = self.cache.get(key)
+        if cleaned_data is None:
+            return None
+        log(f"Restoring validated form {key}")
+        form_instance = get_form_class(metadata)(data)
+        restore_validated_form(form_instance, cleaned_data)
+        self.forms[key] = form_instance
+        return form_instance
+
+    def add(self, key: str, form_instance: Form) -> None:
+        "Keep a validated form, its cleaned data is cached if it is valid."
+        self.forms[key] = form_instance
+        if not form_instance.is_valid():
+            return
+        try:
+            self.cache.set(key, form_instance.cleaned_data, self.timeout)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            log(f"Warning: cleaned data of {key} can not be cached")
+
+    def load(self, data: QueryDict, metadata: Dict, loader: Callable[[QueryDict, Dict], Form]) -> Form:
+        "Returns the validated form of a step, only calling loader to validate it on a miss."
+        key = self.get_key(data, metadata)
+        form_instance = self.forms.get(key) or self._restore(key, data, metadata)
+        if form_instance is None:
+            form_instance = loader(data, metadata)
+            self.add(key, form_instance)
+        return form_instance
@@ -0,0 +1,255 @@
+"""
+Background execution of the actions confirmed with @confirm_action(background=True).
+
+The confirmation creates an ActionJob holding the action, its selection and the data of its forms,
+then hands it to the executor set by ADMIN_CONFIRM_JOB_EXECUTOR, and the user is redirected at once.
+"""
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from typing import Callable, Dict, List, Optional, Union
+
+from django.conf import settings
+from django.contrib.admin import ModelAdmin
+from django.contrib.admin.sites import all_sites
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.messages.storage.base import BaseStorage
+from django.db import close_old_connections, transaction
+from django.db.models import Model, QuerySet
+from django.forms import Form
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from admin_action_tools.constants import BACKGROUND_MARKER, JOB_EXECUTOR, JOB_WORKERS
+from admin_action_tools.form_cache import get_form_class
+from admin_action_tools.models import ActionJob
+from admin_action_tools.progress import ActionCancelled, Progress
+from admin_action_tools.selection import Selection
+from admin_action_tools.toolchain import get_forms_kwargs
+from admin_action_tools.utils import ensure_sync, log
+
+
+class JobMessages(BaseStorage):
+    "Messages of an action run outside of a request, kept on its job."
+
+    def _get(self, *args, **kwargs):
+        return [], True
+
+    def _store(self, messages, response, *args, **kwargs):
+        return []
+
+
+class ImmediateJobExecutor:
+    "Runs the job once the transaction creating it is committed, in the same thread. Handy for tests."
+
+    def submit(self, job: ActionJob) -> None:
+        transaction.on_commit(lambda: run_job(job.pk))
+
+
+class ThreadPoolJobExecutor:
+    "Runs the jobs in a pool of ADMIN_CONFIRM_JOB_WORKERS threads of the web process."
+
+    pool: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def get_pool(cls) -> ThreadPoolExecutor:
+        if cls.pool is None:
+            cls.pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="admin_action_tools")
+        return cls.pool
+
+    @staticmethod
+    def run(job_id: int) -> None:
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            # Threads of the pool do not go through the request cycle closing connections
+            close_old_connections()
+
+    def submit(self, job: ActionJob) -> None:
+        transaction.on_commit(lambda: self.get_pool().submit(self.run, job.pk))
+
+
+class DatabaseJobExecutor:
+    "Leaves the jobs in the database, for the run_action_jobs command to pick them up."
+
+    def submit(self, job: ActionJob) -> None:
+        pass
+
+
+def get_job_executor():
+    return import_string(JOB_EXECUTOR)()
+
+
+def find_model_admin(site_name: str, model) -> ModelAdmin:
+    for site in all_sites:
+        if site.name == site_name:
+            return site._registry[model]  # pylint: disable=W0212
+    raise LookupError(f"No admin site named {site_name}")
+
+
+def get_model_admin(job: ActionJob) -> ModelAdmin:
+    return find_model_admin(job.admin_site, job.content_type.model_class())
+
+
+def get_action_function(modeladmin: ModelAdmin, action: str, marker: str = BACKGROUND_MARKER) -> Callable:
+    """
+    The action named action of the model admin, without its tools.
+
+    Actions are found like the admin finds them: functions listed in its actions,
+    methods of the model admin and actions of its site. marker is set on the tools running it.
+    """
+    func = next(
+        (item for item in modeladmin.actions or [] if callable(item) and item.__name__ == action),
+        None,
+    )
+    if func is None:
+        found = modeladmin.get_action(action)
+        func = found[0] if found else None
+    func = getattr(func, marker, None)
+    if func is None:
+        raise LookupError(f"{action} is not an action of {modeladmin} run outside of the request")
+    return func
+
+
+def get_job_function(modeladmin: ModelAdmin, job: ActionJob) -> Callable:
+    "The action of the job itself, without its tools."
+    return ensure_sync(get_action_function(modeladmin, job.action))
+
+
+def load_forms(tools: Dict) -> List[Form]:
+    forms = []
+    for tool_name in tools.get("history", []):
+        tool = tools[tool_name]
+        form_instance: Form = get_form_class(tool["metadata"])(QueryDict(tool["data"]))
+        form_instance.is_valid()
+        forms.append(form_instance)
+    return forms
+
+
+def make_request(user, path: str, query: Optional[QueryDict] = None) -> HttpRequest:
+    "Request given to an action run outside of a request, its messages are kept in JobMessages."
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = path
+    if query is not None:
+        request.GET = query
+    request.user = user or AnonymousUser()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request._messages = JobMessages(request)  # pylint: disable=W0212
+    return request
+
+
+def build_request(job: ActionJob) -> HttpRequest:
+    "Request given to the action, as if it was made by the user of the job on the changelist."
+    selection = Selection.from_dict(job.selection)
+    request = make_request(job.user, job.path, selection.get_query() if selection.is_query else None)
+    # Chunked actions record their checkpoint on the job
+    request._action_job = job  # pylint: disable=W0212
+    request._action_progress = Progress.for_job(job.pk)  # pylint: disable=W0212
+    return request
+
+
+def get_job_target(modeladmin: ModelAdmin, request: HttpRequest, job: ActionJob) -> Union[QuerySet, Model]:
+    queryset = modeladmin.get_selection_queryset(request, Selection.from_dict(job.selection))
+    return queryset.get() if job.object_action else queryset
+
+
+def create_job(
+    modeladmin: ModelAdmin,
+    request: HttpRequest,
+    func: Callable,
+    selection: Selection,
+    tools: Dict,
+    object_action: bool = False,
+) -> ActionJob:
+    """
+    Record the action confirmed in the request as a job, and hand it to the executor.
+
+    Raises LookupError if the job could not find the action when it runs.
+    """
+    get_action_function(modeladmin, func.__name__)
+    tools = {key: value for key, value in tools.items() if key != "expire_at"}
+    job = ActionJob.objects.create(
+        content_type=ContentType.objects.get_for_model(modeladmin.model, for_concrete_model=False),
+        admin_site=modeladmin.admin_site.name,
+        action=func.__name__,
+        path=modeladmin._get_admin_url("changelist"),  # pylint: disable=W0212
+        selection=selection.to_dict(),
+        tools=tools,
+        object_action=object_action,
+        user=request.user if request.user.is_authenticated else None,
+    )
+    get_job_executor().submit(job)
+    return job
+
+
+def resume_job(job_id: int) -> bool:
+    """
+    Hand a failed, interrupted or cancelled job to the executor again.
+
+    A chunked action resumes after its checkpoint, other actions run again from the start.
+    """
+    resumed = ActionJob.objects.filter(
+        pk=job_id, status__in=[ActionJob.Status.FAILED, ActionJob.Status.RUNNING, ActionJob.Status.CANCELLED]
+    ).update(status=ActionJob.Status.PENDING, error="", finished_at=None)
+    if resumed:
+        Progress.for_job(job_id).clear_cancel()
+        get_job_executor().submit(ActionJob.objects.get(pk=job_id))
+    return bool(resumed)
+
+
+def cancel_job(job_id: int) -> bool:
+    """
+    Cancel a job: a pending job is never run, a running one stops the next time it checks
+    get_progress(request).check_cancelled(), chunked actions after their current chunk.
+    """
+    cancelled = ActionJob.objects.filter(pk=job_id, status=ActionJob.Status.PENDING).update(
+        status=ActionJob.Status.CANCELLED, finished_at=timezone.now()
+    )
+    if cancelled:
+        return True
+    if ActionJob.objects.filter(pk=job_id, status=ActionJob.Status.RUNNING).exists():
+        Progress.for_job(job_id).cancel()
+        return True
+    return False
+
+
+def run_job(job_id: int) -> Optional[ActionJob]:
+    """
+    Run a pending job, unless another worker claimed it first.
+
+    The messages of the action are kept on the job, the traceback if it fails.
+    A cancelled chunked action keeps its checkpoint, so the job can be resumed.
+    """
+    claimed = ActionJob.objects.filter(pk=job_id, status=ActionJob.Status.PENDING).update(
+        status=ActionJob.Status.RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    job = ActionJob.objects.select_related("content_type", "user").get(pk=job_id)
+    log(f"Running job {job}")
+
+    request = None
+    try:
+        modeladmin = get_model_admin(job)
+        request = build_request(job)
+        func = get_job_function(modeladmin, job)
+        forms = load_forms(job.tools)
+        func(modeladmin, request, get_job_target(modeladmin, request, job), **get_forms_kwargs(forms))
+        job.status = ActionJob.Status.DONE
+    except ActionCancelled:
+        log(f"Job {job} cancelled")
+        job.status = ActionJob.Status.CANCELLED
+    except Exception:  # pylint: disable=broad-except
+        log(f"Job {job} failed")
+        job.error = traceback.format_exc()
+        job.status = ActionJob.Status.FAILED
+
+    if request is not None:
+        job.messages = [str(message) for message in request._messages]  # pylint: disable=W0212
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "messages", "error", "finished_at"])
+    return job
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from admin_action_tools.file_cache import get_file_cache
+
+
+class Command(BaseCommand):
+    help = "Delete the files of expired confirmations kept on disk by DiskFileCache."
+
+    def handle(self, *args, **options):
+        file_cache = get_file_cache()
+        if not hasattr(file_cache, "purge_expired"):
+            self.stdout.write(f"{type(file_cache).__name__} does not keep files to purge")
+            return
+        file_cache.purge_expired()
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from admin_action_tools.jobs import resume_job, run_job
+from admin_action_tools.models import ActionJob
+
+
+class Command(BaseCommand):
+    help = "Run the pending admin action jobs, polling the database for new ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=5, help="Seconds between two polls of the database.")
+        parser.add_argument("--once", action="store_true", help="Run the pending jobs, then exit.")
+        parser.add_argument(
+            "--resume",
+            type=int,
+            action="append",
+            default=[],
+            metavar="JOB_ID",
+            help="Set a failed or interrupted job as pending again, chunked actions resume after their checkpoint.",
+        )
+
+    def run_pending_jobs(self) -> int:
+        count = 0
+        pending = ActionJob.objects.filter(status=ActionJob.Status.PENDING).values_list("pk", flat=True)
+        for job_id in list(pending):
+            job = run_job(job_id)
+            # Claimed by another worker in the meantime
+            if job is None:
+                continue
+            count += 1
+            self.stdout.write(f"{job}")
+        return count
+
+    def handle(self, *args, **options):
+        for job_id in options["resume"]:
+            if not resume_job(job_id):
+                self.stderr.write(f"Job #{job_id} is neither failed nor running")
+        while True:
+            close_old_connections()
+            self.run_pending_jobs()
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class ActionJob(models.Model):
+    """
+    Admin action confirmed to run in the background, see admin_action_tools.jobs.
+
+    Holds what is needed to run the action again outside of the request:
+    the model admin and action, the selection and the data of the chained forms.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    admin_site = models.CharField(max_length=100, default="admin")
+    action = models.CharField(max_length=200)
+    # Changelist of the action, the selection query is replayed on it
+    path = models.CharField(max_length=1000)
+    # Selection.to_dict
+    selection = models.JSONField(default=dict)
+    # Tool chain data: history and form data of each step
+    tools = models.JSONField(default=dict)
+    object_action = models.BooleanField(default=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    messages = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    # Last pk processed by a chunked action, its run resumes after it
+    checkpoint = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.action} #{self.pk} ({self.status})"
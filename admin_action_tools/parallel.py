@@ -0,0 +1,234 @@
+"""
+Parallel execution of CPU heavy admin actions over pk-range shards.
+
+@parallel_action splits the queryset of the action in pk ranges of about the same size, run in a pool
+of ADMIN_CONFIRM_PARALLEL_WORKERS processes: each shard gets its own core and database connection.
+The messages and errors of the shards are merged into a single report for the user.
+
+Workers are spawned, not forked, so they never share the connections of the web process.
+They set Django up again from DJANGO_SETTINGS_MODULE, and only see committed data.
+"""
+import functools
+import math
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib import messages
+from django.db import close_old_connections, connections
+from django.db.models import QuerySet
+from django.forms import Form
+from django.http import HttpRequest, QueryDict
+
+from admin_action_tools.constants import PARALLEL_MARKER, PARALLEL_WORKERS
+from admin_action_tools.form_cache import get_form_class
+from admin_action_tools.utils import ensure_sync, log, snake_to_title_case
+
+
+class Shard:
+    "Part of the queryset of an action run by a worker, with what it needs to run the action."
+
+    def __init__(
+        self,
+        modeladmin,
+        request: HttpRequest,
+        action: str,
+        queryset: QuerySet,
+        bounds: Tuple[Optional[str], Optional[str]],
+        forms: Dict,
+    ) -> None:
+        self.site_name = modeladmin.admin_site.name
+        self.model_label = modeladmin.model._meta.label
+        self.action = action
+        self.user_pk = getattr(request.user, "pk", None)
+        self.path = request.path
+        # Only the query is sent to the worker, pickling a queryset would fetch its rows
+        self.query = queryset.query
+        self.database = queryset.db
+        self.bounds = bounds
+        # Name of each form argument, with the class and data to validate it again
+        self.forms = forms
+
+    def get_queryset(self) -> QuerySet:
+        "Queryset of the shard, rebuilt from its query."
+        queryset = apps.get_model(self.model_label)._default_manager.db_manager(self.database).all()
+        queryset.query = self.query
+        return queryset
+
+    def __str__(self):
+        start, end = self.bounds
+        return f"{'first' if start is None else start} to {'last' if end is None else end}"
+
+
+def dump_form_kwargs(kwargs: Dict) -> Dict:
+    "Form arguments of the action, in a form the workers can load."
+
+    def dump(form: Form) -> Dict:
+        return {"module": type(form).__module__, "name": type(form).__name__, "data": form.data.urlencode()}
+
+    return {
+        name: [dump(form) for form in value] if isinstance(value, (list, tuple)) else dump(value)
+        for name, value in kwargs.items()
+    }
+
+
+def load_form_kwargs(forms: Dict) -> Dict:
+    def load(form: Dict) -> Form:
+        form_instance = get_form_class(form)(QueryDict(form["data"]))
+        form_instance.is_valid()
+        return form_instance
+
+    return {
+        name: [load(form) for form in value] if isinstance(value, list) else load(value)
+        for name, value in forms.items()
+    }
+
+
+def init_worker(database_names: Optional[Dict[str, str]] = None) -> None:
+    "Runs first in each worker process, on the databases of the web process (test databases for instance)."
+    for alias, name in (database_names or {}).items():
+        settings.DATABASES[alias]["NAME"] = name
+    if not apps.ready:
+        django.setup()
+
+
+def run_shard(shard: Shard) -> Dict:
+    "Runs the action over a shard, in a worker. Returns the messages of the action and its error if it failed."
+    # pylint: disable=C0415
+    from django.contrib.auth import get_user_model
+
+    from admin_action_tools.jobs import (
+        find_model_admin,
+        get_action_function,
+        make_request,
+    )
+
+    close_old_connections()
+    request = None
+    error = ""
+    try:
+        modeladmin = find_model_admin(shard.site_name, apps.get_model(shard.model_label))
+        func = ensure_sync(get_action_function(modeladmin, shard.action, PARALLEL_MARKER))
+        user = get_user_model().objects.filter(pk=shard.user_pk).first() if shard.user_pk is not None else None
+        request = make_request(user, shard.path)
+        func(modeladmin, request, shard.get_queryset(), **load_form_kwargs(shard.forms))
+    except Exception:  # pylint: disable=broad-except
+        error = traceback.format_exc()
+    finally:
+        # Workers do not go through the request cycle closing connections
+        close_old_connections()
+
+    shard_messages = [] if request is None else request._messages  # pylint: disable=W0212
+    return {"messages": [(message.level, str(message)) for message in shard_messages], "error": error}
+
+
+class ParallelRun:
+    """
+    Run of an action over a queryset, shard by shard in a pool of processes.
+
+    Shards are bounded by pks, found with one query per bound, so the selection is never listed.
+    """
+
+    pool: Optional[ProcessPoolExecutor] = None
+
+    def __init__(self, modeladmin, request: HttpRequest, action: str, queryset: QuerySet, shards: int) -> None:
+        self.modeladmin = modeladmin
+        self.request = request
+        self.action = action
+        self.queryset = queryset.order_by("pk")
+        self.shards = shards
+
+    @staticmethod
+    def get_database_names() -> Dict[str, str]:
+        return {alias: connections[alias].settings_dict["NAME"] for alias in connections}
+
+    @classmethod
+    def get_pool(cls) -> ProcessPoolExecutor:
+        if cls.pool is None:
+            cls.pool = ProcessPoolExecutor(
+                max_workers=PARALLEL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(cls.get_database_names(),),
+            )
+        return cls.pool
+
+    def get_bounds(self) -> List[Tuple[Optional[str], Optional[str]]]:
+        "Pk range of each shard, the start included and the end excluded."
+        size = math.ceil(self.queryset.count() / self.shards)
+        if not size:
+            return []
+        pks = self.queryset.values_list("pk", flat=True)
+        starts = [pks[index : index + 1].first() for index in range(size, size * self.shards, size)]
+        bounds = [None, *(start for start in starts if start is not None), None]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def get_shard_queryset(self, start, end) -> QuerySet:
+        queryset = self.queryset
+        if start is not None:
+            queryset = queryset.filter(pk__gte=start)
+        if end is not None:
+            queryset = queryset.filter(pk__lt=end)
+        return queryset
+
+    def report(self, shards: List[Shard], results: List[Dict]) -> None:
+        "Merges the messages and errors of the shards into a single report."
+        seen = set()
+        for result in results:
+            for level, message in result["messages"]:
+                if (level, message) not in seen:
+                    seen.add((level, message))
+                    self.modeladmin.message_user(self.request, message, level)
+
+        action_name = snake_to_title_case(self.action)
+        failed = [(shard, result["error"]) for shard, result in zip(shards, results) if result["error"]]
+        if not failed:
+            self.modeladmin.message_user(self.request, f"{action_name} ran in {len(shards)} parallel shards.")
+            return
+        for shard, error in failed:
+            log(f"Shard {shard} of {self.action} failed:\n{error}")
+        errors = "; ".join(f"pks {shard}: {error.strip().splitlines()[-1]}" for shard, error in failed)
+        self.modeladmin.message_user(
+            self.request,
+            f"{action_name} failed in {len(failed)} of {len(shards)} parallel shards ({errors}).",
+            messages.ERROR,
+        )
+
+    def run(self, **kwargs) -> None:
+        forms = dump_form_kwargs(kwargs)
+        shards = [
+            Shard(self.modeladmin, self.request, self.action, self.get_shard_queryset(start, end), (start, end), forms)
+            for start, end in self.get_bounds()
+        ]
+        results = list(self.get_pool().map(run_shard, shards))
+        self.report(shards, results)
+
+
+def parallel_action(shards: Optional[int] = None):
+    """
+    @parallel_action() function wrapper for Django ModelAdmin actions
+    Runs the action over pk-range shards of its queryset in a pool of processes, one core per shard.
+
+    Goes under the tools of the action, and must decorate a method of the model admin:
+    workers find the action again by its name. Its forms are validated again in each worker.
+    shards defaults to ADMIN_CONFIRM_PARALLEL_WORKERS.
+    """
+
+    def parallel_action_decorator(func):
+        action = ensure_sync(func)
+
+        @functools.wraps(func)
+        def func_wrapper(modeladmin, request, queryset_or_object, **kwargs):
+            if not isinstance(queryset_or_object, QuerySet):
+                return action(modeladmin, request, queryset_or_object, **kwargs)
+            run = ParallelRun(modeladmin, request, func.__name__, queryset_or_object, shards or PARALLEL_WORKERS)
+            return run.run(**kwargs)
+
+        setattr(func_wrapper, PARALLEL_MARKER, func)
+        return func_wrapper
+
+    return parallel_action_decorator
@@ -0,0 +1,116 @@
+import time
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.http import HttpRequest
+
+from admin_action_tools.constants import PROGRESS_TIMEOUT
+from admin_action_tools.utils import format_cache_key
+
+
+class ActionCancelled(Exception):
+    "Raised in an action whose run was cancelled, to stop it."
+
+
+def get_progress(request: HttpRequest) -> "Progress":
+    """
+    Returns the progress of the action run by the request, for the action to report into.
+
+    Only actions run in the background have their progress stored and shown,
+    elsewhere reports are accepted and dropped.
+    """
+    if "_action_progress" not in request.__dict__:
+        request._action_progress = Progress(None)
+    return request._action_progress
+
+
+class Progress:
+    """
+    Progress of a long-running action: objects processed out of the total, errors and estimated time left.
+
+    Kept in the cache, so reports and polls of the progress page never touch the database.
+    Cancelling the run sets a flag next to it, which the action checks between units of work.
+    """
+
+    timeout = PROGRESS_TIMEOUT
+
+    def __init__(self, key: Optional[str]) -> None:
+        self.key = key
+        self.data: Dict = (cache.get(key) if key else None) or {
+            "processed": 0,
+            "total": None,
+            "errors": 0,
+            "started_at": None,
+            "started_from": 0,
+        }
+
+    @classmethod
+    def for_job(cls, job_id: int) -> "Progress":
+        return cls(format_cache_key(model="job", field=str(job_id), namespace="progress"))
+
+    @property
+    def tracked(self) -> bool:
+        return self.key is not None
+
+    @property
+    def cancel_key(self) -> str:
+        return f"{self.key}__cancel"
+
+    def save(self) -> None:
+        if self.tracked:
+            cache.set(self.key, self.data, self.timeout)
+
+    def start(self, total: Optional[int], processed: int = 0) -> None:
+        "Start a run, processed is what a resumed run already did."
+        self.data.update(total=total, processed=processed, started_at=time.time(), started_from=processed)
+        self.save()
+
+    def advance(self, count: int = 1, errors: int = 0) -> None:
+        self.data["processed"] += count
+        self.data["errors"] += errors
+        self.save()
+
+    def add_errors(self, count: int = 1) -> None:
+        self.advance(0, errors=count)
+
+    def finish(self) -> None:
+        if self.data["total"] is not None:
+            self.data["processed"] = self.data["total"]
+        self.save()
+
+    def cancel(self) -> None:
+        if self.tracked:
+            cache.set(self.cancel_key, True, self.timeout)
+
+    def clear_cancel(self) -> None:
+        if self.tracked:
+            cache.delete(self.cancel_key)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.tracked and bool(cache.get(self.cancel_key))
+
+    def check_cancelled(self) -> None:
+        "Stop the action if its run was cancelled, call it once the work done so far is committed."
+        if self.cancelled:
+            raise ActionCancelled
+
+    @property
+    def eta(self) -> Optional[float]:
+        "Seconds left, at the rate of the current run."
+        total, processed, started_at = self.data["total"], self.data["processed"], self.data["started_at"]
+        done = processed - self.data["started_from"]
+        if total is None or started_at is None or done <= 0:
+            return None
+        rate = done / max(time.time() - started_at, 1e-6)
+        return max(total - processed, 0) / rate
+
+    def as_dict(self) -> Dict:
+        total, processed = self.data["total"], self.data["processed"]
+        return {
+            "processed": processed,
+            "total": total,
+            "errors": self.data["errors"],
+            "percent": round(100 * processed / total, 1) if total else None,
+            "eta": round(self.eta) if self.eta is not None else None,
+        }
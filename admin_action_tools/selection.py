@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import operator
+from functools import reduce
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from django.core import signing
+from django.db.models import IntegerField, Model, Q, QuerySet
+from django.http import HttpRequest, QueryDict
+
+from admin_action_tools.utils import log
+
+# Above this number of ranges, the pks of the smallest ranges are listed instead
+MAX_RANGES = 50
+
+
+class Selection:
+    """
+    Selected objects, carried between steps as a compact signed token.
+
+    Contiguous pks of integer primary keys are compressed as ranges, other keys are packed in a list.
+    A select across is kept as the query of the changelist (filters, search and ordering),
+    replayed to rebuild the queryset without ever listing its pks.
+    The token is compressed and signed for the path and user of the request,
+    so it can not be altered or replayed on another changelist.
+    """
+
+    def __init__(
+        self,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        keys: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        pk=None,
+    ):
+        self.ranges = ranges or []
+        self.keys = keys or []
+        self.query = query
+        # Any selected pk, Django only runs an action if one is posted
+        self.pk = pk
+
+    @staticmethod
+    def has_integer_pk(model: Type[Model]) -> bool:
+        pk = model._meta.pk
+        # The primary key of multi table inheritance is a link to the parent
+        return isinstance(pk.target_field if pk.is_relation else pk, IntegerField)
+
+    @classmethod
+    def from_pks(cls, pks: Iterable, model: Type[Model]) -> Selection:
+        pks = [str(pk) for pk in pks]
+        # Keys of other fields are compared as such, "10" is between "1" and "2" for a CharField
+        if not cls.has_integer_pk(model) or not all(pk.isdigit() for pk in pks):
+            return cls(keys=sorted(set(pks)))
+
+        ranges = []
+        for pk in sorted({int(pk) for pk in pks}):
+            if ranges and ranges[-1][1] == pk - 1:
+                ranges[-1][1] = pk
+            else:
+                ranges.append([pk, pk])
+        return cls(ranges=[tuple(pk_range) for pk_range in ranges])
+
+    @classmethod
+    def from_query(cls, query: QueryDict, pk) -> Selection:
+        return cls(query=query.urlencode(), pk=pk)
+
+    @staticmethod
+    def _get_salt(request: HttpRequest, path: Optional[str] = None) -> str:
+        user_pk = getattr(getattr(request, "user", None), "pk", None)
+        return f"admin_action_tools.selection:{path or request.path}:{user_pk}"
+
+    @classmethod
+    def from_token(cls, request: HttpRequest, token: str, path: Optional[str] = None) -> Optional[Selection]:
+        """
+        Decode a token made for the path of the request, or for path if given
+        """
+        try:
+            data = signing.loads(token, salt=cls._get_salt(request, path))
+        except signing.BadSignature:
+            log("Warning: invalid selection token")
+            return None
+        return cls.from_dict(data)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> Selection:
+        return cls(
+            ranges=[tuple(pk_range) for pk_range in data.get("r", [])],
+            keys=data.get("k", []),
+            query=data.get("q"),
+            pk=data.get("p"),
+        )
+
+    def to_dict(self) -> Dict:
+        "Compact form of the selection, safe to serialize as JSON."
+        if self.query is not None:
+            return {"q": self.query, "p": self.pk}
+        if self.ranges:
+            return {"r": self.ranges}
+        return {"k": self.keys}
+
+    def to_token(self, request: HttpRequest) -> str:
+        return signing.dumps(self.to_dict(), salt=self._get_salt(request), compress=True)
+
+    def __bool__(self) -> bool:
+        return bool(self.ranges or self.keys or (self.query is not None and self.pk is not None))
+
+    @property
+    def is_query(self) -> bool:
+        return self.query is not None
+
+    def get_query(self) -> QueryDict:
+        "Changelist query to replay."
+        return QueryDict(self.query)
+
+    def first_pk(self):
+        if self.is_query:
+            return self.pk
+        return self.ranges[0][0] if self.ranges else self.keys[0]
+
+    def filter(self, queryset: QuerySet) -> QuerySet:
+        "Restrict the queryset to the selected objects."
+        if self.is_query:
+            # The changelist queryset is rebuilt from the replayed query
+            return queryset
+        if self.keys:
+            return queryset.filter(pk__in=self.keys)
+
+        ranges, singles = self.split_ranges(self.ranges, MAX_RANGES)
+        conditions = [Q(pk__range=pk_range) for pk_range in ranges]
+        if singles:
+            conditions.append(Q(pk__in=singles))
+        return queryset.filter(reduce(operator.or_, conditions))
+
+    @staticmethod
+    def split_ranges(ranges: List[Tuple[int, int]], max_ranges: int) -> Tuple[List[Tuple[int, int]], List[int]]:
+        """
+        Keep the max_ranges largest ranges of more than one pk, returns them and the other pks listed.
+        The pks listed are selected pks only, never more than the selection.
+        """
+        largest = sorted(
+            (pk_range for pk_range in ranges if pk_range[0] != pk_range[1]),
+            key=lambda pk_range: pk_range[1] - pk_range[0],
+            reverse=True,
+        )
+        kept = set(largest[:max_ranges])
+        singles = [pk for start, end in ranges if (start, end) not in kept for pk in range(start, end + 1)]
+        return [pk_range for pk_range in ranges if pk_range in kept], singles
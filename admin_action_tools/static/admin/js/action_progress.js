@@ -0,0 +1,58 @@
+'use strict';
+{
+    // Poll the progress of an action run in the background, until it is finished.
+    const interval = 2000;
+
+    function render(job, status) {
+        const cancel = document.querySelector('.action-job-cancel');
+        if (cancel && (status.finished || status.cancelling)) {
+            cancel.remove();
+        }
+        job.querySelector('.action-job-status').textContent = status.status_display;
+        job.querySelector('.action-job-processed').textContent = status.processed;
+        job.querySelector('.action-job-total').textContent = status.total === null ? '?' : status.total;
+        job.querySelector('.action-job-errors').textContent = status.errors;
+        job.querySelector('.action-job-eta').textContent = status.eta === null ? '-' : status.eta + 's';
+        const bar = job.querySelector('.action-job-bar');
+        if (status.percent !== null) {
+            bar.value = status.percent;
+        }
+        const error = job.querySelector('.action-job-error');
+        error.textContent = status.error;
+        error.classList.toggle('hidden', !status.error);
+        const messages = job.querySelector('.action-job-messages');
+        messages.replaceChildren();
+        status.messages.forEach(function(message) {
+            const item = document.createElement('li');
+            item.textContent = message;
+            messages.appendChild(item);
+        });
+    }
+
+    function poll(job) {
+        fetch(job.dataset.url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function(status) {
+                render(job, status);
+                if (!status.finished) {
+                    setTimeout(poll, interval, job);
+                }
+            })
+            .catch(function() {
+                setTimeout(poll, interval * 5, job);
+            });
+    }
+
+    window.addEventListener('load', function() {
+        document.querySelectorAll('.action-job[data-url]').forEach(function(job) {
+            if (job.dataset.url) {
+                setTimeout(poll, interval, job);
+            }
+        });
+    });
+}
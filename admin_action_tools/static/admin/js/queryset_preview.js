@@ -0,0 +1,56 @@
+'use strict';
+{
+    // Fetch the next pages of a lazy queryset preview when its end is scrolled into view.
+    function loadNextPage(more, observer) {
+        if (more.dataset.loading) {
+            return;
+        }
+        more.dataset.loading = '1';
+        const url = more.dataset.url + '&after=' + encodeURIComponent(more.dataset.after);
+        fetch(url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function(page) {
+                page.results.forEach(function(obj) {
+                    const item = document.createElement('li');
+                    item.textContent = obj.display;
+                    more.parentNode.insertBefore(item, more);
+                });
+                if (!page.after) {
+                    observer.disconnect();
+                    more.remove();
+                    return;
+                }
+                const remaining = parseInt(more.dataset.remaining, 10) - page.results.length;
+                more.dataset.remaining = remaining;
+                more.dataset.after = page.after;
+                more.querySelector('.queryset-preview-remaining').textContent = remaining;
+                delete more.dataset.loading;
+                // Observe again, the end may still be in view after this page
+                observer.unobserve(more);
+                observer.observe(more);
+            })
+            .catch(function() {
+                // Keep the count, the preview stays partial
+                observer.disconnect();
+            });
+    }
+
+    window.addEventListener('load', function() {
+        if (!('IntersectionObserver' in window)) {
+            return;
+        }
+        document.querySelectorAll('.queryset-preview-more[data-url]').forEach(function(more) {
+            const observer = new IntersectionObserver(function(entries) {
+                if (entries.some(function(entry) { return entry.isIntersecting; })) {
+                    loadNextPage(more, observer);
+                }
+            });
+            observer.observe(more);
+        });
+    });
+}
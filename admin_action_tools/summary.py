@@ -0,0 +1,69 @@
+from typing import Dict, List, Optional, Sequence
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Aggregate, Count, QuerySet
+
+# Name of the count annotation, unlikely to clash with a field or an aggregate of the spec
+COUNT_ANNOTATION = "_summary_count"
+
+
+class ActionSummary:
+    """
+    Impact of an action on its selection, computed by the database in a single query.
+
+    The selection is counted, grouped by the group_by fields, along with the aggregates.
+    e.g. ActionSummary(group_by=["currency"], aggregates={"total": Sum("price")})
+    shows "12,430 items: 10,002 in EUR, 2,428 in USD" instead of listing every item.
+    """
+
+    def __init__(self, group_by: Sequence[str] = (), aggregates: Optional[Dict[str, Aggregate]] = None):
+        self.group_by = list(group_by)
+        self.aggregates = aggregates or {}
+
+    def _get_choices(self, queryset: QuerySet) -> Dict[str, Dict]:
+        "Labels of the group_by fields having choices, so groups show them instead of the stored values."
+        choices = {}
+        for name in self.group_by:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.choices:
+                choices[name] = dict(field.flatchoices)
+        return choices
+
+    def _get_label(self, row: Dict, choices: Dict[str, Dict]) -> str:
+        values = [choices.get(name, {}).get(row[name], row[name]) for name in self.group_by]
+        return ", ".join(str(value) for value in values)
+
+    def compute(self, queryset: QuerySet) -> Dict:
+        opts = queryset.model._meta
+        if not self.group_by:
+            row = queryset.aggregate(**{COUNT_ANNOTATION: Count("pk")}, **self.aggregates)
+            count = row.pop(COUNT_ANNOTATION)
+            groups: List[Dict] = []
+            aggregates = row
+        else:
+            rows = (
+                queryset.values(*self.group_by)
+                .annotate(**{COUNT_ANNOTATION: Count("pk")}, **self.aggregates)
+                .order_by(f"-{COUNT_ANNOTATION}", *self.group_by)
+            )
+            choices = self._get_choices(queryset)
+            groups = [
+                {
+                    "label": self._get_label(row, choices),
+                    "count": row[COUNT_ANNOTATION],
+                    "aggregates": {name: row[name] for name in self.aggregates},
+                }
+                for row in rows
+            ]
+            count = sum(group["count"] for group in groups)
+            aggregates = {}
+
+        return {
+            "count": count,
+            "verbose_name": opts.verbose_name if count == 1 else opts.verbose_name_plural,
+            "groups": groups,
+            "aggregates": aggregates,
+        }
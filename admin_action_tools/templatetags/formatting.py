@@ -3,13 +3,29 @@ from django.urls import reverse
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
+from admin_action_tools.diff import ManyToManyDelta
+
 register = template.Library()
 
 
+def format_many_to_many_delta(delta: ManyToManyDelta):
+    output = "<p>" + escape(str(delta)) + "</p>"
+    if delta.count:
+        output += "<ul>"
+        for value in delta.preview:
+            output += "<li>" + escape(value) + "</li>"
+        if delta.remaining:
+            output += "<li>" + escape(f"\u2026 and {delta.remaining} more") + "</li>"
+        output += "</ul>"
+    return mark_safe(output)  # nosec
+
+
 @register.filter
 def format_change_data_field_value(field_value):
     if isinstance(field_value, str):
         return field_value
+    if isinstance(field_value, ManyToManyDelta):
+        return format_many_to_many_delta(field_value)
     try:
         output = "<ul>"
         for value in iter(field_value):
@@ -28,7 +44,9 @@ def verbose_name(obj, fieldname):
 
 @register.simple_tag
 def back_url(queryset, opts):
-    if len(queryset) == 1:
-        obj = queryset[0]
+    # Only load what is needed to tell a single object apart
+    objects = list(queryset[:2])
+    if len(objects) == 1:
+        obj = objects[0]
         return reverse("admin:%s_%s_change" % (opts.app_label, opts.model_name), args=[obj.pk])
     return reverse("admin:%s_%s_changelist" % (opts.app_label, opts.model_name))
@@ -1,4 +1,5 @@
 import socket
+from html.parser import HTMLParser
 
 from django.contrib.auth.models import User
 from django.core.cache import cache
@@ -8,9 +9,60 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 from selenium.webdriver.support.ui import Select
 
+from admin_action_tools.confirmation_cache import ConfirmationCache
 from tests.test_project.settings import SELENIUM_HOST
 
 
+class PostFormParser(HTMLParser):
+    "Collects what a browser submits with the post form of a page, when the submit button named submit is clicked."
+
+    def __init__(self, submit: str) -> None:
+        super().__init__()
+        self.submit = submit
+        self.data = {}
+        self.in_form = False
+        self.select = None
+        self.textarea = None
+
+    def add(self, name, value) -> None:
+        self.data.setdefault(name, []).append(value)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self.in_form = attrs.get("method") == "post"
+        if not self.in_form:
+            return
+        name = attrs.get("name")
+        if tag == "input" and name and "disabled" not in attrs and attrs.get("type") not in ("file", "submit"):
+            if attrs.get("type") not in ("checkbox", "radio") or "checked" in attrs:
+                self.add(name, attrs.get("value") or ("on" if attrs.get("type") == "checkbox" else ""))
+        elif tag == "input" and name == self.submit and attrs.get("type") == "submit":
+            self.add(name, attrs.get("value", ""))
+        elif tag == "select":
+            self.select = name
+        elif tag == "option" and self.select and "selected" in attrs:
+            self.add(self.select, attrs.get("value", ""))
+        elif tag == "textarea" and name:
+            self.textarea = name
+            self.add(name, "")
+
+    def handle_data(self, data):
+        if self.textarea:
+            self.data[self.textarea][-1] += data
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self.in_form = False
+        elif tag == "select":
+            self.select = None
+        elif tag == "textarea" and self.textarea:
+            # Browsers drop the newline following the opening tag
+            values = self.data[self.textarea]
+            values[-1] = values[-1][1:] if values[-1].startswith("\n") else values[-1]
+            self.textarea = None
+
+
 class RequestSessionFactory(RequestFactory):
     def __init__(self, session, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -38,6 +90,22 @@ class AdminConfirmTestCase(TestCase):
         self.client.force_login(self.superuser)
         self.factory = RequestSessionFactory(self.client.session)
 
+    def _get_confirmation_cache(self, response=None, model=None, confirmation_id=None):
+        """
+        Returns the confirmation cache of the test client session,
+        for the confirmation rendered in response if given
+        """
+        if response is not None:
+            model = response.context_data["opts"].model
+            confirmation_id = response.context_data.get("confirmation_id")
+        return ConfirmationCache(self.factory.request(), model, confirmation_id)
+
+    def _get_post_form_data(self, rendered_content, submit="_save"):
+        "Data submitted by the post form of the rendered page, as a browser would send it."
+        parser = PostFormParser(submit)
+        parser.feed(rendered_content)
+        return parser.data
+
     def _assertManyToManyFormHtml(self, rendered_content, options, selected_ids):
         # Form data should be embedded and hidden on confirmation page
         # Should have the correct ManyToMany options selected
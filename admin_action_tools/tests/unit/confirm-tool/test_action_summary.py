@@ -0,0 +1,63 @@
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from admin_action_tools.constants import CONFIRM_ACTION
+from admin_action_tools.summary import ActionSummary
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ItemFactory
+from tests.market.models import Item
+
+
+class TestActionSummary(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = [ItemFactory(price=10, currency="CAD", description="Old") for _ in range(5)]
+        self.items += [ItemFactory(price=4, currency="USD", description="Old") for _ in range(2)]
+
+    def test_summary_grouped(self):
+        summary = ActionSummary(group_by=["currency"], aggregates={"total": Sum("price")})
+        with self.assertNumQueries(1):
+            result = summary.compute(Item.objects.all())
+        self.assertEqual(result["count"], 7)
+        self.assertEqual(result["verbose_name"], "items")
+        self.assertEqual([group["label"] for group in result["groups"]], ["CAD", "USD"])
+        self.assertEqual([group["count"] for group in result["groups"]], [5, 2])
+        self.assertEqual([group["aggregates"]["total"] for group in result["groups"]], [50, 8])
+
+    def test_summary_without_group(self):
+        summary = ActionSummary(aggregates={"total": Sum("price")})
+        with self.assertNumQueries(1):
+            result = summary.compute(Item.objects.filter(currency="USD"))
+        self.assertEqual(result["count"], 2)
+        self.assertEqual(result["groups"], [])
+        self.assertEqual(result["aggregates"], {"total": 8})
+
+    def test_confirmation_page_shows_summary(self):
+        post_params = {
+            "action": ["clear_description"],
+            "select_across": ["0"],
+            "index": ["0"],
+            "_selected_action": [str(item.pk) for item in self.items],
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse("admin:market_item_changelist"), data=post_params)
+        self.assertEqual(response.status_code, 200)
+
+        # Besides the changelist counts, the selection is only read by the GROUP BY query
+        item_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if 'FROM "market_item"' in query["sql"] and not query["sql"].startswith("SELECT COUNT(*)")
+        ]
+        self.assertEqual(len(item_queries), 1)
+        self.assertIn("GROUP BY", item_queries[0])
+        content = " ".join(response.rendered_content.split())
+        self.assertRegex(content, r"7 items: 5 in CAD \(total: 50(\.00)?\), 2 in USD \(total: 8(\.00)?\)")
+        for item in self.items:
+            self.assertNotIn(f"<li>{item.name}</li>", response.rendered_content)
+
+        post_params[CONFIRM_ACTION] = ["Yes, I'm sure"]
+        self.client.post(reverse("admin:market_item_changelist"), data=post_params)
+        self.assertFalse(Item.objects.exclude(description="").exists())
@@ -1,8 +1,5 @@
 from unittest import mock
 
-from django.core.cache import cache
-
-from admin_action_tools.constants import CACHE_KEYS
 from admin_action_tools.tests.helpers import AdminConfirmTestCase
 from tests.factories import ShopFactory
 from tests.market.admin import ShoppingMallAdmin
@@ -36,7 +33,8 @@ class TestAdminOptions(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_continue")
 
         # Should not have cached the unsaved obj
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Should not have saved changes yet
@@ -72,8 +70,7 @@ class TestAdminOptions(AdminConfirmTestCase):
             self.assertIn(shop, shops)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     @mock.patch.object(ShoppingMallAdmin, "confirmation_fields", ["name"])
     @mock.patch.object(ShoppingMallAdmin, "exclude", ["shops"])
@@ -102,7 +99,8 @@ class TestAdminOptions(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_continue")
 
         # Should not have cached the unsaved obj
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Should not have saved changes yet
@@ -138,8 +136,7 @@ class TestAdminOptions(AdminConfirmTestCase):
             self.assertIn(shop, shops)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     @mock.patch.object(ShoppingMallAdmin, "confirmation_fields", ["name"])
     @mock.patch.object(ShoppingMallAdmin, "exclude", ["shops", "name"])
@@ -245,7 +242,8 @@ class TestAdminOptions(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_continue")
 
         # Should not have cached the unsaved obj
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Should not have saved changes yet
@@ -281,5 +279,4 @@ class TestAdminOptions(AdminConfirmTestCase):
             self.assertIn(shop, shops)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
@@ -0,0 +1,158 @@
+from unittest import mock
+
+from django.contrib import admin
+from django.urls import reverse
+
+from admin_action_tools.admin.confirm_tool import AdminConfirmMixin
+from admin_action_tools.diff import ChangeDiff
+from admin_action_tools.templatetags.formatting import format_change_data_field_value
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import InventoryFactory, ItemFactory, ShopFactory
+from tests.market.admin import ShoppingMallAdmin
+from tests.market.models import Inventory, Item, ShoppingMall
+
+
+class TestChangeDiff(AdminConfirmTestCase):
+    def _get_form(self, model, obj, data):
+        model_admin = admin.site._registry[model]
+        request = self.factory.post("/", data)
+        request.user = self.superuser
+        ModelForm = model_admin.get_form(request, obj, change=obj is not None)
+        form = ModelForm(data, instance=obj)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+    def test_change_loads_a_single_snapshot(self):
+        item = ItemFactory(name="Not name", price=10, currency="USD")
+        data = {
+            "name": "name",
+            "price": 10,
+            "currency": "CAD",
+            "description": "",
+        }
+        form = self._get_form(Item, item, data)
+
+        with self.assertNumQueries(1):
+            diff = ChangeDiff(form, Item, item, add=False)
+
+        self.assertEqual(diff.snapshot.name, "Not name")
+        self.assertIn("name", diff)
+        self.assertIn("currency", diff)
+        self.assertEqual(diff.as_dict()["name"], ["Not name", "name"])
+        self.assertEqual(diff.as_dict()["currency"], ["USD", "CAD"])
+        self.assertNotIn("price", diff)
+
+        # Foreign keys are compared by key, the related objects are not loaded
+        inventory = InventoryFactory(shop=ShopFactory(), item=item, quantity=1)
+        data = {"shop": inventory.shop_id, "item": item.id, "quantity": 2, "notes": inventory.notes}
+        form = self._get_form(Inventory, Inventory.objects.get(pk=inventory.pk), data)
+        with self.assertNumQueries(1):
+            diff = ChangeDiff(form, Inventory, form.instance, add=False)
+        self.assertEqual(diff.changed_fields(), ["quantity"])
+
+        # Only the related object of a changed foreign key is loaded, to display it
+        shop = ShopFactory()
+        form = self._get_form(Inventory, Inventory.objects.get(pk=inventory.pk), {**data, "shop": shop.id})
+        with self.assertNumQueries(2):
+            diff = ChangeDiff(form, Inventory, form.instance, add=False)
+        self.assertEqual(diff.as_dict()["shop"], [inventory.shop, shop])
+        self.assertNotIn("item", diff)
+
+    @mock.patch.object(ShoppingMallAdmin, "inlines", [])
+    def test_change_with_m2m_loads_one_query_per_m2m_field(self):
+        shops = [ShopFactory() for _ in range(3)]
+        mall = ShoppingMall.objects.create(name="My Mall")
+        mall.shops.set(shops)
+        data = {"name": "Not My Mall", "shops": [shops[0].id]}
+        form = self._get_form(ShoppingMall, mall, data)
+
+        # One query for the snapshot, one for the linked shops and one for the keys of the selected shops
+        with self.assertNumQueries(3):
+            diff = ChangeDiff(form, ShoppingMall, mall, add=False)
+
+        self.assertIn("name", diff)
+        self.assertIn("shops", diff)
+
+    def test_add_does_not_query(self):
+        data = {"name": "name", "price": 2, "currency": "CAD"}
+        form = self._get_form(Item, None, data)
+
+        with self.assertNumQueries(0):
+            diff = ChangeDiff(form, Item, None, add=True)
+
+        self.assertIsNone(diff.snapshot)
+        self.assertIn("name", diff)
+        self.assertIn("price", diff)
+        self.assertNotIn("image", diff)
+
+    def test_confirmation_page_builds_a_single_change_diff(self):
+        item = ItemFactory(name="Not name")
+        data = {
+            "id": item.id,
+            "name": "name",
+            "price": 2.0,
+            "currency": Item.VALID_CURRENCIES[0][0],
+            "_confirm_change": True,
+            "_continue": True,
+        }
+        with mock.patch.object(
+            AdminConfirmMixin, "_get_change_diff", autospec=True, side_effect=AdminConfirmMixin._get_change_diff
+        ) as get_change_diff:
+            response = self.client.post(reverse("admin:market_item_change", args=(item.id,)), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_change_diff.call_count, 1)
+        diff = response.context_data["change_diff"]
+        self.assertIsInstance(diff, ChangeDiff)
+        self.assertEqual(response.context_data["object_name"], "Not name")
+        self.assertEqual(response.context_data["changed_data"], diff.as_dict())
+
+    @mock.patch.object(ShoppingMallAdmin, "inlines", [])
+    def test_m2m_diff_only_reports_added_and_removed(self):
+        shops = [ShopFactory() for _ in range(5)]
+        mall = ShoppingMall.objects.create(name="My Mall")
+        mall.shops.set(shops[:3])
+        data = {"name": "My Mall", "shops": [shops[0].id, shops[3].id, shops[4].id]}
+        form = self._get_form(ShoppingMall, mall, data)
+
+        diff = ChangeDiff(form, ShoppingMall, mall, add=False)
+        change = diff.changes["shops"]
+
+        self.assertEqual(change.added.keys, {shops[3].id, shops[4].id})
+        self.assertEqual(change.removed.keys, {shops[1].id, shops[2].id})
+        self.assertEqual(str(change), "+2 added / −2 removed")
+        # Only the added and removed members are loaded
+        with self.assertNumQueries(1):
+            self.assertEqual(set(change.added.preview), {shops[3], shops[4]})
+        with self.assertNumQueries(1):
+            self.assertEqual(set(change.removed.preview), {shops[1], shops[2]})
+
+    @mock.patch.object(ShoppingMallAdmin, "inlines", [])
+    def test_m2m_diff_without_changes(self):
+        shops = [ShopFactory() for _ in range(2)]
+        mall = ShoppingMall.objects.create(name="My Mall")
+        mall.shops.set(shops)
+        data = {"name": "My Mall", "shops": [shop.id for shop in shops]}
+        form = self._get_form(ShoppingMall, mall, data)
+
+        diff = ChangeDiff(form, ShoppingMall, mall, add=False)
+
+        self.assertNotIn("shops", diff)
+
+    @mock.patch("admin_action_tools.diff.M2M_PREVIEW_LIMIT", 2)
+    @mock.patch.object(ShoppingMallAdmin, "inlines", [])
+    def test_m2m_preview_is_capped(self):
+        shops = [ShopFactory() for _ in range(5)]
+        mall = ShoppingMall.objects.create(name="My Mall")
+        mall.shops.set(shops)
+        data = {"name": "My Mall", "shops": []}
+        form = self._get_form(ShoppingMall, mall, data)
+
+        removed = ChangeDiff(form, ShoppingMall, mall, add=False).changes["shops"].removed
+
+        self.assertEqual(removed.count, 5)
+        self.assertEqual(len(removed.preview), 2)
+        self.assertEqual(removed.remaining, 3)
+        rendered = format_change_data_field_value(removed)
+        self.assertIn("<p>−5 removed</p>", rendered)
+        self.assertIn("<li>… and 3 more</li>", rendered)
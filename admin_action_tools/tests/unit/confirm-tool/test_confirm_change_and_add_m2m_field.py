@@ -85,8 +85,10 @@ class TestConfirmChangeAndAddM2MField(AdminConfirmTestCase):
         ]
         self.assertEqual(response.template_name, expected_templates)
 
-        # Should show two lists for the m2m current and modified values
-        self.assertEqual(response.rendered_content.count("<ul>"), 2)
+        # Should only show the removed shops, nothing was added
+        self.assertIn("<p>\u22128 removed</p>", response.rendered_content)
+        self.assertIn("<p>+0 added</p>", response.rendered_content)
+        self.assertEqual(response.rendered_content.count("<ul>"), 1)
 
         self._assertManyToManyFormHtml(
             rendered_content=response.rendered_content,
@@ -1,10 +1,9 @@
 from unittest import mock
 
-from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 
-from admin_action_tools.constants import CACHE_KEYS, CONFIRMATION_RECEIVED
+from admin_action_tools.constants import CONFIRMATION_ID, CONFIRMATION_RECEIVED
 from admin_action_tools.tests.helpers import AdminConfirmTestCase
 from tests.factories import ItemFactory, ShopFactory
 from tests.market.admin import ItemAdmin, ShoppingMallAdmin
@@ -40,7 +39,8 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         )
 
         # Should have cached the unsaved item
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNotNone(cached_item)
         self.assertIsNone(cached_item.id)
         self.assertEqual(cached_item.name, data["name"])
@@ -53,6 +53,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         # Click "Yes, I'm Sure"
         del data["_confirm_add"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(reverse("admin:market_item_add"), data=data)
 
         # Should have redirected to changelist
@@ -67,8 +68,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         self.assertEqual(saved_item.currency, data["currency"])
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_simple_change_with_continue(self):
         item = ItemFactory(name="Not name")
@@ -100,7 +100,8 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         )
 
         # Should have cached the unsaved item
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNotNone(cached_item)
 
         # Should not have saved the changes yet
@@ -111,6 +112,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(f"/admin/market/item/{item.id}/change/", data=data)
 
         # Should not have redirected to changelist
@@ -124,8 +126,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         self.assertEqual(saved_item.currency, data["currency"])
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_file_and_image_add_addanother(self):
         # Load the Add Item Page
@@ -166,6 +167,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
             save_action="_addanother",
             multipart_form=True,
         )
+        confirmation_cache = self._get_confirmation_cache(response)
 
         # Should not have saved the item yet
         self.assertEqual(Item.objects.count(), 0)
@@ -176,6 +178,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         del confirmation_data["image"]
         del confirmation_data["file"]
         confirmation_data[CONFIRMATION_RECEIVED] = True
+        confirmation_data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(reverse("admin:market_item_add"), data=confirmation_data)
 
         # Should have redirected to changelist
@@ -196,9 +199,9 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         self.assertRegex(saved_item.image.name, r"test_image.*\.jpg$")
 
         # Should have cleared cache
-        self.assertEqual(len(ItemAdmin._file_cache.cached_keys), 0)
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
+        self.assertIsNone(confirmation_cache.get_file("file"))
+        self.assertIsNone(confirmation_cache.get_file("image"))
 
     def test_file_and_image_change_with_saveasnew(self):
         item = ItemFactory(name="Not name")
@@ -255,6 +258,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
             save_action="_saveasnew",
             multipart_form=True,
         )
+        confirmation_cache = self._get_confirmation_cache(response)
 
         # Should not have saved the changes yet
         self.assertEqual(Item.objects.count(), 1)
@@ -267,6 +271,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         del data["_confirm_change"]
         data["image"] = ""
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(f"/admin/market/item/{item.id}/change/", data=data)
 
         # Should not have redirected to changelist
@@ -291,7 +296,8 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         self.assertRegex(new_item.image.name, r"test_image2.*\.jpg$")
 
         # Should have cleared cache
-        self.assertEqual(len(ItemAdmin._file_cache.cached_keys), 0)
+        self.assertIsNone(confirmation_cache.get_object())
+        self.assertIsNone(confirmation_cache.get_file("image"))
 
     def test_relations_add(self):
         gm = GeneralManager.objects.create(name="gm")
@@ -326,13 +332,15 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_save")
 
         # Should not have cached the unsaved object
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Click "Yes, I'm Sure"
         confirmation_received_data = data
         del confirmation_received_data["_confirm_add"]
         confirmation_received_data[CONFIRMATION_RECEIVED] = True
+        confirmation_received_data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         response = self.client.post(reverse("admin:market_shoppingmall_add"), data=confirmation_received_data)
 
@@ -350,9 +358,7 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
             self.assertIn(shop, shops)
 
         # Should have cleared cache
-        self.assertEqual(len(ItemAdmin._file_cache.cached_keys), 0)
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_relation_change_with_saveasnew(self):
         gm = GeneralManager.objects.create(name="gm")
@@ -395,7 +401,8 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_saveasnew")
 
         # Should not have cached the unsaved obj
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Should not have saved changes yet
@@ -439,4 +446,4 @@ class TestConfirmSaveActions(AdminConfirmTestCase):
             self.assertIn(shop, shops2)
 
         # Should have cleared cache
-        self.assertEqual(len(ItemAdmin._file_cache.cached_keys), 0)
+        self.assertIsNone(confirmation_cache.get_object())
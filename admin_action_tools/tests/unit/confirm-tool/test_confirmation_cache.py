@@ -1,11 +1,12 @@
 from unittest import mock
 
-from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
 from django.urls import reverse
 
-from admin_action_tools.constants import CACHE_KEYS, CONFIRMATION_RECEIVED
-from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from admin_action_tools.confirmation_cache import ConfirmationCache
+from admin_action_tools.constants import CONFIRMATION_ID, CONFIRMATION_RECEIVED
+from admin_action_tools.tests.helpers import AdminConfirmTestCase, RequestSessionFactory
 from tests.factories import ItemFactory, ShopFactory
 from tests.market.admin import ItemAdmin, ShoppingMallAdmin
 from tests.market.models import GeneralManager, Item, ShoppingMall, Town
@@ -40,7 +41,8 @@ class TestConfirmationCache(AdminConfirmTestCase):
         )
 
         # Should have cached the unsaved item
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNotNone(cached_item)
         self.assertIsNone(cached_item.id)
         self.assertEqual(cached_item.name, data["name"])
@@ -53,6 +55,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         # Click "Yes, I'm Sure"
         del data["_confirm_add"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(reverse("admin:market_item_add"), data=data)
 
         # Should have redirected to changelist
@@ -67,8 +70,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         self.assertEqual(saved_item.currency, data["currency"])
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_simple_change(self):
         item = ItemFactory(name="Not name")
@@ -100,7 +102,8 @@ class TestConfirmationCache(AdminConfirmTestCase):
         )
 
         # Should have cached the unsaved item
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNotNone(cached_item)
 
         # Should not have saved the changes yet
@@ -111,6 +114,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(f"/admin/market/item/{item.id}/change/", data=data)
 
         # Should not have redirected to changelist
@@ -124,8 +128,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         self.assertEqual(saved_item.currency, data["currency"])
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_file_and_image_add(self):
         # Load the Add Item Page
@@ -168,7 +171,8 @@ class TestConfirmationCache(AdminConfirmTestCase):
         )
 
         # Should have cached the unsaved item
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNotNone(cached_item)
         self.assertIsNone(cached_item.id)
         self.assertEqual(cached_item.name, data["name"])
@@ -186,6 +190,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         del confirmation_data["image"]
         del confirmation_data["file"]
         confirmation_data[CONFIRMATION_RECEIVED] = True
+        confirmation_data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(reverse("admin:market_item_add"), data=confirmation_data)
 
         # Should have redirected to changelist
@@ -205,8 +210,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         self.assertRegex(saved_item.image.name, r"test_image.*\.jpg$")
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_file_and_image_change(self):
         item = ItemFactory(name="Not name")
@@ -263,7 +267,8 @@ class TestConfirmationCache(AdminConfirmTestCase):
         )
 
         # Should have cached the unsaved item
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNotNone(cached_item)
 
         # Should not have saved the changes yet
@@ -277,6 +282,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         del data["_confirm_change"]
         data["image"] = ""
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(f"/admin/market/item/{item.id}/change/", data=data)
 
         # Should not have redirected to changelist
@@ -294,8 +300,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         self.assertRegex(saved_item.image.name, r"test_image2.*\.jpg$")
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_relations_add(self):
         gm = GeneralManager.objects.create(name="gm")
@@ -330,7 +335,8 @@ class TestConfirmationCache(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_save")
 
         # Should not have cached the unsaved object
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Should not have saved the object yet
@@ -356,8 +362,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
             self.assertIn(shop, shops)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_relation_change(self):
         gm = GeneralManager.objects.create(name="gm")
@@ -400,7 +405,8 @@ class TestConfirmationCache(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_continue")
 
         # Should not have cached the unsaved obj
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Should not have saved changes yet
@@ -416,6 +422,7 @@ class TestConfirmationCache(AdminConfirmTestCase):
         confirmation_received_data = data
         del confirmation_received_data["_confirm_change"]
         confirmation_received_data[CONFIRMATION_RECEIVED] = True
+        confirmation_received_data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         response = self.client.post(
             f"/admin/market/shoppingmall/{mall.id}/change/",
@@ -436,5 +443,61 @@ class TestConfirmationCache(AdminConfirmTestCase):
             self.assertIn(shop, shops2)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
+
+    def test_confirmations_are_namespaced_per_session(self):
+        ItemAdmin.confirm_add = True
+        data = {
+            "name": "name",
+            "price": 2.0,
+            "currency": Item.VALID_CURRENCIES[0][0],
+            "_confirm_add": True,
+            "_save": True,
+        }
+        response = self.client.post(reverse("admin:market_item_add"), data=data)
+        confirmation_cache = self._get_confirmation_cache(response)
+        self.assertIsNotNone(confirmation_cache.get_object())
+
+        # Another editor asks for a confirmation too
+        other_client = Client()
+        other_client.force_login(self.superuser)
+        response = other_client.post(reverse("admin:market_item_add"), data={**data, "name": "other"})
+        other_confirmation_id = response.context_data["confirmation_id"]
+        self.assertNotEqual(other_confirmation_id, confirmation_cache.confirmation_id)
+
+        # The other session can not read this confirmation
+        other_request = RequestSessionFactory(other_client.session).request()
+        self.assertIsNone(ConfirmationCache(other_request, Item, confirmation_cache.confirmation_id).get_object())
+        self.assertEqual(ConfirmationCache(other_request, Item, other_confirmation_id).get_object().name, "other")
+
+        # Saving without confirmation does not clear pending confirmations
+        self.client.post(reverse("admin:market_item_add"), data={"name": "n", "price": 1, "currency": "CAD"})
+        self.assertEqual(confirmation_cache.get_object().name, "name")
+
+    def test_unknown_confirmation_id_is_ignored(self):
+        item = ItemFactory(name="Not name")
+        data = {
+            "id": item.id,
+            "name": "name",
+            "price": 2.0,
+            "currency": Item.VALID_CURRENCIES[0][0],
+            "_continue": True,
+            CONFIRMATION_RECEIVED: True,
+            CONFIRMATION_ID: "../not-an-id",
+        }
+        response = self.client.post(f"/admin/market/item/{item.id}/change/", data=data)
+
+        self.assertEqual(response.status_code, 302)
+        item.refresh_from_db()
+        self.assertEqual(item.name, "name")
+
+    def test_clear_closes_the_cached_files(self):
+        request = RequestSessionFactory(self.client.session).request()
+        confirmation_cache = ConfirmationCache(request, Item)
+        confirmation_cache.set_file("file", SimpleUploadedFile("test_file.txt", b"content"))
+        upload = confirmation_cache.get_file("file")
+        self.assertFalse(upload.closed)
+
+        confirmation_cache.clear()
+        self.assertTrue(upload.closed)
+        self.assertIsNone(confirmation_cache.get_file("file"))
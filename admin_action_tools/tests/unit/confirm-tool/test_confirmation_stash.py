@@ -0,0 +1,86 @@
+import re
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from admin_action_tools.constants import CONFIRMATION_ID, CONFIRMATION_RECEIVED
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ItemFactory, ShopFactory
+from tests.market.admin import ItemAdmin, ShoppingMallAdmin
+from tests.market.models import Item, ShoppingMall
+
+
+@mock.patch.multiple(
+    ShoppingMallAdmin, stash_confirmation_post=True, confirm_change=True, confirmation_fields=["name"]
+)
+@mock.patch.multiple(ItemAdmin, stash_confirmation_post=True, confirm_change=True, confirmation_fields=None)
+class TestConfirmationStash(AdminConfirmTestCase):
+    def _inline_data(self, url, shops):
+        prefix = re.search(r'name="([^"]+)-TOTAL_FORMS"', self.client.get(url).rendered_content).group(1)
+        data = {
+            f"{prefix}-TOTAL_FORMS": str(len(shops)),
+            f"{prefix}-INITIAL_FORMS": "0",
+            f"{prefix}-MIN_NUM_FORMS": "0",
+            f"{prefix}-MAX_NUM_FORMS": "1000",
+        }
+        for index, shop in enumerate(shops):
+            data[f"{prefix}-{index}-shop"] = str(shop.pk)
+        return data
+
+    def test_confirmation_only_posts_its_id(self):
+        mall = ShoppingMall.objects.create(name="name")
+        shops = [ShopFactory() for _ in range(3)]
+        url = f"/admin/market/shoppingmall/{mall.id}/change/"
+        data = {"id": mall.id, "name": "new name", "_confirm_change": True, "_continue": True}
+        response = self.client.post(url, {**data, **self._inline_data(url, shops)})
+        self.assertEqual(response.status_code, 200)
+
+        # The form and formsets are not rendered again
+        self.assertNotIn("hidden-form", response.rendered_content)
+        self.assertNotIn("TOTAL_FORMS", response.rendered_content)
+        self._assertSubmitHtml(response.rendered_content, save_action="_continue", multipart_form=True)
+        confirmation_cache = self._get_confirmation_cache(response)
+        self.assertEqual(confirmation_cache.get_post()["name"], "new name")
+        self.assertNotIn("_confirm_change", confirmation_cache.get_post())
+
+        response = self.client.post(
+            url,
+            {CONFIRMATION_RECEIVED: True, CONFIRMATION_ID: confirmation_cache.confirmation_id, "_continue": True},
+        )
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        mall.refresh_from_db()
+        self.assertEqual(mall.name, "new name")
+        self.assertEqual(set(mall.shops.all()), set(shops))
+        self.assertIsNone(confirmation_cache.get_post())
+
+    def test_expired_confirmation(self):
+        mall = ShoppingMall.objects.create(name="name")
+        url = f"/admin/market/shoppingmall/{mall.id}/change/"
+        response = self.client.post(url, {CONFIRMATION_RECEIVED: True, CONFIRMATION_ID: "0" * 32, "_save": True})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertIn("The confirmation has expired", self.client.get(url).rendered_content)
+        mall.refresh_from_db()
+        self.assertEqual(mall.name, "name")
+
+    def test_stash_keeps_file_uploads(self):
+        item = ItemFactory(name="item")
+        url = f"/admin/market/item/{item.id}/change/"
+        data = {
+            "name": "new name",
+            "price": 2.0,
+            "currency": Item.VALID_CURRENCIES[0][0],
+            "_confirm_change": True,
+            "_save": True,
+            "file": SimpleUploadedFile(name="test_file.jpg", content=b"file contents", content_type="image/jpeg"),
+        }
+        response = self.client.post(url, data)
+        self.assertNotIn("hidden-form", response.rendered_content)
+        confirmation_id = response.context_data["confirmation_id"]
+
+        response = self.client.post(
+            url, {CONFIRMATION_RECEIVED: True, CONFIRMATION_ID: confirmation_id, "_save": True}
+        )
+        self.assertEqual(response.status_code, 302)
+        item.refresh_from_db()
+        self.assertEqual(item.name, "new name")
+        self.assertRegex(item.file.name, r"test_file.*\.jpg$")
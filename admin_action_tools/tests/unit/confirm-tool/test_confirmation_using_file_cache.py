@@ -13,13 +13,10 @@ Thus we should test it extensively
 import time
 from unittest import mock
 
-from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from admin_action_tools.constants import CACHE_KEYS, CONFIRMATION_RECEIVED
-from admin_action_tools.file_cache import FileCache
+from admin_action_tools.constants import CONFIRMATION_ID, CONFIRMATION_RECEIVED
 from admin_action_tools.tests.helpers import AdminConfirmTestCase
-from admin_action_tools.utils import format_cache_key
 from tests.factories import ItemFactory, ShopFactory
 from tests.market.admin import ItemAdmin
 from tests.market.models import Item, Shop
@@ -78,15 +75,15 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
             currency=data["currency"],
             image=i2,
         )
-        file_cache = FileCache()
-        file_cache.set(format_cache_key(model="Item", field="image"), i2)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
+        confirmation_cache.set_file("image", i2)
 
-        cache.set(CACHE_KEYS["object"], cache_item)
-        cache.set(CACHE_KEYS["post"], data)
+        confirmation_cache.set_object(cache_item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -118,8 +115,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertEqual(new_item.image.name.count("test_image2"), 1)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_save_as_continue_false_should_redirect_to_changelist(self):
         item = self.item
@@ -151,15 +147,15 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
             currency=data["currency"],
             image=i2,
         )
-        file_cache = FileCache()
-        file_cache.set(format_cache_key(model="Item", field="image"), i2)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
+        confirmation_cache.set_file("image", i2)
 
-        cache.set(CACHE_KEYS["object"], cache_item)
-        cache.set(CACHE_KEYS["post"], data)
+        confirmation_cache.set_object(cache_item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -191,8 +187,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertEqual(new_item.image.name.count("test_image2"), 1)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_saveasnew_without_any_file_changes_should_save_new_instance_without_files(
         self,
@@ -218,12 +213,13 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
             currency=data["currency"],
         )
 
-        cache.set(CACHE_KEYS["object"], cache_item)
-        cache.set(CACHE_KEYS["post"], data)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
+        confirmation_cache.set_object(cache_item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -256,8 +252,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertFalse(new_item.image)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_add_with_upload_file_should_save_new_instance_with_files(self):
         # Upload new file
@@ -281,12 +276,13 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         # Set cache
         cache_item = Item(name=data["name"], price=data["price"], currency=data["currency"], file=f2)
 
-        cache.set(CACHE_KEYS["object"], cache_item)
-        cache.set(CACHE_KEYS["post"], data)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
+        confirmation_cache.set_object(cache_item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_add"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post("/admin/market/item/add/", data=data)
@@ -320,8 +316,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertRegex(new_item.file.name, r"test_file2.*\.jpg$")
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_add_without_cached_post_should_save_new_instance_with_file(self):
         # Upload new file
@@ -345,13 +340,13 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         # Set cache
         cache_item = Item(name=data["name"], price=data["price"], currency=data["currency"], file=f2)
 
-        cache.set(CACHE_KEYS["object"], cache_item)
-        # Make sure there's no post cached post
-        cache.delete(CACHE_KEYS["post"])
+        confirmation_cache = self._get_confirmation_cache(model=Item)
+        confirmation_cache.set_object(cache_item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_add"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post("/admin/market/item/add/", data=data)
@@ -385,8 +380,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertRegex(new_item.file.name, r"test_file2.*\.jpg$")
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_add_without_cached_object_should_save_new_instance_but_not_have_file(self):
         # Request.POST
@@ -399,13 +393,13 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
             "_save": True,
         }
 
-        # Make sure there's no post cached obj
-        cache.delete(CACHE_KEYS["object"])
-        cache.set(CACHE_KEYS["post"], data)
+        # Make sure there's no cached obj
+        confirmation_cache = self._get_confirmation_cache(model=Item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_add"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post("/admin/market/item/add/", data=data)
@@ -439,8 +433,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertFalse(new_item.file)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_add_without_any_cache_should_save_new_instance_but_not_have_file(self):
         # Request.POST
@@ -454,12 +447,12 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         }
 
         # Make sure there's no cache
-        cache.delete(CACHE_KEYS["object"])
-        cache.delete(CACHE_KEYS["post"])
+        confirmation_cache = self._get_confirmation_cache(model=Item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_add"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post("/admin/market/item/add/", data=data)
@@ -493,8 +486,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertFalse(new_item.file)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_change_without_cached_post_should_save_file_changes(self):
         item = self.item
@@ -527,18 +519,17 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
             currency=data["currency"],
             image=i2,
         )
-        file_cache = FileCache()
-        file_cache.set(format_cache_key(model="Item", field="image"), i2)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
+        confirmation_cache.set_file("image", i2)
 
-        cache.set(CACHE_KEYS["object"], cache_item)
-        # Ensure no cached post
-        cache.delete(CACHE_KEYS["post"])
+        confirmation_cache.set_object(cache_item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         # Image would have been in FILES and not in POST
         del data["image"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -573,8 +564,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertIn("test_image2", new_item.image.name)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_change_without_cached_object_should_save_but_without_file_changes(self):
         item = self.item
@@ -594,12 +584,12 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         }
 
         # Ensure no cached obj
-        cache.delete(CACHE_KEYS["object"])
-        cache.set(CACHE_KEYS["post"], data)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -632,8 +622,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertFalse(new_item.image)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_change_without_any_cache_should_save_but_not_have_file_changes(self):
         item = self.item
@@ -653,12 +642,12 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         }
 
         # Ensure no cache
-        cache.delete(CACHE_KEYS["object"])
-        cache.delete(CACHE_KEYS["post"])
+        confirmation_cache = self._get_confirmation_cache(model=Item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -691,8 +680,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertFalse(new_item.image)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_change_without_changing_file_should_save_changes(self):
         item = self.item
@@ -719,12 +707,12 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
             currency=data["currency"],
         )
 
-        cache.get(CACHE_KEYS["object"], cache_item)
-        cache.get(CACHE_KEYS["post"], data)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -748,10 +736,9 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertEqual(item.image.name.count("test_image"), 1)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
-    @mock.patch("admin_action_tools.admin.confirm_tool.CACHE_TIMEOUT", 1)
+    @mock.patch("admin_action_tools.confirmation_cache.CACHE_TIMEOUT", 1)
     def test_old_cache_should_not_be_used(self):
         item = self.item
 
@@ -783,7 +770,8 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         )
 
         # Should have cached the unsaved item
-        cached_item = cache.get(CACHE_KEYS["object"])
+        confirmation_cache = self._get_confirmation_cache(response)
+        cached_item = confirmation_cache.get_object()
         self.assertIsNotNone(cached_item)
 
         # Should not have saved the changes yet
@@ -798,13 +786,14 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         time.sleep(1)
 
         # Check that it did time out
-        cached_item = cache.get(CACHE_KEYS["object"])
+        cached_item = confirmation_cache.get_object()
         self.assertIsNone(cached_item)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data["image"] = ""
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
         response = self.client.post(f"/admin/market/item/{item.id}/change/", data=data)
 
         # Should not have redirected to changelist
@@ -822,8 +811,7 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertNotIn("test_image2", saved_item.image)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_cache_with_incorrect_model_should_not_be_used(self):
         item = self.item
@@ -845,12 +833,13 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         # Set cache to incorrect model
         cache_obj = Shop(name="ShopName")
 
-        cache.set(CACHE_KEYS["object"], cache_obj)
-        cache.set(CACHE_KEYS["post"], data)
+        confirmation_cache = self._get_confirmation_cache(model=Item)
+        confirmation_cache.set_object(cache_obj)
 
         # Click "Yes, I'm Sure"
         del data["_confirm_change"]
         data[CONFIRMATION_RECEIVED] = True
+        data[CONFIRMATION_ID] = confirmation_cache.confirmation_id
 
         with mock.patch.object(ItemAdmin, "message_user") as message_user:
             response = self.client.post(f"/admin/market/item/{self.item.id}/change/", data=data)
@@ -874,11 +863,9 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self.assertEqual(item.image.name.count("test_image"), 1)
 
         # Should have cleared cache
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(confirmation_cache.get_object())
 
     def test_form_without_files_should_not_use_cache(self):
-        cache.delete_many(CACHE_KEYS.values())
         shop = ShopFactory()
         # Click "Save And Continue"
         data = {
@@ -893,5 +880,4 @@ class TestConfirmationUsingFileCache(AdminConfirmTestCase):
         self._assertSubmitHtml(rendered_content=response.rendered_content, save_action="_continue")
 
         # Should not have set cache since not multipart form
-        for key in CACHE_KEYS.values():
-            self.assertIsNone(cache.get(key))
+        self.assertIsNone(response.context_data["confirmation_id"])
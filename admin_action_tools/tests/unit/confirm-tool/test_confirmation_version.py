@@ -0,0 +1,127 @@
+import re
+from unittest import mock
+
+from admin_action_tools.constants import (
+    CONFIRMATION_ID,
+    CONFIRMATION_RECEIVED,
+    CONFIRMATION_VERSION,
+)
+from admin_action_tools.diff import ChangeDiff
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ItemFactory
+from tests.market.admin import ItemAdmin, ShoppingMallAdmin
+from tests.market.models import Item, ShoppingMall
+
+
+@mock.patch.multiple(ShoppingMallAdmin, confirm_change=True, confirmation_fields=["name"])
+@mock.patch.multiple(ItemAdmin, stash_confirmation_post=True, confirm_change=True, confirmation_fields=None)
+class TestConfirmationVersion(AdminConfirmTestCase):
+    def _mall_data(self, mall, url):
+        prefix = re.search(r'name="([^"]+)-TOTAL_FORMS"', self.client.get(url).rendered_content).group(1)
+        return {
+            "id": mall.id,
+            "name": "new name",
+            "_save": True,
+            f"{prefix}-TOTAL_FORMS": "0",
+            f"{prefix}-INITIAL_FORMS": "0",
+            f"{prefix}-MIN_NUM_FORMS": "0",
+            f"{prefix}-MAX_NUM_FORMS": "1000",
+        }
+
+    def _confirm(self, url, data):
+        response = self.client.post(url, {**data, "_confirm_change": True})
+        self.assertEqual(response.status_code, 200)
+        version = response.context_data["change_diff"].version
+        self.assertIn(f'name="{CONFIRMATION_VERSION}" value="{version}"', response.rendered_content)
+        return response, version
+
+    def test_version_is_loaded_in_a_single_query(self):
+        mall = ShoppingMall.objects.create(name="name")
+        url = f"/admin/market/shoppingmall/{mall.id}/change/"
+        _, version = self._confirm(url, self._mall_data(mall, url))
+        with self.assertNumQueries(1):
+            self.assertEqual(ChangeDiff.load_version(ShoppingMall, pk=mall.pk), version)
+        ShoppingMall.objects.filter(pk=mall.pk).update(name="other")
+        self.assertNotEqual(ChangeDiff.load_version(ShoppingMall, pk=mall.pk), version)
+        self.assertIsNone(ChangeDiff.load_version(ShoppingMall, pk=0))
+
+    def test_unchanged_object_is_saved(self):
+        mall = ShoppingMall.objects.create(name="name")
+        url = f"/admin/market/shoppingmall/{mall.id}/change/"
+        data = self._mall_data(mall, url)
+        _, version = self._confirm(url, data)
+
+        response = self.client.post(url, {**data, CONFIRMATION_VERSION: version})
+        self.assertRedirects(response, "/admin/market/shoppingmall/", fetch_redirect_response=False)
+        mall.refresh_from_db()
+        self.assertEqual(mall.name, "new name")
+
+    def test_changed_object_is_confirmed_again(self):
+        mall = ShoppingMall.objects.create(name="name")
+        url = f"/admin/market/shoppingmall/{mall.id}/change/"
+        data = self._mall_data(mall, url)
+        _, version = self._confirm(url, data)
+        ShoppingMall.objects.filter(pk=mall.pk).update(name="changed meanwhile")
+
+        response = self.client.post(url, {**data, CONFIRMATION_VERSION: version})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("was changed by someone else", response.rendered_content)
+        change_diff = response.context_data["change_diff"]
+        self.assertNotEqual(change_diff.version, version)
+        self.assertEqual(change_diff.changes["name"].initial_value, "changed meanwhile")
+        mall.refresh_from_db()
+        self.assertEqual(mall.name, "changed meanwhile")
+
+        response = self.client.post(url, {**data, CONFIRMATION_VERSION: change_diff.version})
+        self.assertEqual(response.status_code, 302)
+        mall.refresh_from_db()
+        self.assertEqual(mall.name, "new name")
+
+    def test_changed_object_keeps_its_confirmation(self):
+        item = ItemFactory(name="item")
+        url = f"/admin/market/item/{item.id}/change/"
+        data = {"name": "new name", "price": 2.0, "currency": Item.VALID_CURRENCIES[0][0], "_save": True}
+        response, version = self._confirm(url, data)
+        confirmation_id = response.context_data["confirmation_id"]
+        Item.objects.filter(pk=item.pk).update(price=5)
+
+        received = {CONFIRMATION_RECEIVED: True, CONFIRMATION_ID: confirmation_id, "_save": True}
+        response = self.client.post(url, {**received, CONFIRMATION_VERSION: version})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["confirmation_id"], confirmation_id)
+        new_version = response.context_data["change_diff"].version
+        item.refresh_from_db()
+        self.assertEqual(item.name, "item")
+
+        response = self.client.post(url, {**received, CONFIRMATION_VERSION: new_version})
+        self.assertEqual(response.status_code, 302)
+        item.refresh_from_db()
+        self.assertEqual(item.name, "new name")
+
+    def test_version_is_posted_by_the_confirmation_form(self):
+        item = ItemFactory(name="item")
+        url = f"/admin/market/item/{item.id}/change/"
+        data = {**self._get_post_form_data(self.client.get(url).rendered_content), "name": "new name"}
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        confirmation = self._get_post_form_data(response.rendered_content)
+        self.assertEqual(confirmation[CONFIRMATION_VERSION], [response.context_data["change_diff"].version])
+        # The version is posted by the confirmation form only, it is not stashed with the submitted form
+        stashed_post = self._get_confirmation_cache(response).get_post()
+        self.assertEqual(stashed_post["name"], "new name")
+        self.assertNotIn(CONFIRMATION_VERSION, stashed_post)
+
+        # A stale version shows the confirmation page again
+        Item.objects.filter(pk=item.pk).update(price=5)
+        response = self.client.post(url, confirmation)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("was changed by someone else", response.rendered_content)
+        self.assertNotIn(CONFIRMATION_VERSION, self._get_confirmation_cache(response).get_post())
+        item.refresh_from_db()
+        self.assertEqual(item.name, "item")
+
+        # The current one saves
+        response = self.client.post(url, self._get_post_form_data(response.rendered_content))
+        self.assertEqual(response.status_code, 302)
+        item.refresh_from_db()
+        self.assertEqual(item.name, "new name")
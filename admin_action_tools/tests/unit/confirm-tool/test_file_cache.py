@@ -1,6 +1,13 @@
-from django.core.files.uploadedfile import SimpleUploadedFile
+import os
+from unittest import mock
 
-from admin_action_tools.file_cache import FileCache
+import pytest
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+
+from admin_action_tools.file_cache import DiskFileCache, FileCache, StorageFileCache
+from tests.market.models import Item
 
 file = SimpleUploadedFile(
     name="test_file.jpg",
@@ -32,3 +39,252 @@ def test_should_delete_all_file_cache():
     assert len(file_cache.cached_keys) == 0  # nosec
     assert file_cache.get("key") is None  # nosec
     assert file_cache.get("key2") is None  # nosec
+
+
+def test_should_store_file_in_chunks():
+    file_cache = FileCache()
+    file_cache.chunk_size = 1024
+    file_cache.set("chunked", file)
+    state = file_cache.cache.get("chunked")
+    assert state["chunks"] == -(-file.size // 1024)  # nosec
+    assert "content" not in state  # nosec
+    for index in range(state["chunks"]):
+        assert len(file_cache.cache.get(FileCache.chunk_key("chunked", index))) <= 1024  # nosec
+
+
+def test_should_stream_chunks_back():
+    file_cache = FileCache()
+    file_cache.chunk_size = 1000
+    file_cache.set("chunked", file)
+    upload = file_cache.get("chunked")
+    file.seek(0)
+    content = file.read()
+    assert upload.size == len(content)  # nosec
+    assert upload.name == "test_file.jpg"  # nosec
+    assert b"".join(upload.chunks(333)) == content  # nosec
+    upload.seek(1500)
+    assert upload.read(10) == content[1500:1510]  # nosec
+
+
+def test_should_delete_file_chunks():
+    file_cache = FileCache()
+    file_cache.chunk_size = 1024
+    file_cache.set("chunked", file)
+    file_cache.delete("chunked")
+    assert file_cache.cache.get(FileCache.chunk_key("chunked", 0)) is None  # nosec
+    assert file_cache.get("chunked") is None  # nosec
+
+
+def test_should_not_get_file_with_evicted_chunk():
+    file_cache = FileCache()
+    file_cache.chunk_size = 1024
+    file_cache.set("chunked", file)
+    file_cache.cache.delete(FileCache.chunk_key("chunked", 1))
+    assert file_cache.get("chunked") is None  # nosec
+
+
+def test_should_fail_reading_expired_chunks():
+    file_cache = FileCache()
+    file_cache.chunk_size = 1024
+    file_cache.set("chunked", file)
+    upload = file_cache.get("chunked")
+    file_cache.cache.delete(FileCache.chunk_key("chunked", 1))
+    with pytest.raises(IOError):
+        upload.read()
+
+
+@pytest.fixture
+def disk_file_cache(tmp_path):
+    file_cache = DiskFileCache()
+    file_cache.spool_dir = str(tmp_path / "spool")
+    return file_cache
+
+
+@pytest.fixture
+def temporary_upload():
+    file.seek(0)
+    upload = TemporaryUploadedFile("test_file.jpg", "image/jpeg", file.size, None)
+    upload.write(file.read())
+    upload.flush()
+    upload.seek(0)
+    yield upload
+    upload.close()
+
+
+def test_disk_cache_should_link_temporary_upload(disk_file_cache, temporary_upload):
+    disk_file_cache.set("disk", temporary_upload)
+    state = disk_file_cache.cache.get("disk")
+    assert "content" not in state  # nosec
+    assert "chunks" not in state  # nosec
+    # Same inode: the upload has not been copied
+    assert os.stat(state["path"]).st_ino == os.stat(temporary_upload.temporary_file_path()).st_ino  # nosec
+
+
+def test_disk_cache_should_spool_in_memory_upload(disk_file_cache):
+    disk_file_cache.set("disk", file)
+    upload = disk_file_cache.get("disk")
+    file.seek(0)
+    assert upload.read() == file.read()  # nosec
+    assert upload.name == "test_file.jpg"  # nosec
+    upload.close()
+
+
+def test_disk_cache_should_reopen_without_copy(disk_file_cache, temporary_upload, tmp_path):
+    disk_file_cache.set("disk", temporary_upload)
+    path = disk_file_cache.cache.get("disk")["path"]
+    upload = disk_file_cache.get("disk")
+    assert upload.temporary_file_path() == path  # nosec
+    inode = os.stat(path).st_ino
+
+    storage = FileSystemStorage(location=str(tmp_path / "media"))
+    name = storage.save(upload.name, upload)
+    upload.close()
+    # The spooled file has been moved into the storage
+    assert os.stat(storage.path(name)).st_ino == inode  # nosec
+    assert not os.path.exists(path)  # nosec
+
+
+def test_disk_cache_should_delete_spooled_file(disk_file_cache, temporary_upload):
+    disk_file_cache.set("disk", temporary_upload)
+    path = disk_file_cache.cache.get("disk")["path"]
+    disk_file_cache.delete("disk")
+    assert not os.path.exists(path)  # nosec
+    assert disk_file_cache.get("disk") is None  # nosec
+    assert os.path.exists(temporary_upload.temporary_file_path())  # nosec
+
+
+def test_disk_cache_should_purge_expired_files(disk_file_cache, temporary_upload):
+    disk_file_cache.set("disk", temporary_upload)
+    path = disk_file_cache.cache.get("disk")["path"]
+    os.utime(path, (0, 0))
+    disk_file_cache.purge_expired()
+    assert not os.path.exists(path)  # nosec
+    assert disk_file_cache.get("disk") is None  # nosec
+
+
+def test_disk_cache_should_purge_on_a_share_of_writes(disk_file_cache, temporary_upload):
+    disk_file_cache.set("disk", temporary_upload)
+    path = disk_file_cache.cache.get("disk")["path"]
+    os.utime(path, (0, 0))
+    with mock.patch("admin_action_tools.file_cache.random.random", return_value=0.5):
+        disk_file_cache.set("other", file)
+    assert os.path.exists(path)  # nosec
+    with mock.patch("admin_action_tools.file_cache.random.random", return_value=0.0):
+        disk_file_cache.set("other", file)
+    assert not os.path.exists(path)  # nosec
+
+
+def test_purge_file_cache_command(tmp_path, temporary_upload):
+    with mock.patch.object(DiskFileCache, "spool_dir", str(tmp_path / "spool")), mock.patch(
+        "admin_action_tools.file_cache.FILE_CACHE_BACKEND", "admin_action_tools.file_cache.DiskFileCache"
+    ):
+        disk_file_cache = DiskFileCache()
+        disk_file_cache.set("disk", temporary_upload)
+        path = disk_file_cache.cache.get("disk")["path"]
+        os.utime(path, (0, 0))
+        call_command("purge_file_cache")
+    assert not os.path.exists(path)  # nosec
+
+
+def test_disk_cache_should_close_opened_files(disk_file_cache, temporary_upload):
+    disk_file_cache.set("disk", temporary_upload)
+    upload = disk_file_cache.get("disk")
+    assert not upload.closed  # nosec
+    disk_file_cache.close()
+    assert upload.closed  # nosec
+    assert disk_file_cache.opened_files == []  # nosec
+
+
+@pytest.fixture
+def storage_file_cache(tmp_path):
+    file_cache = StorageFileCache()
+    file_cache.storage = FileSystemStorage(location=str(tmp_path / "pending"))
+    return file_cache
+
+
+def test_storage_cache_should_save_upload_to_storage(storage_file_cache):
+    storage_file_cache.set("stored", file)
+    state = storage_file_cache.cache.get("stored")
+    assert "content" not in state  # nosec
+    assert state["storage_name"].startswith(StorageFileCache.prefix)  # nosec
+    assert storage_file_cache.storage.size(state["storage_name"]) == file.size  # nosec
+
+    upload = storage_file_cache.get("stored")
+    file.seek(0)
+    assert upload.read() == file.read()  # nosec
+    assert upload.name == "test_file.jpg"  # nosec
+    upload.close()
+
+
+def test_storage_cache_should_promote_by_moving_local_files(storage_file_cache, tmp_path):
+    storage_file_cache.set("stored", file)
+    upload = storage_file_cache.get("stored")
+    item = Item(name="item", price=1)
+    media_storage = FileSystemStorage(location=str(tmp_path / "media"))
+    with mock.patch.object(Item._meta.get_field("file"), "storage", media_storage):
+        storage_file_cache.promote("stored", item, "file", upload)
+        assert item.file.name == "tmp/files/test_file.jpg"  # nosec
+        assert item.file._committed  # nosec
+        file.seek(0)
+        assert media_storage.open(item.file.name).read() == file.read()  # nosec
+    assert not storage_file_cache.storage.exists(upload.storage_name)  # nosec
+
+
+def _s3_storage(**kwargs):
+    attributes = {"bucket_name": "media-bucket", "location": "media", "default_acl": None, "gzip": False}
+    s3_storage = mock.Mock(**{**attributes, **kwargs})
+    s3_storage.path.side_effect = NotImplementedError
+    s3_storage.generate_filename.side_effect = lambda name: name
+    s3_storage.get_available_name.side_effect = lambda name, max_length: name
+    s3_storage.get_object_parameters.return_value = {"ServerSideEncryption": "aws:kms", "CacheControl": "max-age=60"}
+    return s3_storage
+
+
+def test_storage_cache_should_promote_with_server_side_copy(storage_file_cache):
+    storage_file_cache.set("stored", file)
+    upload = storage_file_cache.get("stored")
+    storage_file_cache.storage.bucket_name = "pending-bucket"
+    storage_file_cache.storage.location = "pending"
+    s3_storage = _s3_storage(default_acl="private")
+    item = Item(name="item", price=1)
+    with mock.patch.object(Item._meta.get_field("file"), "storage", s3_storage):
+        storage_file_cache.promote("stored", item, "file", upload)
+    # The object is written with the parameters the storage would save it with
+    s3_storage.get_object_parameters.assert_called_once_with("tmp/files/test_file.jpg")
+    s3_storage.bucket.copy.assert_called_once_with(
+        CopySource={"Bucket": "pending-bucket", "Key": f"pending/{upload.storage_name}"},
+        Key="media/tmp/files/test_file.jpg",
+        ExtraArgs={
+            "ServerSideEncryption": "aws:kms",
+            "CacheControl": "max-age=60",
+            "ContentType": "image/jpeg",
+            "ACL": "private",
+            "MetadataDirective": "REPLACE",
+        },
+    )
+    # The bytes are not uploaded again
+    s3_storage.save.assert_not_called()
+    assert item.file.name == "tmp/files/test_file.jpg"  # nosec
+
+
+def test_storage_cache_should_save_files_the_storage_compresses(storage_file_cache):
+    storage_file_cache.set("stored", file)
+    upload = storage_file_cache.get("stored")
+    storage_file_cache.storage.bucket_name = "pending-bucket"
+    s3_storage = _s3_storage(gzip=True, gzip_content_types=("image/jpeg",))
+    s3_storage.save.side_effect = lambda name, content: name
+    item = Item(name="item", price=1)
+    with mock.patch.object(Item._meta.get_field("file"), "storage", s3_storage):
+        storage_file_cache.promote("stored", item, "file", upload)
+    # A server side copy would not be compressed
+    s3_storage.bucket.copy.assert_not_called()
+    s3_storage.save.assert_called_once()
+    assert item.file.name == "tmp/files/test_file.jpg"  # nosec
+
+
+def test_storage_cache_should_delete_pending_file(storage_file_cache):
+    storage_file_cache.set("stored", file)
+    storage_name = storage_file_cache.cache.get("stored")["storage_name"]
+    storage_file_cache.delete("stored")
+    assert not storage_file_cache.storage.exists(storage_name)  # nosec
+    assert storage_file_cache.get("stored") is None  # nosec
@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from admin_action_tools.constants import CONFIRM_ACTION, SELECTION_TOKEN
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ShopFactory
+from tests.market.models import Shop
+
+
+@mock.patch("admin_action_tools.admin.base.PREVIEW_LIMIT", 5)
+class TestLazyQueryset(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(30)]
+
+    def _assertQuerysetNotMaterialized(self, queries):
+        shop_queries = [query["sql"] for query in queries if f'FROM "{Shop._meta.db_table}"' in query["sql"]]
+        self.assertTrue(shop_queries)
+        for sql in shop_queries:
+            self.assertTrue("LIMIT" in sql or "COUNT(" in sql, sql)
+
+    def test_select_across_confirmation_page(self):
+        post_params = {
+            "action": ["show_message_lazy"],
+            "select_across": ["1"],
+            "index": ["0"],
+            "_selected_action": [str(shop.pk) for shop in self.shops[:3]],
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse("admin:market_shop_changelist"), data=post_params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.template_name,
+            [
+                "admin/market/shop/confirm_tool/action_confirmation.html",
+                "admin/market/confirm_tool/action_confirmation.html",
+                "admin/confirm_tool/action_confirmation.html",
+            ],
+        )
+        self._assertQuerysetNotMaterialized(context.captured_queries)
+        # Only a preview is listed
+        self.assertEqual(len(response.context_data["queryset"]), 5)
+        self.assertEqual(response.context_data["preview_remaining"], 25)
+        self.assertIn('<span class="queryset-preview-remaining">25</span>', response.rendered_content)
+        # The selection is carried by a token, not by the pks
+        self.assertNotIn('name="_selected_action"', response.rendered_content)
+        self.assertIn(f'name="{SELECTION_TOKEN}"', response.rendered_content)
+
+    def test_select_across_keeps_changelist_filters(self):
+        post_params = {
+            "action": ["show_message_lazy"],
+            "select_across": ["1"],
+            "index": ["0"],
+            "_selected_action": [str(self.shops[1].pk)],
+        }
+        response = self.client.post(f"{reverse('admin:market_shop_changelist')}?q=1", data=post_params)
+        self.assertEqual(response.status_code, 200)
+        # Shop 1, Shop 10 to Shop 19 and Shop 21
+        self.assertEqual(response.context_data["queryset_count"], 12)
+
+        # The search is replayed from the token
+        post_params = {
+            CONFIRM_ACTION: ["Yes, I'm sure"],
+            "action": ["show_message_lazy"],
+            SELECTION_TOKEN: response.context_data["selection_token"],
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse("admin:market_shop_changelist"), data=post_params)
+        self._assertQuerysetNotMaterialized(context.captured_queries)
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(response.url)
+        self.assertIn("You selected with confirmation: 12 shops", response.rendered_content)
+
+    def test_selected_pks_confirmation_page(self):
+        selected = [str(shop.pk) for shop in self.shops[:7]]
+        post_params = {
+            "action": ["show_message_lazy"],
+            "select_across": ["0"],
+            "index": ["0"],
+            "_selected_action": selected,
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse("admin:market_shop_changelist"), data=post_params)
+
+        self.assertEqual(response.status_code, 200)
+        self._assertQuerysetNotMaterialized(context.captured_queries)
+        self.assertEqual(response.context_data["preview_remaining"], 2)
+        # The selection is carried by a token
+        self.assertNotIn('name="_selected_action"', response.rendered_content)
+        self.assertNotIn('name="select_across"', response.rendered_content)
+
+        post_params = {
+            CONFIRM_ACTION: ["Yes, I'm sure"],
+            "action": ["show_message_lazy"],
+            SELECTION_TOKEN: response.context_data["selection_token"],
+        }
+        response = self.client.post(reverse("admin:market_shop_changelist"), data=post_params, follow=True)
+        self.assertIn("You selected with confirmation: 7 shops", response.rendered_content)
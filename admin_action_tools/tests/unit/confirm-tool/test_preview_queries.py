@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import InventoryFactory
+from tests.market.admin.inventory_admin import InventoryAdmin
+from tests.market.models import Item, Shop
+
+
+# The changelist would otherwise join the relations shown in its columns
+@mock.patch.object(InventoryAdmin, "list_display", ("quantity",))
+class TestPreviewQueries(AdminConfirmTestCase):
+    def _post_action(self, action, count):
+        inventories = [InventoryFactory() for _ in range(count)]
+        post_params = {
+            "action": [action],
+            "index": ["0"],
+            "_selected_action": [str(inventory.pk) for inventory in inventories],
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse("admin:market_inventory_changelist"), data=post_params)
+        self.assertEqual(response.status_code, 200)
+        for inventory in inventories:
+            self.assertIn(f"{inventory.item} at {inventory.shop}", response.rendered_content)
+        return [query["sql"] for query in context.captured_queries]
+
+    def _assertRelationsJoined(self, queries):
+        for model in (Shop, Item):
+            self.assertFalse([sql for sql in queries if f'FROM "{model._meta.db_table}"' in sql])
+
+    def test_confirmation_preview_is_one_query(self):
+        few_queries = self._post_action("quantity_down", 2)
+        many_queries = self._post_action("quantity_down", 20)
+        self.assertEqual(len(few_queries), len(many_queries))
+        self._assertRelationsJoined(many_queries)
+
+    def test_form_preview_is_one_query(self):
+        few_queries = self._post_action("add_notes_with_confirmation_no_form", 2)
+        many_queries = self._post_action("add_notes_with_confirmation_no_form", 20)
+        self.assertEqual(len(few_queries), len(many_queries))
+        self._assertRelationsJoined(many_queries)
+
+    @mock.patch.object(InventoryAdmin, "confirmation_preview_select_related", None)
+    def test_preview_without_select_related(self):
+        queries = self._post_action("quantity_down", 5)
+        shop_queries = [sql for sql in queries if f'FROM "{Shop._meta.db_table}"' in sql]
+        self.assertEqual(len(shop_queries), 5)
+
+    @mock.patch.object(InventoryAdmin, "confirmation_preview_only", ["shop__name", "item__name"])
+    def test_preview_only_loads_listed_fields(self):
+        queries = self._post_action("quantity_down", 3)
+        self._assertRelationsJoined(queries)
+        preview_sql = [sql for sql in queries if "JOIN" in sql]
+        self.assertTrue(preview_sql)
+        self.assertNotIn('"notes"', preview_sql[-1])
+
+    def test_preview_queryset_hook(self):
+        with mock.patch.object(
+            InventoryAdmin,
+            "get_confirmation_preview_queryset",
+            autospec=True,
+            side_effect=lambda admin, request, queryset: queryset.select_related("shop", "item"),
+        ) as hook:
+            queries = self._post_action("quantity_down", 3)
+        hook.assert_called_once()
+        self._assertRelationsJoined(queries)
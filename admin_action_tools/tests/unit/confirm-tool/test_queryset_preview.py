@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from admin_action_tools.constants import SELECTION_TOKEN
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ShopFactory
+from tests.market.models import Shop
+
+
+@mock.patch("admin_action_tools.admin.base.PREVIEW_LIMIT", 5)
+class TestQuerysetPreview(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(20)]
+
+    def _get_preview_url(self, post_params, query=""):
+        response = self.client.post(f"{reverse('admin:market_shop_changelist')}{query}", data=post_params)
+        self.assertEqual(response.status_code, 200)
+        return response.context_data["preview_url"], response.context_data["preview_after"]
+
+    def _get_all_pages(self, url, after):
+        names = []
+        while after is not None:
+            response = self.client.get(f"{url}&after={after}")
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            names += [obj["display"] for obj in page["results"]]
+            after = page["after"]
+        return names
+
+    def test_preview_pages_of_selected_pks(self):
+        post_params = {
+            "action": ["show_message_lazy"],
+            "index": ["0"],
+            "_selected_action": [str(shop.pk) for shop in self.shops[:11]],
+        }
+        url, after = self._get_preview_url(post_params)
+        self.assertTrue(url.startswith(f"{reverse('admin:market_shop_action_preview')}?{SELECTION_TOKEN}="))
+
+        response = self.client.get(f"{url}&after={after}")
+        page = response.json()
+        self.assertEqual([obj["display"] for obj in page["results"]], [f"Shop {i}" for i in range(5, 10)])
+        self.assertEqual(page["after"], str(self.shops[9].pk))
+
+        response = self.client.get(f"{url}&after={page['after']}")
+        page = response.json()
+        self.assertEqual([obj["display"] for obj in page["results"]], ["Shop 10"])
+        self.assertIsNone(page["after"])
+
+    def test_preview_pages_are_keyset_paginated(self):
+        post_params = {
+            "action": ["show_message_lazy"],
+            "select_across": ["1"],
+            "index": ["0"],
+            "_selected_action": [str(self.shops[0].pk)],
+        }
+        url, after = self._get_preview_url(post_params)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(f"{url}&after={after}")
+        page_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if f'FROM "{Shop._meta.db_table}"' in query["sql"] and "COUNT(" not in query["sql"]
+        ]
+        self.assertEqual(len(page_queries), 1)
+        self.assertIn('"id" >', page_queries[0])
+        self.assertIn("LIMIT 6", page_queries[0])
+        self.assertNotIn("OFFSET", page_queries[0])
+
+    def test_preview_replays_changelist_search(self):
+        post_params = {
+            "action": ["show_message_lazy"],
+            "select_across": ["1"],
+            "index": ["0"],
+            "_selected_action": [str(self.shops[1].pk)],
+        }
+        url, after = self._get_preview_url(post_params, query="?q=1")
+        names = self._get_all_pages(url, after)
+        # Shop 1 and Shop 10 to 13 are in the first preview
+        self.assertEqual(names, [f"Shop {i}" for i in range(14, 20)])
+
+    def test_preview_rejects_altered_token(self):
+        response = self.client.get(reverse("admin:market_shop_action_preview"), {SELECTION_TOKEN: "altered"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_preview_rejects_token_of_other_changelist(self):
+        post_params = {
+            "action": ["show_message_lazy"],
+            "index": ["0"],
+            "_selected_action": [str(shop.pk) for shop in self.shops],
+        }
+        url, _ = self._get_preview_url(post_params)
+        query = url.split("?", 1)[1]
+        response = self.client.get(f"{reverse('admin:market_inventory_action_preview')}?{query}")
+        self.assertEqual(response.status_code, 400)
+
+    def test_preview_requires_staff(self):
+        self.client.logout()
+        response = self.client.get(reverse("admin:market_shop_action_preview"))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,121 @@
+import re
+from unittest import mock
+
+from django import forms
+
+from admin_action_tools.constants import (
+    CONFIRMATION_ID,
+    CONFIRMATION_RECEIVED,
+    CONFIRMATION_VERSION,
+)
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ShopFactory
+from tests.market.admin import ShoppingMallAdmin
+from tests.market.models import ShoppingMall
+
+
+class CountingForm(forms.ModelForm):
+    cleaned = 0
+
+    class Meta:
+        model = ShoppingMall
+        fields = "__all__"
+
+    def clean_name(self):
+        CountingForm.cleaned += 1
+        return self.cleaned_data["name"].strip()
+
+
+@mock.patch.multiple(
+    ShoppingMallAdmin,
+    form=CountingForm,
+    reuse_confirmation_validation=True,
+    confirm_change=True,
+    confirmation_fields=["name"],
+)
+class TestValidationReuse(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        CountingForm.cleaned = 0
+        self.mall = ShoppingMall.objects.create(name="name")
+        self.shops = [ShopFactory() for _ in range(2)]
+        self.url = f"/admin/market/shoppingmall/{self.mall.id}/change/"
+        # Exactly what the change form submits
+        content = self.client.get(self.url).rendered_content
+        prefix = re.search(r'name="([^"]+)-TOTAL_FORMS"', content).group(1)
+        self.data = {
+            **self._get_post_form_data(content),
+            "name": " new name ",
+            f"{prefix}-0-shop": str(self.shops[0].pk),
+            f"{prefix}-1-shop": str(self.shops[1].pk),
+        }
+
+    def _confirmation_page(self):
+        response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CountingForm.cleaned, 1)
+        return response
+
+    def test_confirmed_submission_is_not_validated_again(self):
+        response = self._confirmation_page()
+        confirmation_id = response.context_data["confirmation_id"]
+        # Exactly what the confirmation form submits: its own submit button and version
+        data = self._get_post_form_data(response.rendered_content)
+        self.assertEqual(data["_save"], ["Yes, I’m sure"])
+        self.assertEqual(data[CONFIRMATION_ID], [confirmation_id])
+        self.assertIn(CONFIRMATION_VERSION, data)
+
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CountingForm.cleaned, 1)
+
+        self.mall.refresh_from_db()
+        self.assertEqual(self.mall.name, "new name")
+        self.assertEqual(set(self.mall.shops.all()), set(self.shops))
+        self.assertIsNone(
+            self._get_confirmation_cache(model=ShoppingMall, confirmation_id=confirmation_id).get_validated()
+        )
+
+    def test_changes_of_model_clean_are_saved(self):
+        cleaned = []
+
+        def clean(mall):
+            cleaned.append(mall.name)
+            mall.name = mall.name.title()
+
+        with mock.patch.object(ShoppingMall, "clean", clean):
+            data = self._get_post_form_data(self._confirmation_page().rendered_content)
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        # The model is not validated again, the name it derived is saved
+        self.assertEqual(cleaned, ["new name"])
+        self.mall.refresh_from_db()
+        self.assertEqual(self.mall.name, "New Name")
+
+    def test_changed_submission_is_validated_again(self):
+        data = self._get_post_form_data(self._confirmation_page().rendered_content)
+        response = self.client.post(self.url, {**data, "name": "other name"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CountingForm.cleaned, 2)
+        self.mall.refresh_from_db()
+        self.assertEqual(self.mall.name, "other name")
+
+    def test_stashed_submission(self):
+        with mock.patch.object(ShoppingMallAdmin, "stash_confirmation_post", True):
+            data = self._get_post_form_data(self._confirmation_page().rendered_content)
+            self.assertIn(CONFIRMATION_RECEIVED, data)
+            self.assertNotIn("name", data)
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CountingForm.cleaned, 1)
+        self.mall.refresh_from_db()
+        self.assertEqual(self.mall.name, "new name")
+        self.assertEqual(self.mall.shops.count(), 2)
+
+    def test_reuse_is_opt_in(self):
+        with mock.patch.object(ShoppingMallAdmin, "reuse_confirmation_validation", False):
+            response = self.client.post(self.url, self.data)
+            self.client.post(self.url, self._get_post_form_data(response.rendered_content))
+        self.assertEqual(CountingForm.cleaned, 2)
+        self.mall.refresh_from_db()
+        self.assertEqual(self.mall.name, "new name")
@@ -1,10 +1,15 @@
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.http import QueryDict
+from django.test import Client
 from django.urls import reverse
 
-from admin_action_tools.constants import CONFIRM_FORM
-from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from admin_action_tools.constants import CONFIRM_ACTION, CONFIRM_FORM, TOOLCHAIN_TOKEN
+from admin_action_tools.form_cache import FormCache, get_form_cache
+from admin_action_tools.tests.helpers import AdminConfirmTestCase, RequestSessionFactory
 from tests.factories import InventoryFactory, ShopFactory
-from tests.market.form import NoteActionForm
+from tests.market.form import NoteActionForm, NoteClearForm
 
 CONFIRM_FORM_UNIQUE = f"{CONFIRM_FORM}_{NoteActionForm.__name__}"
 
@@ -77,3 +82,67 @@ class TestFormAction(AdminConfirmTestCase):
 
         self.assertIn("Configure the", response.rendered_content)
         self.assertIn("This field is required.", response.rendered_content)
+
+    @mock.patch(
+        "admin_action_tools.toolchain.TOOLCHAIN_STORAGE", "admin_action_tools.toolchain.SignedTokenToolChainStorage"
+    )
+    def test_form_action_chain_with_signed_token(self):
+        url = reverse(
+            "admin:market_inventory_actions", kwargs={"pk": self.inv.pk, "tool": "add_notes_with_confirmation"}
+        )
+        post_params = {CONFIRM_FORM_UNIQUE: ["Continue"], "date_0": "2022-10-11", "date_1": "14:33:21", "note": "Note"}
+        response = self.client.post(url, data=post_params)
+        self.assertEqual(response.status_code, 200)
+        token = response.context_data["toolchain_token"]
+        self.assertIn(f'name="{TOOLCHAIN_TOKEN}" value="{token}"', response.rendered_content)
+        self.assertFalse(any(key.startswith("toolchain") for key in self.client.session.keys()))
+
+        response = self.client.post(url, data={CONFIRM_ACTION: ["Confirm"], TOOLCHAIN_TOKEN: token}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.notes, "This is the default\n\n2022-10-11 14:33:21+00:00\nNote")
+        self.assertFalse(any(key.startswith("toolchain") for key in self.client.session.keys()))
+
+    def test_form_chain_validates_each_step_once(self):
+        url = reverse("admin:market_inventory_actions", kwargs={"pk": self.inv.pk, "tool": "add_notes_with_clear"})
+        note_params = {CONFIRM_FORM_UNIQUE: ["Continue"], "date_0": "2022-10-11", "date_1": "14:33:21", "note": "Note"}
+        clear_params = {f"{CONFIRM_FORM}_{NoteClearForm.__name__}": ["Continue"], "clear_notes": "on"}
+
+        with mock.patch.object(
+            NoteActionForm, "full_clean", autospec=True, side_effect=NoteActionForm.full_clean
+        ) as note_full_clean, mock.patch.object(
+            NoteClearForm, "full_clean", autospec=True, side_effect=NoteClearForm.full_clean
+        ) as clear_full_clean:
+            response = self.client.post(url, data=note_params)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.post(url, data=clear_params)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Confirm Action", response.rendered_content)
+            response = self.client.post(url, data={CONFIRM_ACTION: ["Confirm"]}, follow=True)
+            self.assertEqual(response.status_code, 200)
+
+        # Unbound forms rendered by the form pages are not validations
+        self.assertEqual(len([call for call in note_full_clean.call_args_list if call.args[0].is_bound]), 1)
+        self.assertEqual(len([call for call in clear_full_clean.call_args_list if call.args[0].is_bound]), 1)
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.notes, "\n\n2022-10-11 14:33:21+00:00\nNote")
+
+    def test_validated_forms_are_not_shared_between_sessions(self):
+        data = QueryDict("date_0=2022-10-11&date_1=14:33:21&note=Note")
+        metadata = {"module": NoteActionForm.__module__, "name": NoteActionForm.__name__}
+        request = self.factory.post("/")
+        get_form_cache(request).add(get_form_cache(request).get_key(data, metadata), NoteActionForm(data))
+
+        other_client = Client()
+        other_client.force_login(self.superuser)
+        other_request = RequestSessionFactory(other_client.session).post("/")
+        loader = mock.Mock(side_effect=lambda data, metadata: NoteActionForm(data))
+        form_cache = get_form_cache(other_request)
+        self.assertNotEqual(form_cache.get_key(data, metadata), get_form_cache(request).get_key(data, metadata))
+
+        # The same data submitted in another session is validated again
+        form_cache.load(data, metadata, loader)
+        loader.assert_called_once()
+        # While the session that validated it reuses it
+        FormCache(get_form_cache(request).namespace).load(data, metadata, loader)
+        loader.assert_called_once()
@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.urls import reverse
+
+from admin_action_tools.admin import add_form_to_action, chunked_action, confirm_action
+from admin_action_tools.constants import CONFIRM_ACTION, CONFIRM_FORM
+from admin_action_tools.jobs import run_job
+from admin_action_tools.models import ActionJob
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import InventoryFactory, ShopFactory
+from tests.market.admin.inventory_admin import InventoryAdmin
+from tests.market.admin.shop_admin import ShopAdmin
+from tests.market.form import NoteActionForm
+from tests.market.models import Inventory, Shop
+
+
+class TestAsyncActions(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(5)]
+
+    def _post_action(self, action, **data):
+        return self.client.post(
+            reverse("admin:market_shop_changelist"),
+            data={
+                "action": [action],
+                "index": ["0"],
+                "_selected_action": [str(shop.pk) for shop in self.shops[:3]],
+                **data,
+            },
+        )
+
+    def test_confirmed_async_action(self):
+        response = self._post_action("rename_async")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Shop.objects.filter(name="Renamed").exists())
+
+        response = self._post_action("rename_async", **{CONFIRM_ACTION: ["Confirm"]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 3)
+        response = self.client.get(response.url)
+        self.assertIn("Renamed 3 shops", response.rendered_content)
+
+    def test_async_action_with_form(self):
+        inventories = [InventoryFactory() for _ in range(2)]
+
+        @add_form_to_action(NoteActionForm)
+        async def add_notes(modeladmin, request, queryset, form=None):
+            await queryset.aupdate(notes=form.cleaned_data["note"])
+
+        with mock.patch.object(InventoryAdmin, "add_notes", add_notes, create=True):
+            with mock.patch.object(InventoryAdmin, "actions", ["add_notes"]):
+                response = self.client.post(
+                    reverse("admin:market_inventory_changelist"),
+                    data={
+                        "action": ["add_notes"],
+                        "index": ["0"],
+                        "_selected_action": [str(inventory.pk) for inventory in inventories],
+                        f"{CONFIRM_FORM}_{NoteActionForm.__name__}": ["Continue"],
+                        "date_0": "2022-10-11",
+                        "date_1": "14:33:21",
+                        "note": "Async note",
+                    },
+                )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Inventory.objects.filter(notes="Async note").count(), 2)
+
+    def test_async_chunked_action(self):
+        chunks = []
+
+        @chunked_action(chunk_size=2)
+        async def rename(modeladmin, request, queryset):
+            chunks.append([shop.pk async for shop in queryset])
+            await queryset.aupdate(name="Renamed")
+
+        request = self.factory.post(reverse("admin:market_shop_changelist"))
+        request.user = self.superuser
+        rename(None, request, Shop.objects.all())
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 5)
+
+    @mock.patch("admin_action_tools.jobs.JOB_EXECUTOR", "admin_action_tools.jobs.DatabaseJobExecutor")
+    def test_async_action_in_background(self):
+        @confirm_action(lazy_queryset=True, background=True)
+        async def rename(modeladmin, request, queryset):
+            updated = await queryset.aupdate(name="Renamed")
+            modeladmin.message_user(request, f"Renamed {updated} shops")
+
+        with mock.patch.object(ShopAdmin, "rename", rename, create=True):
+            with mock.patch.object(ShopAdmin, "actions", ["rename"]):
+                self._post_action("rename", **{CONFIRM_ACTION: ["Confirm"]})
+                job = run_job(ActionJob.objects.get().pk)
+
+        self.assertEqual(job.status, ActionJob.Status.DONE, job.error)
+        self.assertEqual(job.messages, ["Renamed 3 shops"])
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 3)
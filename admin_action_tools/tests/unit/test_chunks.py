@@ -0,0 +1,185 @@
+from unittest import mock
+
+from django.db import transaction
+from django.urls import reverse
+
+from admin_action_tools.admin import chunked_action, confirm_action
+from admin_action_tools.constants import CONFIRM_ACTION
+from admin_action_tools.jobs import cancel_job, resume_job, run_job
+from admin_action_tools.models import ActionJob
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ShopFactory
+from tests.market.admin.shop_admin import ShopAdmin
+from tests.market.models import Shop
+
+
+class TestChunkedAction(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(7)]
+        self.request = self.factory.post(reverse("admin:market_shop_changelist"))
+        self.request.user = self.superuser
+        self.chunks = []
+
+    def _action(self, fail_on=None, **options):
+        @chunked_action(**{"chunk_size": 3, **options})
+        def rename(modeladmin, request, queryset):
+            pks = list(queryset.values_list("pk", flat=True))
+            self.chunks.append(pks)
+            queryset.update(name="Renamed")
+            if fail_on in pks:
+                raise ValueError("Broken")
+
+        return rename
+
+    def test_chunks_are_pk_ordered(self):
+        self._action()(None, self.request, Shop.objects.order_by("-name"))
+        self.assertEqual(self.chunks, [[shop.pk for shop in self.shops[i : i + 3]] for i in (0, 3, 6)])
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 7)
+
+    def test_chunks_keep_queryset_filters(self):
+        self._action()(None, self.request, Shop.objects.exclude(name__in=["Shop 1", "Shop 4"]))
+        self.assertEqual(self.chunks, [[self.shops[i].pk for i in chunk] for chunk in ([0, 2, 3], [5, 6])])
+
+    def test_each_chunk_is_atomic(self):
+        with mock.patch("admin_action_tools.chunks.transaction.atomic", wraps=transaction.atomic) as atomic:
+            self._action()(None, self.request, Shop.objects.using("default"))
+        self.assertEqual(atomic.call_args_list, [mock.call(using="default")] * 3)
+
+    def test_failed_run_resumes_after_last_chunk(self):
+        action = self._action(fail_on=self.shops[4].pk)
+        with self.assertRaises(ValueError):
+            action(None, self.request, Shop.objects.all())
+        # The first chunk is committed, the failed one rolled back
+        self.assertEqual(list(Shop.objects.filter(name="Renamed")), self.shops[:3])
+
+        self.chunks = []
+        self._action()(None, self.request, Shop.objects.all())
+        self.assertEqual(self.chunks, [[shop.pk for shop in self.shops[i : i + 3]] for i in (3, 6)])
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 7)
+
+        # A completed run leaves no checkpoint
+        self.chunks = []
+        self._action()(None, self.request, Shop.objects.all())
+        self.assertEqual(len(self.chunks), 3)
+
+    def test_checkpoint_is_per_selection(self):
+        with self.assertRaises(ValueError):
+            self._action(fail_on=self.shops[4].pk)(None, self.request, Shop.objects.all())
+        self.chunks = []
+        self._action()(None, self.request, Shop.objects.filter(pk__lte=self.shops[5].pk))
+        self.assertEqual(self.chunks[0][0], self.shops[0].pk)
+
+    @mock.patch("admin_action_tools.chunks.time")
+    def test_chunk_size_adapts_to_target_latency(self, time):
+        # First chunk is 4 times faster than the target, the second 4 times slower
+        time.monotonic.side_effect = [0, 0.25, 10, 14, 20, 21]
+        self._action(chunk_size=2, target_latency=1)(None, self.request, Shop.objects.all())
+        # Chunk size is doubled then halved at most
+        self.assertEqual([len(chunk) for chunk in self.chunks], [2, 4, 1])
+        time.sleep.assert_not_called()
+
+    @mock.patch("admin_action_tools.chunks.time")
+    def test_rate_is_capped(self, time):
+        time.monotonic.side_effect = [0, 0.1, 1, 1.1, 2, 2.1]
+        self._action(max_rate=10)(None, self.request, Shop.objects.all())
+        self.assertEqual([len(chunk) for chunk in self.chunks], [3, 3, 1])
+        # 3 rows at 10 rows per second take 0.3 seconds, the last chunk is not followed by a pause
+        self.assertEqual(time.sleep.call_count, 2)
+        self.assertAlmostEqual(time.sleep.call_args[0][0], 0.2)
+
+    def test_object_is_not_chunked(self):
+        action = mock.Mock(__name__="action")
+        chunked_action(chunk_size=3)(action)(None, self.request, self.shops[0])
+        action.assert_called_once_with(None, self.request, self.shops[0])
+
+    def test_confirmed_chunked_action(self):
+        response = self.client.post(
+            reverse("admin:market_shop_changelist"),
+            data={
+                "action": ["rename_in_chunks"],
+                "select_across": ["1"],
+                "index": ["0"],
+                "_selected_action": [str(self.shops[0].pk)],
+                CONFIRM_ACTION: ["Confirm"],
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Shop.objects.filter(name__endswith="(renamed)").count(), 7)
+
+
+@mock.patch("admin_action_tools.jobs.JOB_EXECUTOR", "admin_action_tools.jobs.DatabaseJobExecutor")
+class TestChunkedJob(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(5)]
+
+    def test_job_resumes_after_checkpoint(self):
+        calls = []
+
+        @confirm_action(background=True)
+        @chunked_action(chunk_size=2)
+        def rename_chunks(modeladmin, request, queryset):
+            calls.append(list(queryset.values_list("pk", flat=True)))
+            if len(calls) == 2:
+                raise ValueError("Broken")
+            queryset.update(name="Renamed")
+
+        with mock.patch.object(ShopAdmin, "rename_chunks", rename_chunks, create=True):
+            with mock.patch.object(ShopAdmin, "actions", ["rename_chunks"]):
+                self.client.post(
+                    reverse("admin:market_shop_changelist"),
+                    data={
+                        "action": ["rename_chunks"],
+                        "index": ["0"],
+                        "_selected_action": [str(shop.pk) for shop in self.shops],
+                        CONFIRM_ACTION: ["Confirm"],
+                    },
+                )
+            job = run_job(ActionJob.objects.get().pk)
+            self.assertEqual(job.status, ActionJob.Status.FAILED)
+            self.assertEqual(job.checkpoint, str(self.shops[1].pk))
+
+            self.assertTrue(resume_job(job.pk))
+            job = run_job(job.pk)
+
+        self.assertEqual(job.status, ActionJob.Status.DONE, job.error)
+        self.assertEqual(job.checkpoint, "")
+        self.assertEqual(calls[2], [self.shops[2].pk, self.shops[3].pk])
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 5)
+        self.assertFalse(resume_job(job.pk))
+
+    def test_cancelled_job_stops_after_chunk(self):
+        calls = []
+
+        @confirm_action(background=True)
+        @chunked_action(chunk_size=2)
+        def rename_chunks(modeladmin, request, queryset):
+            calls.append(list(queryset.values_list("pk", flat=True)))
+            queryset.update(name="Renamed")
+            if len(calls) == 2:
+                cancel_job(request._action_job.pk)
+
+        with mock.patch.object(ShopAdmin, "rename_chunks", rename_chunks, create=True):
+            with mock.patch.object(ShopAdmin, "actions", ["rename_chunks"]):
+                self.client.post(
+                    reverse("admin:market_shop_changelist"),
+                    data={
+                        "action": ["rename_chunks"],
+                        "index": ["0"],
+                        "_selected_action": [str(shop.pk) for shop in self.shops],
+                        CONFIRM_ACTION: ["Confirm"],
+                    },
+                )
+            job = run_job(ActionJob.objects.get().pk)
+            # The current chunk is committed, then the run stops
+            self.assertEqual(job.status, ActionJob.Status.CANCELLED)
+            self.assertEqual(job.checkpoint, str(self.shops[3].pk))
+            self.assertEqual(Shop.objects.filter(name="Renamed").count(), 4)
+
+            self.assertTrue(resume_job(job.pk))
+            job = run_job(job.pk)
+
+        self.assertEqual(job.status, ActionJob.Status.DONE, job.error)
+        self.assertEqual(calls[2], [self.shops[4].pk])
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 5)
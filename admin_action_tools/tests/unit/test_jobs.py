@@ -0,0 +1,190 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib import admin, messages
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.urls import reverse
+
+from admin_action_tools.admin import add_form_to_action, confirm_action
+from admin_action_tools.constants import CONFIRM_ACTION, CONFIRM_FORM, SELECTION_TOKEN
+from admin_action_tools.jobs import ThreadPoolJobExecutor, run_job
+from admin_action_tools.models import ActionJob
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import InventoryFactory, ShopFactory
+from tests.market.admin.shop_admin import ShopAdmin
+from tests.market.form import NoteActionForm
+from tests.market.models import Inventory, Shop
+
+
+@mock.patch("admin_action_tools.jobs.JOB_EXECUTOR", "admin_action_tools.jobs.DatabaseJobExecutor")
+class TestActionJobs(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(6)]
+
+    def _confirm_rename(self):
+        url = reverse("admin:market_shop_changelist")
+        response = self.client.post(
+            url,
+            data={
+                "action": ["rename_in_background"],
+                "select_across": ["0"],
+                "index": ["0"],
+                "_selected_action": [str(shop.pk) for shop in self.shops[:4]],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        return self.client.post(
+            url,
+            data={
+                "action": ["rename_in_background"],
+                SELECTION_TOKEN: response.context_data["selection_token"],
+                CONFIRM_ACTION: ["Confirm"],
+            },
+        )
+
+    def test_confirmation_creates_job(self):
+        response = self._confirm_rename()
+        # The user is redirected at once, the action has not run
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Shop.objects.filter(name="Renamed").exists())
+
+        job = ActionJob.objects.get()
+        self.assertEqual(job.status, ActionJob.Status.PENDING)
+        self.assertEqual(job.action, "rename_in_background")
+        self.assertEqual(job.path, reverse("admin:market_shop_changelist"))
+        self.assertEqual(job.user, self.superuser)
+        self.assertFalse(job.object_action)
+
+        response = self.client.get(response.url)
+        self.assertIn(f"Rename In Background is running in the background (job #{job.pk}).", response.rendered_content)
+
+    def test_run_job(self):
+        self._confirm_rename()
+        job = run_job(ActionJob.objects.get().pk)
+
+        self.assertEqual(job.status, ActionJob.Status.DONE, job.error)
+        self.assertEqual(job.messages, ["Renamed 4 shops"])
+        self.assertIsNotNone(job.started_at)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 4)
+        # A job runs once
+        self.assertIsNone(run_job(job.pk))
+
+    def test_failed_job_keeps_error(self):
+        self._confirm_rename()
+        with mock.patch.object(ShopAdmin, "message_user", side_effect=ValueError("Broken")):
+            job = run_job(ActionJob.objects.get().pk)
+        self.assertEqual(job.status, ActionJob.Status.FAILED)
+        self.assertIn("ValueError: Broken", job.error)
+
+    def test_job_replays_select_across(self):
+        url = f"{reverse('admin:market_shop_changelist')}?q=Shop 1"
+        self.client.post(
+            url,
+            data={
+                "action": ["rename_in_background"],
+                "select_across": ["1"],
+                "index": ["0"],
+                "_selected_action": [str(self.shops[1].pk)],
+                CONFIRM_ACTION: ["Confirm"],
+            },
+        )
+        job = run_job(ActionJob.objects.get().pk)
+        self.assertEqual(job.status, ActionJob.Status.DONE, job.error)
+        self.assertEqual(list(Shop.objects.filter(name="Renamed")), [self.shops[1]])
+
+    def test_job_with_form(self):
+        inventories = [InventoryFactory() for _ in range(3)]
+        url = reverse("admin:market_inventory_changelist")
+        response = self.client.post(
+            url,
+            data={
+                "action": ["add_notes_in_background"],
+                "index": ["0"],
+                "_selected_action": [str(inventory.pk) for inventory in inventories[:2]],
+            },
+        )
+        token = response.context_data["selection_token"]
+        self.client.post(
+            url,
+            data={
+                "action": ["add_notes_in_background"],
+                SELECTION_TOKEN: token,
+                f"{CONFIRM_FORM}_{NoteActionForm.__name__}": ["Continue"],
+                "date_0": "2022-10-11",
+                "date_1": "14:33:21",
+                "note": "Background note",
+            },
+        )
+        response = self.client.post(
+            url, data={"action": ["add_notes_in_background"], SELECTION_TOKEN: token, CONFIRM_ACTION: ["Confirm"]}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Inventory.objects.filter(notes__contains="Background note").exists())
+
+        out = StringIO()
+        call_command("run_action_jobs", "--once", stdout=out)
+        job = ActionJob.objects.get()
+        self.assertEqual(job.status, ActionJob.Status.DONE, job.error)
+        self.assertIn(str(job), out.getvalue())
+        self.assertEqual(job.messages, ["Added notes to 2 inventories"])
+        self.assertEqual(Inventory.objects.filter(notes__contains="Background note").count(), 2)
+
+    def test_thread_pool_executor_runs_after_commit(self):
+        with mock.patch("admin_action_tools.jobs.JOB_EXECUTOR", "admin_action_tools.jobs.ThreadPoolJobExecutor"):
+            with mock.patch.object(ThreadPoolJobExecutor, "get_pool") as get_pool:
+                with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                    self._confirm_rename()
+                get_pool.assert_not_called()
+                for callback in callbacks:
+                    callback()
+        get_pool.return_value.submit.assert_called_once_with(ThreadPoolJobExecutor.run, ActionJob.objects.get().pk)
+
+    def test_job_of_action_declared_as_function(self):
+        self.client.post(
+            reverse("admin:market_shop_changelist"),
+            data={
+                "action": ["reset_names_in_background"],
+                "index": ["0"],
+                "_selected_action": [str(self.shops[0].pk)],
+                CONFIRM_ACTION: ["Confirm"],
+            },
+        )
+        job = run_job(ActionJob.objects.get().pk)
+        self.assertEqual(job.status, ActionJob.Status.DONE, job.error)
+        self.assertEqual(job.messages, ["Reset 1 shops"])
+
+    def test_job_of_removed_action_fails_with_lookup_error(self):
+        self._confirm_rename()
+        ActionJob.objects.update(action="renamed_since")
+        job = run_job(ActionJob.objects.get().pk)
+        self.assertEqual(job.status, ActionJob.Status.FAILED)
+        self.assertIn("LookupError: renamed_since is not an action", job.error)
+
+    def test_action_not_found_is_reported(self):
+        with mock.patch("admin_action_tools.jobs.get_action_function", side_effect=LookupError("Not found")):
+            response = self._confirm_rename()
+        self.assertFalse(ActionJob.objects.exists())
+        response = self.client.get(response.url)
+        self.assertIn("Rename In Background can not be run in the background.", response.rendered_content)
+
+    def test_no_selection_is_reported(self):
+        modeladmin = admin.site._registry[Shop]
+        request = self.factory.post("/")
+        with mock.patch.object(ShopAdmin, "message_user") as message_user:
+            self.assertIsNone(
+                modeladmin.run_in_background(ShopAdmin.rename_in_background, request, Shop.objects.all())
+            )
+        message_user.assert_called_once_with(
+            request, "No objects are selected, the action was not run.", messages.ERROR
+        )
+        self.assertFalse(ActionJob.objects.exists())
+
+    def test_background_must_be_last_tool(self):
+        def action(modeladmin, request, queryset, form=None):
+            pass
+
+        with self.assertRaises(ImproperlyConfigured):
+            confirm_action(background=True)(add_form_to_action(NoteActionForm)(action))
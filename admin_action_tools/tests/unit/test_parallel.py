@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import tempfile
+from unittest import mock, skipUnless
+
+from django.contrib import admin
+from django.db import connection
+from django.http import QueryDict
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from admin_action_tools.admin import confirm_action, parallel_action
+from admin_action_tools.constants import CONFIRM_ACTION
+from admin_action_tools.jobs import make_request
+from admin_action_tools.parallel import (
+    ParallelRun,
+    Shard,
+    dump_form_kwargs,
+    load_form_kwargs,
+)
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ShopFactory
+from tests.market.admin.shop_admin import ShopAdmin
+from tests.market.form import NoteActionForm
+from tests.market.models import Shop
+
+
+class InProcessPool:
+    "Runs the shards in the test process and transaction, once they went through pickle like for a worker."
+
+    def __init__(self):
+        self.shards = []
+
+    def map(self, func, shards):
+        self.shards = [pickle.loads(pickle.dumps(shard)) for shard in shards]
+        return [func(shard) for shard in self.shards]
+
+
+@mock.patch("admin_action_tools.parallel.close_old_connections")
+class TestParallelAction(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(7)]
+        self.pool = InProcessPool()
+        patcher = mock.patch.object(ParallelRun, "get_pool", return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _confirm(self, action):
+        response = self.client.post(
+            reverse("admin:market_shop_changelist"),
+            data={
+                "action": [action],
+                "select_across": ["1"],
+                "index": ["0"],
+                "_selected_action": [str(self.shops[0].pk)],
+                CONFIRM_ACTION: ["Confirm"],
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        return self.client.get(response.url).rendered_content
+
+    def test_shards_are_pk_ranges(self, _):
+        content = self._confirm("rename_in_parallel")
+        self.assertEqual(
+            [list(shard.get_queryset().values_list("pk", flat=True)) for shard in self.pool.shards],
+            [[shop.pk for shop in self.shops[i : i + 3]] for i in (0, 3, 6)],
+        )
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 7)
+        # Shard messages are merged into one report
+        self.assertIn("Renamed 3 shops", content)
+        self.assertIn("Renamed 1 shops", content)
+        self.assertIn("Rename In Parallel ran in 3 parallel shards.", content)
+
+    def test_shards_are_sent_without_their_rows(self, _):
+        request = self.factory.post(reverse("admin:market_shop_changelist"))
+        request.user = self.superuser
+        run = ParallelRun(ShopAdmin(Shop, admin.site), request, "rename_in_parallel", Shop.objects.all(), 3)
+        bounds = run.get_bounds()[1]
+        shard = Shard(run.modeladmin, request, run.action, run.get_shard_queryset(*bounds), bounds, {})
+        with self.assertNumQueries(0):
+            shard = pickle.loads(pickle.dumps(shard))
+        self.assertEqual(
+            list(shard.get_queryset().values_list("pk", flat=True)), [shop.pk for shop in self.shops[3:6]]
+        )
+
+    def test_failed_shards_are_reported(self, _):
+        failing = self.shops[4].pk
+
+        @confirm_action()
+        @parallel_action(shards=3)
+        def rename_parallel(modeladmin, request, queryset):
+            queryset.update(name="Renamed")
+            if queryset.filter(pk=failing).exists():
+                raise ValueError("Broken")
+
+        with mock.patch.object(ShopAdmin, "rename_parallel", rename_parallel, create=True):
+            with mock.patch.object(ShopAdmin, "actions", ["rename_parallel"]):
+                content = self._confirm("rename_parallel")
+
+        self.assertIn("Rename Parallel failed in 1 of 3 parallel shards", content)
+        self.assertIn(f"pks {self.shops[3].pk} to {self.shops[6].pk}: ValueError: Broken", content)
+        # The other shards ran
+        self.assertEqual(Shop.objects.filter(name="Renamed").count(), 7)
+
+    def test_less_objects_than_shards(self, _):
+        request = self.factory.post(reverse("admin:market_shop_changelist"))
+        request.user = self.superuser
+        run = ParallelRun(
+            ShopAdmin(Shop, mock.Mock(name="admin")), request, "rename_in_parallel", Shop.objects.all(), 10
+        )
+        self.assertEqual(len(run.get_bounds()), 7)
+        run = ParallelRun(ShopAdmin(Shop, mock.Mock()), request, "rename_in_parallel", Shop.objects.none(), 3)
+        self.assertEqual(run.get_bounds(), [])
+
+    def test_forms_are_loaded_again(self, _):
+        form = NoteActionForm(QueryDict("date_0=2022-10-11&date_1=14:33:21&note=Parallel"))
+        kwargs = load_form_kwargs(pickle.loads(pickle.dumps(dump_form_kwargs({"form": form}))))
+        self.assertIsInstance(kwargs["form"], NoteActionForm)
+        self.assertEqual(kwargs["form"].cleaned_data["note"], "Parallel")
+
+
+@skipUnless(connection.vendor == "sqlite", "The test database is copied to a file for the workers")
+class TestParallelWorkers(TransactionTestCase):
+    "Shards run by a real pool of spawned workers."
+
+    def setUp(self):
+        self.shops = [ShopFactory(name=f"Shop {i}") for i in range(5)]
+        # Workers can not open the in-memory test database, they get a copy of it
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(directory.cleanup)
+        self.database = os.path.join(directory.name, "db.sqlite3")
+        connection.ensure_connection()
+        with sqlite3.connect(self.database) as copy:
+            connection.connection.backup(copy)
+        copy.close()
+
+        patchers = [
+            mock.patch.object(ParallelRun, "get_database_names", return_value={"default": self.database}),
+            mock.patch("admin_action_tools.parallel.PARALLEL_WORKERS", 2),
+            mock.patch.object(ParallelRun, "pool", None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_spawned_workers_run_the_shards(self):
+        pool = ParallelRun.get_pool()
+        self.addCleanup(pool.shutdown)
+        self.assertIsInstance(pool._mp_context, type(multiprocessing.get_context("spawn")))
+
+        request = make_request(None, reverse("admin:market_shop_changelist"))
+        # The async action is found again and run synchronously by the workers
+        run = ParallelRun(admin.site._registry[Shop], request, "rename_async_in_parallel", Shop.objects.all(), 2)
+        run.run()
+
+        self.assertEqual(
+            [str(message) for message in request._messages],
+            ["Renamed 3 shops", "Renamed 2 shops", "Rename Async In Parallel ran in 2 parallel shards."],
+        )
+        with sqlite3.connect(self.database) as copy:
+            renamed = copy.execute("SELECT COUNT(*) FROM market_shop WHERE name = 'Renamed'").fetchone()[0]
+        copy.close()
+        self.assertEqual(renamed, 5)
@@ -0,0 +1,150 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from admin_action_tools.chunks import chunked_action
+from admin_action_tools.constants import CONFIRM_ACTION
+from admin_action_tools.jobs import run_job
+from admin_action_tools.models import ActionJob
+from admin_action_tools.progress import Progress, get_progress
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import ShopFactory
+from tests.market.models import Shop
+
+
+class TestProgress(AdminConfirmTestCase):
+    def test_progress_is_cached(self):
+        progress = Progress.for_job(1)
+        progress.start(10)
+        progress.advance(4, errors=1)
+        self.assertEqual(Progress.for_job(1).as_dict()["processed"], 4)
+        self.assertEqual(Progress.for_job(1).as_dict()["errors"], 1)
+        self.assertEqual(Progress.for_job(1).as_dict()["percent"], 40)
+        self.assertEqual(Progress.for_job(2).as_dict()["processed"], 0)
+
+    @mock.patch("admin_action_tools.progress.time.time")
+    def test_eta(self, now):
+        now.return_value = 100
+        progress = Progress.for_job(1)
+        # Resumed run, 20 objects were processed by a previous run
+        progress.start(100, processed=20)
+        self.assertIsNone(progress.eta)
+        now.return_value = 110
+        progress.advance(20)
+        # 2 objects per second, 60 left
+        self.assertEqual(progress.as_dict()["eta"], 30)
+        progress.finish()
+        self.assertEqual(progress.as_dict()["processed"], 100)
+        self.assertEqual(progress.as_dict()["eta"], 0)
+
+    def test_untracked_progress_is_not_stored(self):
+        request = self.factory.get("/")
+        progress = get_progress(request)
+        self.assertIs(get_progress(request), progress)
+        self.assertFalse(progress.tracked)
+        progress.start(10)
+        progress.advance(5)
+        self.assertEqual(progress.as_dict()["processed"], 5)
+
+    def test_chunked_action_reports_progress(self):
+        shops = [ShopFactory() for _ in range(5)]
+        request = self.factory.get("/")
+        request._action_progress = progress = Progress.for_job(1)
+        reports = []
+
+        @chunked_action(chunk_size=2)
+        def action(modeladmin, request, queryset):
+            reports.append(Progress.for_job(1).as_dict()["processed"])
+
+        action(None, request, Shop.objects.all())
+        self.assertEqual(reports, [0, 2, 4])
+        self.assertEqual(progress.as_dict()["total"], len(shops))
+        self.assertEqual(Progress.for_job(1).as_dict()["processed"], len(shops))
+
+
+@mock.patch("admin_action_tools.jobs.JOB_EXECUTOR", "admin_action_tools.jobs.DatabaseJobExecutor")
+class TestJobProgressViews(AdminConfirmTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shops = [ShopFactory() for _ in range(3)]
+        self.response = self.client.post(
+            reverse("admin:market_shop_changelist"),
+            data={
+                "action": ["rename_in_background"],
+                "index": ["0"],
+                "_selected_action": [str(shop.pk) for shop in self.shops],
+                CONFIRM_ACTION: ["Confirm"],
+            },
+        )
+        self.job = ActionJob.objects.get()
+        self.progress_url = reverse("admin:market_shop_action_job_progress", args=(self.job.pk,))
+
+    def test_confirmation_redirects_to_progress_page(self):
+        self.assertRedirects(self.response, reverse("admin:market_shop_action_job", args=(self.job.pk,)))
+        response = self.client.get(self.response.url)
+        self.assertEqual(response.template_name[-1], "admin/action_job/progress.html")
+        self.assertIn(f'data-url="{self.progress_url}"', response.rendered_content)
+        self.assertIn("Pending", response.rendered_content)
+
+    def test_progress_endpoint(self):
+        status = self.client.get(self.progress_url).json()
+        self.assertEqual(status["status"], "pending")
+        self.assertFalse(status["finished"])
+        self.assertEqual(status["messages"], [])
+
+        run_job(self.job.pk)
+        status = self.client.get(self.progress_url).json()
+        self.assertEqual(status["status"], "done")
+        self.assertTrue(status["finished"])
+        self.assertEqual(status["messages"], ["Renamed 3 shops"])
+        self.assertEqual(status["error"], "")
+
+        # A finished job is not polled
+        response = self.client.get(reverse("admin:market_shop_action_job", args=(self.job.pk,)))
+        self.assertIn('data-url=""', response.rendered_content)
+        self.assertIn("Renamed 3 shops", response.rendered_content)
+
+    def test_failed_job_shows_exception(self):
+        with mock.patch("django.contrib.admin.ModelAdmin.message_user", side_effect=ValueError("Broken")):
+            run_job(self.job.pk)
+        status = self.client.get(self.progress_url).json()
+        self.assertEqual(status["status"], "failed")
+        self.assertEqual(status["error"], "ValueError: Broken")
+
+    def test_cancel_pending_job(self):
+        cancel_url = reverse("admin:market_shop_action_job_cancel", args=(self.job.pk,))
+        self.assertEqual(self.client.get(cancel_url).status_code, 405)
+
+        response = self.client.post(cancel_url)
+        self.assertRedirects(response, reverse("admin:market_shop_action_job", args=(self.job.pk,)))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ActionJob.Status.CANCELLED)
+        # A cancelled job is not run
+        self.assertIsNone(run_job(self.job.pk))
+        status = self.client.get(self.progress_url).json()
+        self.assertEqual(status["status"], "cancelled")
+        self.assertTrue(status["finished"])
+
+    def test_cancel_running_job(self):
+        ActionJob.objects.filter(pk=self.job.pk).update(status=ActionJob.Status.RUNNING)
+        response = self.client.get(reverse("admin:market_shop_action_job", args=(self.job.pk,)))
+        self.assertIn("action-job-cancel", response.rendered_content)
+
+        self.client.post(reverse("admin:market_shop_action_job_cancel", args=(self.job.pk,)))
+        self.assertTrue(Progress.for_job(self.job.pk).cancelled)
+        status = self.client.get(self.progress_url).json()
+        self.assertEqual(status["status"], "running")
+        self.assertTrue(status["cancelling"])
+        response = self.client.get(reverse("admin:market_shop_action_job", args=(self.job.pk,)))
+        self.assertNotIn("action-job-cancel", response.rendered_content)
+
+    def test_job_of_another_model(self):
+        response = self.client.get(reverse("admin:market_item_action_job_progress", args=(self.job.pk,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_job_of_another_user(self):
+        staff = User.objects.create_user(username="staff", password="pass", is_staff=True)  # nosec
+        self.client.force_login(staff)
+        response = self.client.get(self.progress_url)
+        self.assertEqual(response.status_code, 403)
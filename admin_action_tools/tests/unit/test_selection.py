@@ -0,0 +1,174 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from admin_action_tools.constants import CONFIRM_ACTION, CONFIRM_FORM, SELECTION_TOKEN
+from admin_action_tools.selection import Selection
+from admin_action_tools.tests.helpers import AdminConfirmTestCase
+from tests.factories import InventoryFactory, ShopFactory
+from tests.market.form import NoteActionForm
+from tests.market.models import Inventory, Shop
+
+
+class TestSelection(AdminConfirmTestCase):
+    def test_integer_pks_are_range_compressed(self):
+        selection = Selection.from_pks(["7", "1", "2", "3", "5", "6", "3"], Shop)
+        self.assertEqual(selection.ranges, [(1, 3), (5, 7)])
+        self.assertEqual(selection.keys, [])
+        self.assertEqual(selection.first_pk(), 1)
+
+    def test_other_keys_are_listed(self):
+        selection = Selection.from_pks(["b", "a", "1"], Shop)
+        self.assertEqual(selection.ranges, [])
+        self.assertEqual(selection.keys, ["1", "a", "b"])
+
+    def test_token_round_trip(self):
+        request = self.factory.post("/admin/market/shop/")
+        selection = Selection.from_pks(range(1, 50001), Shop)
+        token = selection.to_token(request)
+        self.assertLess(len(token), 100)
+
+        decoded = Selection.from_token(request, token)
+        self.assertEqual(decoded.ranges, [(1, 50000)])
+
+    def test_token_is_bound_to_path(self):
+        token = Selection.from_pks([1, 2], Shop).to_token(self.factory.post("/admin/market/shop/"))
+        self.assertIsNone(Selection.from_token(self.factory.post("/admin/market/item/"), token))
+        self.assertIsNone(Selection.from_token(self.factory.post("/admin/market/shop/"), "tampered:token"))
+
+    def test_filter(self):
+        shops = [ShopFactory() for _ in range(10)]
+        pks = [shops[0].pk, shops[1].pk, shops[2].pk, shops[5].pk, shops[8].pk]
+        selection = Selection.from_pks(pks, Shop)
+        self.assertEqual(sorted(selection.filter(Shop.objects.all()).values_list("pk", flat=True)), pks)
+
+        selection = Selection.from_pks([str(pk) for pk in pks], Shop)
+        selection.ranges, selection.keys = [], [str(pk) for pk in pks]
+        self.assertEqual(sorted(selection.filter(Shop.objects.all()).values_list("pk", flat=True)), pks)
+
+    def test_keys_of_other_fields_are_not_ranges(self):
+        expire_date = timezone.now() + timedelta(days=1)
+        for session_key in ["1", "2", "7", "10"]:
+            Session.objects.create(session_key=session_key, session_data="", expire_date=expire_date)
+        selection = Selection.from_pks(["1", "2", "7"], Session)
+        self.assertEqual(selection.ranges, [])
+        self.assertEqual(selection.keys, ["1", "2", "7"])
+        # "10" sorts between "1" and "2"
+        self.assertEqual(set(selection.filter(Session.objects.all()).values_list("pk", flat=True)), {"1", "2", "7"})
+
+    @mock.patch("admin_action_tools.selection.MAX_RANGES", 2)
+    def test_many_ranges_are_split(self):
+        shops = [ShopFactory() for _ in range(12)]
+        pks = [shop.pk for index, shop in enumerate(shops) if index not in (2, 5, 6, 9)]
+        selection = Selection.from_pks(pks, Shop)
+        self.assertEqual(len(selection.ranges), 4)
+
+        queryset = selection.filter(Shop.objects.all())
+        self.assertEqual(sorted(queryset.values_list("pk", flat=True)), pks)
+        # The two largest ranges are kept, the pks of the others are listed
+        self.assertEqual(str(queryset.query).count("BETWEEN"), 2)
+        ranges, singles = Selection.split_ranges(selection.ranges, 2)
+        self.assertEqual(ranges, [(shops[0].pk, shops[1].pk), (shops[3].pk, shops[4].pk)])
+        self.assertEqual(singles, [shops[7].pk, shops[8].pk, shops[10].pk, shops[11].pk])
+
+    def test_sparse_pks_are_listed(self):
+        # A page of sparse pks over millions of rows only lists the selected pks
+        pks = [index * 50000 for index in range(1, 101)] + [6000001, 6000002]
+        selection = Selection.from_pks(pks, Shop)
+        ranges, singles = Selection.split_ranges(selection.ranges, 50)
+        self.assertEqual(ranges, [(6000001, 6000002)])
+        self.assertEqual(singles, pks[:100])
+
+        shops = [ShopFactory() for _ in range(3)]
+        selection.ranges.append((shops[1].pk, shops[1].pk))
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(list(selection.filter(Shop.objects.all()).values_list("pk", flat=True)), [shops[1].pk])
+        self.assertLess(len(context.captured_queries[0]["sql"]), 2000)
+
+    def test_action_chain_carries_selection_token(self):
+        inventories = [InventoryFactory(shop=ShopFactory(), quantity=1) for _ in range(4)]
+        selected = [str(inventory.pk) for inventory in inventories[:3]]
+        url = reverse("admin:market_inventory_changelist")
+
+        response = self.client.post(
+            url,
+            data={
+                "action": ["add_notes_with_confirmation_many"],
+                "select_across": ["0"],
+                "index": ["0"],
+                "_selected_action": selected,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        token = response.context_data["selection_token"]
+        self.assertIn(f'name="{SELECTION_TOKEN}" value="{token}"', response.rendered_content)
+        self.assertNotIn('name="_selected_action"', response.rendered_content)
+
+        response = self.client.post(
+            url,
+            data={
+                "action": ["add_notes_with_confirmation_many"],
+                SELECTION_TOKEN: token,
+                f"{CONFIRM_FORM}_{NoteActionForm.__name__}": ["Continue"],
+                "date_0": "2022-10-11",
+                "date_1": "14:33:21",
+                "note": "Note",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        # The token is carried as is
+        self.assertEqual(response.context_data["selection_token"], token)
+
+        response = self.client.post(
+            url,
+            data={"action": ["add_notes_with_confirmation_many"], SELECTION_TOKEN: token, CONFIRM_ACTION: ["Confirm"]},
+            follow=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        noted = Inventory.objects.filter(notes__contains="Note").values_list("pk", flat=True)
+        self.assertEqual(sorted(str(pk) for pk in noted), sorted(selected))
+
+    def test_query_token_round_trip(self):
+        request = self.factory.post("/admin/market/shop/")
+        token = Selection.from_query(QueryDict("q=shop&o=1"), 3).to_token(request)
+        selection = Selection.from_token(request, token)
+        self.assertTrue(selection.is_query)
+        self.assertEqual(selection.get_query().dict(), {"q": "shop", "o": "1"})
+        self.assertEqual(selection.first_pk(), 3)
+        self.assertEqual(selection.filter(Shop.objects.all()).query.where, Shop.objects.all().query.where)
+
+    def test_select_across_is_replayed_from_changelist_query(self):
+        shops = [ShopFactory(name=name) for name in ["Apple", "Apricot", "Banana"]]
+        url = reverse("admin:market_shop_changelist")
+
+        response = self.client.post(
+            f"{url}?q=Ap",
+            data={
+                "action": ["show_message"],
+                "select_across": ["1"],
+                "index": ["0"],
+                "_selected_action": [shops[0].pk],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        token = response.context_data["selection_token"]
+        self.assertTrue(Selection.from_token(response.wsgi_request, token).is_query)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                url, data={"action": ["show_message"], SELECTION_TOKEN: token, CONFIRM_ACTION: ["Yes"]}
+            )
+        self.assertEqual(response.status_code, 302)
+        # The pks are never listed, the changelist ordering is kept
+        self.assertFalse(
+            any(" IN (" in query["sql"] for query in context.captured_queries if "market_shop" in query["sql"])
+        )
+
+        response = self.client.get(response.url)
+        self.assertIn("You selected with confirmation: Apricot, Apple", response.rendered_content)
@@ -1,8 +1,20 @@
+from unittest import mock
+
 from django.http import QueryDict
 
-from admin_action_tools.constants import CONFIRM_FORM
+from admin_action_tools.constants import (
+    CONFIRM_FORM,
+    SELECTION_TOKEN,
+    TOOLCHAIN_TOKEN,
+    ToolAction,
+)
 from admin_action_tools.tests.helpers import AdminConfirmTestCase
-from admin_action_tools.toolchain import ToolChain
+from admin_action_tools.toolchain import (
+    SessionToolChainStorage,
+    ToolChain,
+    get_tool_chain,
+    persist_tool_chain,
+)
 from tests.market.form import NoteActionForm
 
 
@@ -20,8 +32,9 @@ class TestToolchain(AdminConfirmTestCase):
         # test toolchain reset
         self.assertEqual(toolchain.get_history(), [])
 
-        # test data is save
-        self.assertEqual(request.session[name]["history"], [])
+        # test reset is saved
+        toolchain.flush()
+        self.assertNotIn(name, request.session)
 
     def test_toolchain_wrong_date(self):
         request = self.factory.request()
@@ -36,8 +49,9 @@ class TestToolchain(AdminConfirmTestCase):
         # test toolchain reset
         self.assertEqual(toolchain.get_history(), [])
 
-        # test data is save
-        self.assertEqual(request.session[name]["history"], [])
+        # test reset is saved
+        toolchain.flush()
+        self.assertNotIn(name, request.session)
 
     def test_toolchain_wrong_date_type(self):
         request = self.factory.request()
@@ -52,8 +66,9 @@ class TestToolchain(AdminConfirmTestCase):
         # test toolchain reset
         self.assertEqual(toolchain.get_history(), [])
 
-        # test data is save
-        self.assertEqual(request.session[name]["history"], [])
+        # test reset is saved
+        toolchain.flush()
+        self.assertNotIn(name, request.session)
 
     def test_toolchain_querydict(self):
         data = QueryDict("a=1&a=2&a=3")
@@ -62,3 +77,109 @@ class TestToolchain(AdminConfirmTestCase):
         res = toolchain._ToolChain__clean_data(data, {})
 
         self.assertEqual(res["data"], "a=1&a=2&a=3")
+
+    def test_toolchain_is_shared_by_request(self):
+        request = self.factory.request()
+        self.assertIs(get_tool_chain(request), get_tool_chain(request))
+
+    def test_toolchain_written_once_when_changed(self):
+        request = self.factory.post("/action/", {"note": "Note"})
+        name = f"toolchain{request.path}"
+
+        @persist_tool_chain
+        def inner_tool(modeladmin, request, queryset_or_object):
+            tool_chain = get_tool_chain(request)
+            tool_chain.set_tool("tool2", request.POST)
+            # Not written until the outermost tool returns
+            self.assertNotIn(name, request.session)
+
+        @persist_tool_chain
+        def outer_tool(modeladmin, request, queryset_or_object):
+            get_tool_chain(request).set_tool("tool1", request.POST)
+            inner_tool(modeladmin, request, queryset_or_object)
+            self.assertNotIn(name, request.session)
+
+        with mock.patch.object(
+            SessionToolChainStorage, "save", autospec=True, side_effect=SessionToolChainStorage.save
+        ) as save:
+            outer_tool(None, request, None)
+        save.assert_called_once()
+        self.assertEqual(request.session[name]["history"], ["tool1", "tool2"])
+
+    def test_toolchain_not_written_when_unchanged(self):
+        request = self.factory.request()
+        name = f"toolchain{request.path}"
+        request.session[name] = {"expire_at": ToolChain(request)._get_expiration(), "history": ["tool1"], "tool1": {}}
+        request.session.modified = False
+
+        toolchain = get_tool_chain(request)
+        self.assertEqual(toolchain.get_next_step("tool1"), ToolAction.FORWARD)
+        toolchain.flush()
+        self.assertFalse(request.session.modified)
+
+    def test_toolchain_not_written_when_empty(self):
+        request = self.factory.request()
+        toolchain = get_tool_chain(request)
+        toolchain.is_first_tool()
+        toolchain.flush()
+        self.assertFalse(request.session.modified)
+
+
+@mock.patch(
+    "admin_action_tools.toolchain.TOOLCHAIN_STORAGE", "admin_action_tools.toolchain.SignedTokenToolChainStorage"
+)
+class TestSignedTokenToolchain(AdminConfirmTestCase):
+    def test_toolchain_state_is_carried_by_token(self):
+        request = self.factory.post("/action/", {"note": "Note"})
+        toolchain = get_tool_chain(request)
+        toolchain.set_tool("tool1", request.POST)
+        toolchain.flush()
+        token = toolchain.get_token()
+
+        # Nothing is written in the session
+        self.assertNotIn(toolchain.name, request.session)
+        self.assertFalse(request.session.modified)
+
+        next_request = self.factory.post("/action/", {TOOLCHAIN_TOKEN: token})
+        next_toolchain = ToolChain(next_request)
+        self.assertEqual(next_toolchain.get_history(), ["tool1"])
+        data, _ = next_toolchain.get_tool("tool1")
+        self.assertEqual(data["note"], "Note")
+
+    def test_toolchain_token_is_bound_to_path(self):
+        request = self.factory.post("/action/")
+        toolchain = ToolChain(request)
+        toolchain.set_tool("tool1", request.POST)
+
+        other_request = self.factory.post("/other_action/", {TOOLCHAIN_TOKEN: toolchain.get_token()})
+        self.assertEqual(ToolChain(other_request).get_history(), [])
+
+    def test_toolchain_tampered_token(self):
+        request = self.factory.post("/action/", {TOOLCHAIN_TOKEN: "tampered:token"})
+        toolchain = ToolChain(request)
+        self.assertEqual(toolchain.get_history(), [])
+
+    def test_toolchain_cleared_has_no_token(self):
+        request = self.factory.post("/action/")
+        toolchain = ToolChain(request)
+        toolchain.set_tool("tool1", request.POST)
+        toolchain.clear_tool_chain()
+        self.assertIsNone(toolchain.get_token())
+
+    def test_toolchain_token_does_not_nest(self):
+        token = None
+        sizes = []
+        for step in range(4):
+            data = {"note": "Note", SELECTION_TOKEN: "selection"}
+            if token:
+                data[TOOLCHAIN_TOKEN] = token
+            toolchain = ToolChain(self.factory.post("/action/", data))
+            toolchain.set_tool(f"tool{step % 2}", toolchain.request.POST)
+            token = toolchain.get_token()
+            sizes.append(len(token))
+
+        data, _ = ToolChain(self.factory.post("/action/", {TOOLCHAIN_TOKEN: token})).get_tool("tool1")
+        self.assertNotIn(TOOLCHAIN_TOKEN, data)
+        self.assertNotIn(SELECTION_TOKEN, data)
+        # Same tools, same data: the token stays flat from step to step, give or take the compression
+        self.assertLess(abs(sizes[3] - sizes[1]), 20)
@@ -2,11 +2,22 @@ from __future__ import annotations
 
 import functools
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
+from django.core import signing
 from django.http import HttpRequest, QueryDict
+from django.utils.module_loading import import_string
 
-from admin_action_tools.constants import BACK, CANCEL, FUNCTION_MARKER, ToolAction
+from admin_action_tools.constants import (
+    BACK,
+    CANCEL,
+    FUNCTION_MARKER,
+    SELECTION_TOKEN,
+    TOOLCHAIN_STORAGE,
+    TOOLCHAIN_TOKEN,
+    ToolAction,
+)
+from admin_action_tools.utils import ensure_sync, log
 
 
 def gather_tools(func):
@@ -14,27 +25,33 @@ def gather_tools(func):
     @gather_tools function is a wrapper that is automatically added.
     It allows django-admin-action-tools to finalize the processing.
     """
+    action = ensure_sync(func)
 
     @functools.wraps(func)
     def func_wrapper(modeladmin, request, queryset_or_object):
 
-        tool_chain: ToolChain = ToolChain(request)
+        tool_chain: ToolChain = get_tool_chain(request)
         # get result
         forms = modeladmin.get_tools_result(tool_chain)
-        kwargs = {}
-        if len(forms) == 1:
-            kwargs["form"] = forms[0]
-        elif len(forms) > 1:
-            kwargs["forms"] = forms
+        kwargs = get_forms_kwargs(forms)
 
         # clear session
         tool_chain.clear_tool_chain()
 
-        return func(modeladmin, request, queryset_or_object, **kwargs)
+        return action(modeladmin, request, queryset_or_object, **kwargs)
 
     return func_wrapper
 
 
+def get_forms_kwargs(forms: List) -> Dict:
+    "Keyword arguments giving the forms of the tool chain to the action."
+    if len(forms) == 1:
+        return {"form": forms[0]}
+    if len(forms) > 1:
+        return {"forms": forms}
+    return {}
+
+
 def add_finishing_step(func):
     if not hasattr(func, FUNCTION_MARKER):
         setattr(func, FUNCTION_MARKER, True)
@@ -42,16 +59,116 @@ def add_finishing_step(func):
     return func
 
 
+def persist_tool_chain(func):
+    """
+    @persist_tool_chain writes the tool chains of the request once, when the outermost tool returns.
+    """
+
+    @functools.wraps(func)
+    def func_wrapper(modeladmin, request, queryset_or_object):
+        depth = request.__dict__.get("_tool_chain_depth", 0)
+        request._tool_chain_depth = depth + 1
+        try:
+            return func(modeladmin, request, queryset_or_object)
+        finally:
+            request._tool_chain_depth = depth
+            if not depth:
+                flush_tool_chains(request)
+
+    return func_wrapper
+
+
+def get_tool_chain(request: HttpRequest) -> ToolChain:
+    "Returns the tool chain of the request, shared by every tool handling it."
+    tool_chains = request.__dict__.setdefault("_tool_chains", {})
+    name = ToolChain.get_name(request)
+    if name not in tool_chains:
+        tool_chains[name] = ToolChain(request)
+    return tool_chains[name]
+
+
+def flush_tool_chains(request: HttpRequest) -> None:
+    for tool_chain in request.__dict__.get("_tool_chains", {}).values():
+        tool_chain.flush()
+
+
+class SessionToolChainStorage:
+    "Keep the tool chain state in the session."
+
+    def __init__(self, request: HttpRequest, name: str) -> None:
+        self.session = request.session
+        self.name = name
+
+    def load(self) -> Dict:
+        return self.session.get(self.name, {})
+
+    def save(self, data: Dict) -> None:
+        self.session[self.name] = data
+        self.session.modified = True
+
+    def clear(self) -> None:
+        self.session.pop(self.name, None)
+
+    def get_token(self, data: Dict) -> Optional[str]:  # pylint: disable=W0613
+        return None
+
+
+class SignedTokenToolChainStorage:
+    """
+    Carry the tool chain state in a signed and compressed token, posted back by each step.
+
+    Nothing is written server side, so any worker can serve any step.
+    """
+
+    def __init__(self, request: HttpRequest, name: str) -> None:
+        self.request = request
+        user_pk = getattr(getattr(request, "user", None), "pk", None)
+        self.salt = f"admin_action_tools.toolchain:{name}:{user_pk}"
+
+    def load(self) -> Dict:
+        token = self.request.POST.get(TOOLCHAIN_TOKEN)
+        if not token:
+            return {}
+        try:
+            return signing.loads(token, salt=self.salt)
+        except signing.BadSignature:
+            log("Warning: invalid tool chain token")
+            return {}
+
+    def save(self, data: Dict) -> None:
+        pass  # noqa: WPS420
+
+    def clear(self) -> None:
+        pass  # noqa: WPS420
+
+    def get_token(self, data: Dict) -> Optional[str]:
+        return signing.dumps(data, salt=self.salt, compress=True)
+
+
 class ToolChain:
+    """
+    State of the chained tools (forms and confirmations) of an action.
+
+    Use get_tool_chain to share a single instance between the tools handling a request.
+    Changes are only written to the storage by flush, and only if something changed.
+    """
+
+    lifetime = timedelta(seconds=60)
+
     def __init__(self, request: HttpRequest) -> None:
         self.request = request
-        self.session = request.session
-        self.name = f"toolchain{request.path}"
+        self.name = self.get_name(request)
+        self.storage = import_string(TOOLCHAIN_STORAGE)(request, self.name)
+        self.dirty = False
         self._get_data()
         self.data.setdefault("history", [])
 
+    @staticmethod
+    def get_name(request: HttpRequest) -> str:
+        return f"toolchain{request.path}"
+
     def _get_data(self):
-        old_data = self.session.get(self.name, {})
+        old_data = self.storage.load()
         expire_at = old_data.get("expire_at")
 
         if expire_at:
@@ -61,26 +178,36 @@ class ToolChain:
                 expire_at = None
                 old_data = None
 
-        if not old_data:
-            self.data = {"expire_at": self._get_expiration()}
-            self._save()
-        elif expire_at and expire_at < datetime.now():
-            self.data = {"expire_at": self._get_expiration()}
-            self._save()
+        if not old_data or (expire_at and expire_at < datetime.now()):
+            self.expire_at = None
+            self.data = {}
+            # Only written if there was a previous state to reset
+            self.dirty = old_data != {}
         else:
+            self.expire_at = expire_at
             self.data = old_data
 
-    def _update_expire_at(self):
-        self.data["expire_at"] = self._get_expiration()
-        self._save()
+    def _expires_soon(self) -> bool:
+        # Extending the expiration alone is only worth a write once half the lifetime is over
+        return self.expire_at is None or self.expire_at - datetime.now() < self.lifetime / 2
 
-    @staticmethod
-    def _get_expiration():
-        return (datetime.now() + timedelta(seconds=60)).isoformat()
+    def _get_expiration(self):
+        return (datetime.now() + self.lifetime).isoformat()
 
     def _save(self):
-        self.session[self.name] = self.data
-        self.session.modified = True
+        self.dirty = True
+
+    def flush(self) -> None:
+        "Write the state to the storage, if it changed or is about to expire."
+        if not self.dirty and not (self.data["history"] and self._expires_soon()):
+            return
+        if self.data["history"]:
+            self.data["expire_at"] = self._get_expiration()
+            self.expire_at = datetime.fromisoformat(self.data["expire_at"])
+            self.storage.save(self.data)
+        else:
+            self.storage.clear()
+        self.dirty = False
 
     def get_toolchain(self) -> Dict:
         return self.data
@@ -96,7 +223,14 @@ class ToolChain:
         return QueryDict(tool.get("data")), tool.get("metadata")
 
     def clear_tool_chain(self):
-        self.session.pop(self.name, None)
+        self.data = {"history": []}
+        self._save()
+
+    def get_token(self) -> Optional[str]:
+        "Token to post back with the next step, if the state is carried by the client."
+        if not self.data["history"]:
+            return None
+        return self.storage.get_token({**self.data, "expire_at": self._get_expiration()})
 
     def is_rollback(self):
         return BACK in self.request.POST
@@ -115,7 +249,6 @@ class ToolChain:
         return not self.data["history"]
 
     def get_next_step(self, tool_name: str) -> ToolAction:
-        self._update_expire_at()
         if self.is_cancel():
             return ToolAction.CANCEL
         if self.is_rollback():
@@ -131,7 +264,9 @@ class ToolChain:
 
     def __clean_data(self, data: QueryDict, metadata):
         new_data = data.copy()
-        new_data.pop("csrfmiddlewaretoken", None)
+        # Tokens posted back by the step are not data of the tool, keeping them would nest the tokens
+        for key in ("csrfmiddlewaretoken", TOOLCHAIN_TOKEN, SELECTION_TOKEN):
+            new_data.pop(key, None)
 
         metadata = metadata or {}
         return {"data": new_data.urlencode(), "metadata": metadata}
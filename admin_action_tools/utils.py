@@ -1,3 +1,7 @@
+import asyncio
+import functools
+
+from asgiref.sync import async_to_sync
 from django.urls import reverse
 
 from admin_action_tools.constants import CACHE_KEY_PREFIX, DEBUG
@@ -14,10 +18,29 @@ def get_admin_change_url(obj: object) -> str:
     )
 
 
-def format_cache_key(model: str, field: str) -> str:
+def format_cache_key(model: str, field: str, namespace: str = None) -> str:
+    if namespace:
+        return f"{CACHE_KEY_PREFIX}__{namespace}__{model}__{field}"
     return f"{CACHE_KEY_PREFIX}__{model}__{field}"
 
 
+def ensure_sync(func):
+    """
+    Returns a sync version of an async def action, as the admin calls actions synchronously.
+
+    The coroutine runs in an event loop while the calling thread waits, the async ORM calls of the
+    action are run back in that thread, so within its connection and transaction.
+    """
+    if not asyncio.iscoroutinefunction(func):
+        return func
+
+    @functools.wraps(func)
+    def func_wrapper(*args, **kwargs):
+        return async_to_sync(func)(*args, **kwargs)
+
+    return func_wrapper
+
+
 def log(message: str):  # pragma: no cover
     if DEBUG:
         print(message)
@@ -19,6 +19,13 @@ class InventoryAdmin(AdminConfirmMixin, ActionFormMixin, DjangoObjectActions, Mo
 
     change_actions = ["quantity_up", "add_notes", "add_notes_with_confirmation", "add_notes_with_clear"]
     changelist_actions = ["quantity_down", "add_notes_with_confirmation_many", "add_notes_with_confirmation_no_form"]
+    actions = [
+        "add_notes_with_confirmation_many",
+        "quantity_down",
+        "add_notes_with_confirmation_no_form",
+        "add_notes_in_background",
+    ]
+    confirmation_preview_select_related = ["shop", "item"]
 
     @confirm_action()
     def quantity_up(self, request, obj):
@@ -48,6 +55,14 @@ class InventoryAdmin(AdminConfirmMixin, ActionFormMixin, DjangoObjectActions, Mo
             object.notes += f"\n\n{form.cleaned_data['date']}\n{form.cleaned_data['note']}"
             object.save()
 
+    @add_form_to_action(NoteActionForm, lazy_queryset=True)
+    @confirm_action(lazy_queryset=True, background=True)
+    def add_notes_in_background(self, request, queryset, form=None):
+        for object in queryset:
+            object.notes += f"\n\n{form.cleaned_data['date']}\n{form.cleaned_data['note']}"
+            object.save()
+        self.message_user(request, f"Added notes to {queryset.count()} inventories")
+
     @add_form_to_action(NoteActionForm)
     @confirm_action()
     def add_notes_with_confirmation(self, request, object, form=None):
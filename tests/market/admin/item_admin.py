@@ -1,7 +1,8 @@
 from django.contrib.admin import VERTICAL, ModelAdmin
+from django.db.models import Sum
 from django.utils.safestring import mark_safe
 
-from admin_action_tools.admin import AdminConfirmMixin
+from admin_action_tools.admin import ActionSummary, AdminConfirmMixin, confirm_action
 
 
 class ItemAdmin(AdminConfirmMixin, ModelAdmin):
@@ -16,6 +17,15 @@ class ItemAdmin(AdminConfirmMixin, ModelAdmin):
     save_as = True
     save_as_continue = False
 
+    actions = ["clear_description"]
+
     def image_preview(self, obj):
         if obj.image:
             return mark_safe('<img src="{obj.image.url}" />')
+
+    @confirm_action(
+        display_queryset=False,
+        summary=ActionSummary(group_by=["currency"], aggregates={"total": Sum("price")}),
+    )
+    def clear_description(self, request, queryset):
+        queryset.update(description="")
@@ -1,11 +1,32 @@
 from django.contrib.admin import ModelAdmin
 
-from admin_action_tools.admin import AdminConfirmMixin, confirm_action
+from admin_action_tools.admin import (
+    AdminConfirmMixin,
+    chunked_action,
+    confirm_action,
+    parallel_action,
+)
+
+
+@confirm_action(background=True)
+def reset_names_in_background(modeladmin, request, queryset):
+    updated = queryset.update(name="Reset")
+    modeladmin.message_user(request, f"Reset {updated} shops")
 
 
 class ShopAdmin(AdminConfirmMixin, ModelAdmin):
     confirmation_fields = ["name"]
-    actions = ["show_message", "show_message_no_confirmation"]
+    actions = [
+        "show_message",
+        "show_message_no_confirmation",
+        "show_message_lazy",
+        "rename_in_background",
+        "rename_in_chunks",
+        "rename_async",
+        "rename_in_parallel",
+        "rename_async_in_parallel",
+        reset_names_in_background,
+    ]
     search_fields = ["name"]
 
     @confirm_action()
@@ -15,6 +36,39 @@ class ShopAdmin(AdminConfirmMixin, ModelAdmin):
 
     show_message.allowed_permissions = ("delete",)
 
+    @confirm_action(lazy_queryset=True)
+    def show_message_lazy(modeladmin, request, queryset):
+        modeladmin.message_user(request, f"You selected with confirmation: {queryset.count()} shops")
+
+    @confirm_action(lazy_queryset=True, background=True)
+    def rename_in_background(modeladmin, request, queryset):
+        updated = queryset.update(name="Renamed")
+        modeladmin.message_user(request, f"Renamed {updated} shops")
+
+    @confirm_action(lazy_queryset=True)
+    @chunked_action(chunk_size=2)
+    def rename_in_chunks(modeladmin, request, queryset):
+        for shop in queryset:
+            shop.name = f"{shop.name} (renamed)"
+            shop.save()
+
+    @confirm_action(lazy_queryset=True)
+    async def rename_async(modeladmin, request, queryset):
+        updated = await queryset.aupdate(name="Renamed")
+        modeladmin.message_user(request, f"Renamed {updated} shops")
+
+    @confirm_action(lazy_queryset=True)
+    @parallel_action(shards=3)
+    def rename_in_parallel(modeladmin, request, queryset):
+        updated = queryset.update(name="Renamed")
+        modeladmin.message_user(request, f"Renamed {updated} shops")
+
+    @confirm_action(lazy_queryset=True)
+    @parallel_action(shards=2)
+    async def rename_async_in_parallel(modeladmin, request, queryset):
+        updated = await queryset.aupdate(name="Renamed")
+        modeladmin.message_user(request, f"Renamed {updated} shops")
+
     def show_message_no_confirmation(modeladmin, request, queryset):
         shops = ", ".join(shop.name for shop in queryset)
         modeladmin.message_user(request, f"You selected without confirmation: {shops}")
@@ -39,6 +39,9 @@ class Inventory(models.Model):
     quantity = models.PositiveIntegerField(default=0, null=True, blank=True)
     notes = models.TextField(default="This is the default", null=True, blank=True)
 
+    def __str__(self):
+        return f"{self.item} at {self.shop}"
+
 
 class GeneralManager(models.Model):
     name = models.CharField(max_length=120)